@@ -5,6 +5,21 @@ class RecomendarConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "recomendar"
 
-    def ready(self):
-        if os.environ.get("DISABLE_WARMUP", "1") == "1":
-            return
+
+def start_server_warmup():
+    """
+    Carga (snapshot o CSV) en segundo plano; /readyz informa del progreso. Se llama solo desde
+    wsgi.py/asgi.py (también runserver, que carga wsgi.py): los comandos de manage.py no
+    cargan los datos en un hilo aparte ni hacen fork con sus locks tomados.
+    """
+    from django.conf import settings
+    # el perfil serve-only no carga el recomendador
+    if os.environ.get("DISABLE_WARMUP", "1") == "1" or getattr(settings, "SERVE_STORE", None):
+        return
+    from .utils.warmup import start_warmup
+    from .views import DATA_DIR
+    start_warmup(
+        DATA_DIR,
+        min_periods=int(os.environ.get("WARMUP_MINP", 3)),
+        top_titles=int(os.environ.get("WARMUP_TOP_TITLES", 200)),
+    )
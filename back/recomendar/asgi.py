@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Servir con uvicorn (desde back/):
+    uvicorn recomendar.asgi:application --host 0.0.0.0 --port 8000 --workers 2
+o con gunicorn gestionando workers uvicorn:
+    gunicorn recomendar.asgi:application -k uvicorn.workers.UvicornWorker -w 2 -b 0.0.0.0:8000
 """
 
 import os
@@ -12,5 +17,11 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'recomendar.settings')
+# vistas asíncronas (recomendar/async_views.py); RECOMENDAR_ASYNC=0 vuelve a las de DRF
+os.environ.setdefault('RECOMENDAR_ASYNC', '1')
 
 application = get_asgi_application()
+
+from recomendar.apps import start_server_warmup  # noqa: E402  (tras django.setup)
+
+start_server_warmup()
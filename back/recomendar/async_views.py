@@ -0,0 +1,161 @@
+"""
+Vistas asíncronas para servir con ASGI (uvicorn): mismas rutas, parámetros y respuestas
+que views.py, pero el cálculo se hace en los pools de utils/offload.py y el event loop
+queda libre. urls.py las usa cuando RECOMENDAR_ASYNC=1 (lo fija asgi.py).
+"""
+import asyncio
+import json
+from typing import Any, Callable, Dict, Hashable, Optional
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from . import views
+from .utils import offload
+from .utils.batch import DEFAULT_CHUNK, chunked, parse_lines, recommend_chunk
+from .utils.httpcache import matches
+from .utils.metrics import render as render_metrics
+from .utils.recommender import get_recommender
+
+# mismo formato que el JSONRenderer de DRF
+_JSON = {"ensure_ascii": False, "separators": (",", ":"), "allow_nan": False}
+
+
+def _json(payload: Any, code: int, headers: Optional[Dict[str, str]] = None) -> HttpResponse:
+    if code == 304:
+        resp = HttpResponseNotModified()
+    elif isinstance(payload, bytes):   # ya codificado (utils/serialize.py)
+        resp = HttpResponse(payload, status=code, content_type="application/json")
+    else:
+        resp = JsonResponse(payload, status=code, safe=False, json_dumps_params=_JSON)
+    for k, v in (headers or {}).items():
+        resp[k] = v
+    return resp
+
+
+def _overloaded(e: Exception) -> JsonResponse:
+    resp = _json({"error": f"Servidor saturado, reintenta en unos segundos ({e})."}, 503)
+    resp["Retry-After"] = "1"
+    return resp
+
+
+async def _offload(pool: offload.Offloader, key: Optional[Hashable],
+                   fn: Callable, *args) -> HttpResponse:
+    try:
+        payload, code = await pool.run(key, fn, *args)
+    except offload.Overloaded as e:
+        return _overloaded(e)
+    return _json(payload, code)
+
+
+async def _cached(pool: offload.Offloader, route: str, request, fn: Callable) -> HttpResponse:
+    # 304 y cuerpos cacheados se resuelven en el event loop, sin pasar por el pool
+    params = request.GET.dict()
+    hit = views.cached_lookup(route, params, request.headers.get("If-None-Match"))
+    if hit is not None:
+        return _json(*hit)
+    try:
+        payload, code, headers = await pool.run(_params_key(route, request.GET), views.cached_compute,
+                                                route, params, fn)
+    except offload.Overloaded as e:
+        return _overloaded(e)
+    return _json(payload, code, headers)
+
+
+def _params_key(name: str, params) -> Hashable:
+    return (name,) + tuple(sorted((k, tuple(v)) for k, v in params.lists()))
+
+
+def _body(request) -> Any:
+    try:
+        return json.loads(request.body or b"{}")
+    except ValueError:
+        return None
+
+
+@require_GET
+async def healthz(request):
+    if matches(request.headers.get("If-None-Match"), views.HEALTHZ_ETAG):
+        return _json(b"", 304, views.HEALTHZ_HEADERS)
+    return _json({"status": "ok"}, 200, views.HEALTHZ_HEADERS)
+
+
+@require_GET
+async def metrics(_request):
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@require_GET
+async def readyz(_request):
+    payload, code = views.readyz_payload()
+    return _json(payload, code)
+
+
+@require_GET
+async def getrecomenders(request):
+    return await _cached(offload.compute, "getrecomenders", request, views.getrecomenders_payload)
+
+
+@require_GET
+async def titles(request):
+    return await _cached(offload.lookup, "titles", request, views.titles_payload)
+
+
+@csrf_exempt
+@require_POST
+async def recommend_by_seen(request):
+    data = _body(request)
+    if data is None:
+        return _json({"error": "JSON inválido."}, 400)
+    params = request.GET.dict()
+    key = ("recommend_by_seen", json.dumps(data, sort_keys=True), _params_key("", request.GET))
+    return await _offload(offload.compute, key, views.recommend_by_seen_payload, data, params)
+
+
+@csrf_exempt
+@require_POST
+async def recommend_batch(request):
+    minp = int(request.GET.get("minp", 3))
+    engine = request.GET.get("engine", "pearson")
+    topk = int(request.GET.get("topk", 10))
+
+    def load():
+        try:
+            return get_recommender(views.DATA_DIR, min_periods=minp, engine=engine), None
+        except Exception as e:
+            return None, str(e)
+
+    try:
+        rec, error = await offload.compute.run(("load", minp, engine), load)
+    except offload.Overloaded as e:
+        return _overloaded(e)
+    if error is not None:
+        return _json({"error": error}, 400)
+
+    lines = request.body.splitlines()
+
+    async def stream():
+        # cada bloque pasa por el pool (sin coalescing); si está lleno se espera y se reintenta
+        for reqs in chunked(parse_lines(lines), DEFAULT_CHUNK):
+            while True:
+                try:
+                    out = await offload.compute.run(None, recommend_chunk, rec, reqs, topk)
+                    break
+                except offload.Overloaded:
+                    await asyncio.sleep(0.05)
+            for line in out:
+                yield line + "\n"
+
+    return StreamingHttpResponse(stream(), content_type="application/x-ndjson")
+
+
+@csrf_exempt
+@require_POST
+async def ingest_ratings(request):
+    auth = request.headers.get("Authorization")
+    denied = views.ingest_denied(auth)
+    if denied is not None:
+        return _json(*denied)
+    data = _body(request)
+    if data is None:
+        return _json({"error": "JSON inválido."}, 400)
+    return await _offload(offload.compute, None, views.ingest_ratings_payload, data, auth)
@@ -0,0 +1,144 @@
+import json
+import logging
+import platform
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from recomendar import views
+from recomendar.utils import bench
+from recomendar.utils.cache import ResultCache, get_result_cache
+from recomendar.utils.httpcache import response_cache
+from recomendar.utils.neighbors import NeighborIndex
+from recomendar.utils.recommender import ENGINES, RecommenderData, get_registry
+from recomendar.utils.synthetic import generate
+
+
+class Command(BaseCommand):
+    help = ("Mide carga, memoria y latencias en frío/caliente (p50/p95/p99) de los métodos de "
+            "LightRecommender y de los endpoints; escribe un informe JSON y, con --baseline, "
+            "falla si algo empeora más de --tolerance.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--data-dir", default=str(Path(settings.BASE_DIR) / "recomendar" / "utils"))
+        parser.add_argument("--synthetic", metavar="DIR",
+                            help="Genera datos sintéticos en DIR (si no existen) y mide sobre ellos")
+        parser.add_argument("--users", type=int, default=20000)
+        parser.add_argument("--items", type=int, default=3000)
+        parser.add_argument("--ratings-per-user", type=float, default=40)
+        parser.add_argument("--alpha", type=float, default=1.1, help="Exponente de la popularidad (Zipf)")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--build-neighbors", action="store_true",
+                            help="Con --synthetic: genera también neighbors_mp<minp>.npz")
+        parser.add_argument("--minp", type=int, default=3)
+        parser.add_argument("--engine", default="pearson")
+        parser.add_argument("--queries", type=int, default=50, help="Consultas distintas por caso")
+        parser.add_argument("--repeat", type=int, default=5, help="Pasadas en caliente")
+        parser.add_argument("--no-endpoints", action="store_true", help="Solo los métodos del recomendador")
+        parser.add_argument("-o", "--output", help="Fichero del informe JSON (por defecto, stdout)")
+        parser.add_argument("--baseline", help="Informe anterior con el que comparar")
+        parser.add_argument("--tolerance", type=float, default=0.25, help="Empeoramiento relativo admitido")
+        parser.add_argument("--min-ms", type=float, default=0.5, help="Diferencia mínima en latencias (ms)")
+
+    def handle(self, *args, **opts):
+        if opts["engine"] not in ENGINES:
+            raise CommandError(f"Motor desconocido '{opts['engine']}'. Opciones: {', '.join(ENGINES)}")
+        data_dir = Path(opts["data_dir"])
+        report = {"meta": {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "engine": opts["engine"], "minp": opts["minp"], "queries": opts["queries"], "repeat": opts["repeat"],
+        }}
+
+        if opts["synthetic"]:
+            data_dir = Path(opts["synthetic"])
+            generated = not (data_dir / "anime.csv").exists()
+            if generated:
+                # en otro proceso, para que el pico de memoria medido sea solo el de la carga
+                with ProcessPoolExecutor(1) as ex:
+                    sizes = ex.submit(generate, data_dir, opts["users"], opts["items"],
+                                      opts["ratings_per_user"], opts["alpha"], opts["seed"]).result()
+                self.stderr.write(f"Datos sintéticos en {data_dir}: {sizes}")
+            else:
+                self.stderr.write(f"Reutilizando los datos sintéticos de {data_dir} (--users/--items no se aplican)")
+            # parámetros de generación solo si se generaron ahora; el tamaño real va en report["data"]
+            report["meta"]["synthetic"] = ({k: opts[k] for k in ("users", "items", "ratings_per_user", "alpha", "seed")}
+                                           if generated else {"reused": True})
+        report["meta"]["data_dir"] = str(data_dir)
+
+        # carga
+        rss0 = bench.rss_mb()
+        t0 = time.perf_counter()
+        data = RecommenderData(data_dir, deltas=False)
+        load_s = time.perf_counter() - t0
+        report["data"] = {"users": data.matrix.n_users, "items": data.matrix.n_items,
+                          "ratings": int(len(data.matrix.data)), "snapshot": data.snapshot is not None}
+
+        if opts["synthetic"] and opts["build_neighbors"]:
+            t1 = time.perf_counter()
+            NeighborIndex.build(data.matrix, opts["minp"], data_version=data.data_version).save(NeighborIndex.path_for(data_dir, opts["minp"]))
+            report["data"]["build_neighbors_s"] = round(time.perf_counter() - t1, 3)
+
+        rec = ENGINES[opts["engine"]](data_dir, min_periods=opts["minp"], cache=ResultCache(), data=data)
+        report["load"] = {"load_s": round(load_s, 3), "rss_mb": bench.rss_mb(),
+                          "rss_delta_mb": round(bench.rss_mb() - rss0, 1) if rss0 is not None else None,
+                          "peak_rss_mb": bench.peak_rss_mb()}
+        self.stderr.write(f"Carga: {load_s:.2f}s, {report['data']}")
+
+        # métodos
+        work = bench.workload(rec, n=opts["queries"], seed=opts["seed"])
+        report["methods"] = bench.run_cases(bench.method_cases(rec, work), repeat=opts["repeat"],
+                                            reset=rec.cache.clear)
+
+        # endpoints (cliente de pruebas de Django, vistas síncronas)
+        if not opts["no_endpoints"]:
+            request_log = logging.getLogger("recomendar.request")
+            level, old_dir = request_log.level, views.DATA_DIR
+            request_log.setLevel(logging.WARNING)
+            views.DATA_DIR = data_dir
+            try:
+                client = Client()
+                t1 = time.perf_counter()
+                # los mismos datos ya medidos: una segunda carga inflaría peak_rss_mb
+                get_registry().adopt(data)
+                get_registry().get(data_dir, opts["minp"], opts["engine"])
+                report["load"]["endpoint_load_s"] = round(time.perf_counter() - t1, 3)
+                cases = bench.endpoint_cases(client, work, minp=opts["minp"], engine=opts["engine"])
+
+                def reset():
+                    # en frío: sin similitudes cacheadas ni cuerpos de respuesta ya serializados
+                    get_result_cache().clear()
+                    response_cache.clear()
+
+                report["endpoints"] = bench.run_cases(cases, repeat=opts["repeat"], reset=reset)
+            finally:
+                views.DATA_DIR = old_dir
+                request_log.setLevel(level)
+        report["peak_rss_mb"] = bench.peak_rss_mb()
+
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if opts["output"]:
+            Path(opts["output"]).write_text(text + "\n", encoding="utf-8")
+        else:
+            self.stdout.write(text)
+        for section in ("methods", "endpoints"):
+            for name, r in report.get(section, {}).items():
+                self.stderr.write(f"  {name:<26} frío p50 {r['cold']['p50_ms']:>8.2f} ms   "
+                                  f"caliente p50 {r['warm']['p50_ms']:>8.2f} p95 {r['warm']['p95_ms']:>8.2f} ms")
+
+        if opts["baseline"]:
+            baseline = json.loads(Path(opts["baseline"]).read_text(encoding="utf-8"))
+            # tiempos de otra escala no son comparables
+            scale = {k: (baseline.get("data", {}).get(k), report["data"][k]) for k in ("users", "items", "ratings")}
+            if any(b != c for b, c in scale.values()):
+                raise CommandError("El baseline se midió sobre otros datos: "
+                                   + ", ".join(f"{k} {b} → {c}" for k, (b, c) in scale.items()))
+            regressions = bench.compare(report, baseline, tolerance=opts["tolerance"], min_ms=opts["min_ms"])
+            if regressions:
+                raise CommandError(f"{len(regressions)} regresiones frente a {opts['baseline']}:\n  "
+                                   + "\n  ".join(regressions))
+            self.stderr.write(self.style.SUCCESS(f"Sin regresiones frente a {opts['baseline']}"))
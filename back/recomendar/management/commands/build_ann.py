@@ -0,0 +1,61 @@
+import time
+from pathlib import Path
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recomendar.utils.ann import IVFIndex
+from recomendar.utils.factorization import FactorModel
+from recomendar.utils.recommender import LightRecommender, RecommenderData
+
+
+class Command(BaseCommand):
+    help = ("Construye el índice IVF (ann_ivf.npz) sobre los factores de factors.npz y mide "
+            "recall@k y latencia por nprobe frente a la búsqueda exacta y a similares_por_id (Pearson).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--data-dir", default=str(Path(settings.BASE_DIR) / "recomendar" / "utils"))
+        parser.add_argument("--nlist", type=int, default=None, help="Nº de listas (por defecto √n)")
+        parser.add_argument("--nprobe", type=int, default=8, help="nprobe por defecto guardado en el índice")
+        parser.add_argument("--eval", type=int, default=200, help="Consultas de evaluación (0 = sin evaluar)")
+        parser.add_argument("--topk", type=int, default=10)
+        parser.add_argument("--minp", type=int, default=3, help="min_periods de la referencia Pearson")
+
+    def handle(self, *args, **opts):
+        data_dir = Path(opts["data_dir"])
+        model = FactorModel.load(FactorModel.path_for(data_dir))
+        t0 = time.perf_counter()
+        ann = IVFIndex.build(model.item_ids[model.valid], model.unit[model.valid], nlist=opts["nlist"],
+                             nprobe=opts["nprobe"], source=model.fingerprint)
+        out = IVFIndex.path_for(data_dir)
+        ann.save(out)
+        self.stdout.write(self.style.SUCCESS(
+            f"IVF con {ann.nlist} listas sobre {len(ann.ids)} vectores en {out} ({time.perf_counter() - t0:.1f}s)"))
+        if opts["eval"] > 0:
+            self.evaluate(data_dir, model, ann, opts["eval"], opts["topk"], opts["minp"])
+
+    def evaluate(self, data_dir, model, ann, n_queries, topk, minp):
+        data = RecommenderData(data_dir)
+        pearson = LightRecommender(data_dir, min_periods=minp, data=data)
+
+        ids = data.anime.sort_values("members", ascending=False)["anime_id"].to_numpy()
+        pos, found = model.positions(ids)
+        ids = [int(a) for a in ids[found][:n_queries]]
+        model.ann = None
+        truth_f = {a: set(model.similar(a, topk)[0].tolist()) for a in ids}
+        truth_p = {a: set(pearson._neighbors(a, topk)[0].tolist()) for a in ids}
+
+        def mean_recall(truth, got):
+            vals = [len(truth[a] & got[a]) / len(truth[a]) for a in ids if truth[a]]
+            return float(np.mean(vals)) if vals else float("nan")
+
+        model.ann = ann
+        self.stdout.write(f"{'nprobe':>7} {'recall_exact':>13} {'recall_pearson':>15} {'p50_ms':>8} {'p95_ms':>8}")
+        probes = sorted({p for p in (1, 2, 4, 8, 16, 32, 64) if p < ann.nlist} | {ann.nlist})
+        for nprobe in probes:
+            lat, got = [], {}
+            for a in ids:
+                t = time.perf_counter()
+                got[a] = set(model.similar(a, topk, nprobe=nprobe)[0].tolist())
+                lat.append((time.perf_counter() - t) * 1000)
+            self.stdout.write(f"{nprobe:>7} {mean_recall(truth_f, got):>13.3f} {mean_recall(truth_p, got):>15.3f} "
+                              f"{np.percentile(lat, 50):>8.3f} {np.percentile(lat, 95):>8.3f}")
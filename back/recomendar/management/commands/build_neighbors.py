@@ -0,0 +1,46 @@
+import os
+import time
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recomendar.utils.recommender import RecommenderData
+from recomendar.utils.neighbors import NeighborIndex
+from recomendar.utils.neighbor_build import build_parallel
+
+
+class Command(BaseCommand):
+    help = ("Precalcula los top-N vecinos Pearson de cada anime (neighbors_mp<minp>.npz), en paralelo "
+            "y con checkpoints por shard: si se interrumpe, volver a lanzarlo continúa donde se quedó.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--data-dir", default=str(Path(settings.BASE_DIR) / "recomendar" / "utils"))
+        parser.add_argument("--minp", type=int, default=3)
+        parser.add_argument("--topn", type=int, default=200)
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                            help="Procesos (1 = en este proceso); por defecto, uno por núcleo")
+        parser.add_argument("--shard-size", type=int, default=128, help="Animes por shard (cada uno con su checkpoint)")
+        parser.add_argument("--restart", action="store_true", help="Descarta los checkpoints de una construcción anterior")
+
+    def handle(self, *args, **opts):
+        data_dir = Path(opts["data_dir"])
+        t0 = time.perf_counter()
+        # sin ratings_delta.csv: las filas de los animes afectados se recalculan bajo demanda
+        data = RecommenderData(data_dir, deltas=False)
+        self.stdout.write(f"Datos cargados en {time.perf_counter() - t0:.1f}s "
+                          f"({data.matrix.n_users} usuarios, {data.matrix.n_items} animes, {opts['workers']} workers)")
+
+        def progress(done, total, resumed, elapsed):
+            # los animes recuperados de checkpoints no cuentan para el ritmo
+            rate = (done - resumed) / max(elapsed, 1e-9)
+            self.stdout.write(f"  {done}/{total} animes ({elapsed:.1f}s, {rate:.0f} animes/s, "
+                              f"quedan ~{(total - done) / max(rate, 1e-9):.0f}s)")
+
+        t1 = time.perf_counter()
+        out = NeighborIndex.path_for(data_dir, opts["minp"])
+        index = build_parallel(data.matrix, out, opts["minp"], topn=opts["topn"], workers=opts["workers"],
+                               shard_size=opts["shard_size"], fingerprint=data.data_version, restart=opts["restart"],
+                               progress=progress)
+        elapsed = time.perf_counter() - t1
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(index.neighbor_ids)} vecinos guardados en {out} ({elapsed:.1f}s, "
+            f"{data.matrix.n_items / max(elapsed, 1e-9):.0f} animes/s)"))
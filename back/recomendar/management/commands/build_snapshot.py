@@ -0,0 +1,24 @@
+import time
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recomendar.utils.neighbors import RatingsMatrix
+from recomendar.utils.recommender import load_anime_csv, load_ratings_csv
+from recomendar.utils.snapshot import write_snapshot
+
+
+class Command(BaseCommand):
+    help = "Compila anime.csv + ratings_clean_1.csv en el snapshot binario (snapshot/*.npy) para carga con mmap."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--data-dir", default=str(Path(settings.BASE_DIR) / "recomendar" / "utils"))
+
+    def handle(self, *args, **opts):
+        data_dir = Path(opts["data_dir"])
+        t0 = time.perf_counter()
+        anime = load_anime_csv(data_dir)
+        matrix = RatingsMatrix.from_frame(load_ratings_csv(data_dir))
+        self.stdout.write(f"CSV leídos en {time.perf_counter() - t0:.1f}s "
+                          f"({matrix.n_users} usuarios, {matrix.n_items} animes, {len(matrix.data)} ratings)")
+        out = write_snapshot(data_dir, anime, matrix)
+        self.stdout.write(self.style.SUCCESS(f"Snapshot escrito en {out} ({time.perf_counter() - t0:.1f}s)"))
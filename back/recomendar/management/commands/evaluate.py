@@ -0,0 +1,108 @@
+import json
+import multiprocessing as mp
+import platform
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from recomendar.utils import bench
+from recomendar.utils.evaluate import PATHS, VARIANTS, evaluate_variant, holdout_split, quality_drops
+from recomendar.utils.recommender import RecommenderData, load_anime_csv
+from recomendar.utils.snapshot import write_snapshot
+
+
+class Command(BaseCommand):
+    help = ("Evaluación offline: holdout por usuario sobre las valoraciones y, por variante y camino de "
+            "puntuación, precision/recall/NDCG@k y cobertura junto a latencia y memoria, en un informe JSON. "
+            "Con --baseline falla si la calidad baja más de --max-drop o el coste sube más de --tolerance.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--data-dir", default=str(Path(settings.BASE_DIR) / "recomendar" / "utils"))
+        parser.add_argument("--variants", nargs="+", default=["pearson_index", "svd", "popular"], choices=VARIANTS)
+        parser.add_argument("--paths", nargs="+", default=list(PATHS), choices=PATHS)
+        parser.add_argument("--k", nargs="+", type=int, default=[5, 10, 20])
+        parser.add_argument("--users", type=int, default=500, help="Usuarios evaluados (muestra)")
+        parser.add_argument("--test-frac", type=float, default=0.2, help="Fracción de valoraciones apartadas por usuario")
+        parser.add_argument("--min-ratings", type=int, default=5, help="Valoraciones mínimas para evaluar a un usuario")
+        parser.add_argument("--relevant-min", type=float, default=8.0, help="Valoración mínima de un anime relevante")
+        parser.add_argument("--minp", type=int, default=3)
+        parser.add_argument("--factors", type=int, default=64, help="Dimensión latente de las variantes svd")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--work-dir", help="Directorio para los datos de entrenamiento (por defecto, temporal)")
+        parser.add_argument("--keep", action="store_true", help="No borrar el directorio de trabajo")
+        parser.add_argument("-o", "--output", help="Fichero del informe JSON (por defecto, stdout)")
+        parser.add_argument("--baseline", help="Informe anterior con el que comparar")
+        parser.add_argument("--max-drop", type=float, default=0.01, help="Bajada absoluta admitida en las métricas @k")
+        parser.add_argument("--tolerance", type=float, default=0.25, help="Empeoramiento relativo admitido en coste")
+        parser.add_argument("--min-ms", type=float, default=0.5, help="Diferencia mínima en latencias (ms)")
+
+    def handle(self, *args, **opts):
+        data_dir = Path(opts["data_dir"])
+        ks = sorted(set(opts["k"]))
+        report = {"meta": {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"), "data_dir": str(data_dir),
+            "python": platform.python_version(), "numpy": np.__version__,
+            **{k: opts[k] for k in ("users", "test_frac", "min_ratings", "relevant_min", "minp", "factors", "seed")},
+            "k": ks,
+        }}
+
+        t0 = time.perf_counter()
+        data = RecommenderData(data_dir, deltas=False)
+        train, cases, report["split"] = holdout_split(data.matrix, users=opts["users"], test_frac=opts["test_frac"],
+                                                      min_ratings=opts["min_ratings"],
+                                                      relevant_min=opts["relevant_min"], seed=opts["seed"])
+        if not cases:
+            raise CommandError("Ningún usuario con animes relevantes en test: revisa --relevant-min/--min-ratings.")
+        work = Path(opts["work_dir"] or tempfile.mkdtemp(prefix="recomendar-eval-"))
+        work.mkdir(parents=True, exist_ok=True)
+        # datos de entrenamiento como snapshot: cada variante los abre con mmap sin parsear CSV
+        shutil.copy(data_dir / "anime.csv", work / "anime.csv")
+        write_snapshot(work, load_anime_csv(work), train)
+        del data, train
+        self.stderr.write(f"Holdout en {time.perf_counter() - t0:.1f}s: {report['split']} → {work}")
+
+        report["variants"] = {}
+        try:
+            # un proceso nuevo (spawn) por variante: carga y pico de memoria de cada una por separado
+            ctx = mp.get_context("spawn")
+            for variant in opts["variants"]:
+                t1 = time.perf_counter()
+                with ProcessPoolExecutor(1, mp_context=ctx) as ex:
+                    report["variants"][variant] = ex.submit(
+                        evaluate_variant, variant, work, cases, ks, opts["paths"], opts["minp"],
+                        opts["factors"], opts["seed"]).result()
+                self.stderr.write(f"  {variant}: {time.perf_counter() - t1:.1f}s")
+        finally:
+            if not opts["keep"] and not opts["work_dir"]:
+                shutil.rmtree(work, ignore_errors=True)
+
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if opts["output"]:
+            Path(opts["output"]).write_text(text + "\n", encoding="utf-8")
+        else:
+            self.stdout.write(text)
+
+        k = 10 if 10 in ks else ks[-1]
+        self.stderr.write(f"  {'variante / camino':<38} {'P@' + str(k):>7} {'R@' + str(k):>7} {'NDCG@' + str(k):>8} "
+                          f"{'cob@' + str(k):>7} {'p50 ms':>8} {'p95 ms':>8} {'pico MB':>8}")
+        for variant, r in report["variants"].items():
+            for path, m in r["paths"].items():
+                self.stderr.write(f"  {variant + ' / ' + path:<38} {m[f'precision@{k}']:>7.4f} {m[f'recall@{k}']:>7.4f} "
+                                  f"{m[f'ndcg@{k}']:>8.4f} {m[f'coverage@{k}']:>7.4f} "
+                                  f"{m['latency'].get('p50_ms', 0):>8.2f} {m['latency'].get('p95_ms', 0):>8.2f} "
+                                  f"{r['peak_rss_mb'] or 0:>8.0f}")
+
+        if opts["baseline"]:
+            baseline = json.loads(Path(opts["baseline"]).read_text(encoding="utf-8"))
+            problems = quality_drops(report, baseline, max_drop=opts["max_drop"])
+            # rss_delta_mb es ruidoso con pocos MB: la memoria se vigila con rss_mb y peak_rss_mb
+            problems += [p for p in bench.compare(report, baseline, tolerance=opts["tolerance"],
+                                                  min_ms=opts["min_ms"]) if ".rss_delta_mb:" not in p]
+            if problems:
+                raise CommandError(f"{len(problems)} empeoramientos frente a {opts['baseline']}:\n  "
+                                   + "\n  ".join(problems))
+            self.stderr.write(self.style.SUCCESS(f"Sin empeoramientos frente a {opts['baseline']}"))
@@ -0,0 +1,59 @@
+import time
+from pathlib import Path
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recomendar.utils.recommender import LightRecommender
+from recomendar.utils.store import STORE_FILE, STORE_FORMAT, write_store
+
+
+class Command(BaseCommand):
+    help = ("Exporta catálogo y vecinos precalculados al almacén SQLite de solo lectura "
+            "que sirve el modo serve (DJANGO_SETTINGS_MODULE=recomendar.settings_serve).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--data-dir", default=str(Path(settings.BASE_DIR) / "recomendar" / "utils"))
+        parser.add_argument("--minp", type=int, default=3)
+        parser.add_argument("--topn", type=int, default=200,
+                            help="Vecinos por anime (200 = los que usa /recommend_by_seen)")
+        parser.add_argument("-o", "--out", default=None, help=f"Fichero destino (por defecto <data-dir>/{STORE_FILE})")
+
+    def handle(self, *args, **opts):
+        data_dir = Path(opts["data_dir"])
+        out = Path(opts["out"]) if opts["out"] else data_dir / STORE_FILE
+        topn = opts["topn"]
+        t0 = time.perf_counter()
+        # con ratings_delta.csv aplicado: el almacén refleja todas las valoraciones
+        rec = LightRecommender(data_dir, min_periods=opts["minp"])
+        data, catalog = rec.data, rec.catalog
+        self.stdout.write(f"Datos cargados en {time.perf_counter() - t0:.1f}s "
+                          f"({rec.matrix.n_users} usuarios, {rec.matrix.n_items} animes)")
+
+        n = len(data.anime)
+        pop_rank = np.empty(n, dtype="int64")
+        pop_rank[data.titles_index.positions] = np.arange(n)
+        folded = [""] * n
+        for rank, row in enumerate(data.titles_index.positions.tolist()):
+            folded[row] = data.titles_index.folded[rank]
+        anime = zip(range(n), data.anime["anime_id"].tolist(), data.anime["name"].astype(str).tolist(),
+                    data.anime["genre"].astype(str).tolist(), data.anime["episodes"].tolist(),
+                    data.anime["members"].tolist(), catalog.rating_count.tolist(),
+                    data.anime["name_norm"].tolist(), folded, data.name_rank[:n].tolist(), pop_rank.tolist())
+
+        t1 = time.perf_counter()
+        item_ids = rec.matrix.item_ids.tolist()
+
+        def neighbors():
+            for j, aid in enumerate(item_ids, 1):
+                ids, corr, _ = rec._neighbors(aid, topn)
+                if len(ids):
+                    yield (aid, np.asarray(ids, dtype="int32").tobytes(), np.asarray(corr, dtype="float32").tobytes(),
+                           data.anime_rows(ids).astype("int32").tobytes())
+                if j % 1000 == 0 or j == len(item_ids):
+                    self.stdout.write(f"  {j}/{len(item_ids)} animes ({time.perf_counter() - t1:.1f}s)")
+
+        meta = {"format": STORE_FORMAT, "version": rec.version, "minp": rec.min_periods, "engine": rec.engine,
+                "topn": topn, "n_anime": n, "has_counts": catalog.has_counts, "created": time.time()}
+        write_store(out, meta, anime, neighbors())
+        self.stdout.write(self.style.SUCCESS(
+            f"Almacén escrito en {out} ({out.stat().st_size / 1e6:.1f} MB, {time.perf_counter() - t0:.1f}s)"))
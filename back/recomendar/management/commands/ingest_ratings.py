@@ -0,0 +1,26 @@
+import time
+from pathlib import Path
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from recomendar.utils.deltas import append, delta_path, validate
+
+
+class Command(BaseCommand):
+    help = ("Añade valoraciones nuevas (CSV user_id,anime_id,rating) a ratings_delta.csv. "
+            "Los servidores en marcha las aplican en su siguiente petición, sin recargar.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="CSV con columnas user_id, anime_id, rating")
+        parser.add_argument("--data-dir", default=str(Path(settings.BASE_DIR) / "recomendar" / "utils"))
+
+    def handle(self, *args, **opts):
+        data_dir = Path(opts["data_dir"])
+        t0 = time.perf_counter()
+        try:
+            df = validate(pd.read_csv(opts["input"]))
+        except ValueError as e:
+            raise CommandError(str(e))
+        n = append(data_dir, df)
+        self.stdout.write(self.style.SUCCESS(
+            f"{n} valoraciones añadidas a {delta_path(data_dir)} ({time.perf_counter() - t0:.1f}s)"))
@@ -0,0 +1,67 @@
+import multiprocessing as mp
+import sys
+import time
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recomendar.utils.batch import DEFAULT_CHUNK, chunked, parse_lines, recommend_chunk
+from recomendar.utils.recommender import get_recommender
+
+# recomendador del proceso worker (se carga una vez en el initializer)
+_rec = None
+_topk = 10
+
+
+def _init_worker(data_dir, minp, engine, topk):
+    global _rec, _topk
+    _rec = get_recommender(Path(data_dir), min_periods=minp, engine=engine)
+    _topk = topk
+
+
+def _run_chunk(lines):
+    return recommend_chunk(_rec, list(parse_lines(lines)), topk=_topk)
+
+
+class Command(BaseCommand):
+    help = ("Recomendaciones por lotes: lee JSON lines (una petición por usuario, claves de "
+            "/recommend_by_seen y 'user') y escribe JSON lines con los resultados en el mismo orden.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="Fichero JSON lines de entrada ('-' para stdin)")
+        parser.add_argument("-o", "--output", default="-", help="Fichero JSON lines de salida ('-' para stdout)")
+        parser.add_argument("--data-dir", default=str(Path(settings.BASE_DIR) / "recomendar" / "utils"))
+        parser.add_argument("--minp", type=int, default=3)
+        parser.add_argument("--engine", default="pearson")
+        parser.add_argument("--topk", type=int, default=10)
+        parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="Usuarios puntuados juntos por bloque")
+        parser.add_argument("--workers", type=int, default=1, help="Procesos (1 = en este proceso)")
+
+    def handle(self, *args, **opts):
+        t0 = time.perf_counter()
+        data_dir, minp, engine, topk = opts["data_dir"], opts["minp"], opts["engine"], opts["topk"]
+        # se carga aquí primero: los errores salen antes de arrancar el pool y, con fork,
+        # los workers heredan los datos ya cargados (el snapshot mmap se comparte)
+        _init_worker(data_dir, minp, engine, topk)
+
+        src = sys.stdin if opts["input"] == "-" else open(opts["input"], encoding="utf-8")
+        dst = sys.stdout if opts["output"] == "-" else open(opts["output"], "w", encoding="utf-8")
+        n = 0
+        try:
+            chunks = chunked(src, opts["chunk"])
+            if opts["workers"] > 1:
+                ctx = mp.get_context("fork") if "fork" in mp.get_all_start_methods() else mp.get_context()
+                with ctx.Pool(opts["workers"], initializer=_init_worker,
+                              initargs=(data_dir, minp, engine, topk)) as pool:
+                    for lines in pool.imap(_run_chunk, chunks):
+                        dst.write("".join(line + "\n" for line in lines))
+                        n += len(lines)
+            else:
+                for lines in map(_run_chunk, chunks):
+                    dst.write("".join(line + "\n" for line in lines))
+                    n += len(lines)
+        finally:
+            if src is not sys.stdin:
+                src.close()
+            if dst is not sys.stdout:
+                dst.close()
+        self.stderr.write(self.style.SUCCESS(f"{n} usuarios en {time.perf_counter() - t0:.1f}s"))
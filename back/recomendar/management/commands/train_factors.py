@@ -0,0 +1,33 @@
+import time
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recomendar.utils.factorization import FactorModel
+from recomendar.utils.recommender import RecommenderData
+
+
+class Command(BaseCommand):
+    help = "Entrena el motor de factores latentes (SVD truncada) y guarda factors.npz."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--data-dir", default=str(Path(settings.BASE_DIR) / "recomendar" / "utils"))
+        parser.add_argument("--k", type=int, default=64, help="Dimensión latente")
+        parser.add_argument("--iters", type=int, default=4, help="Iteraciones de potencia")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **opts):
+        data_dir = Path(opts["data_dir"])
+        t0 = time.perf_counter()
+        data = RecommenderData(data_dir, deltas=False)
+        self.stdout.write(f"Datos cargados en {time.perf_counter() - t0:.1f}s "
+                          f"({data.matrix.n_users} usuarios, {data.matrix.n_items} animes)")
+
+        t1 = time.perf_counter()
+        model = FactorModel.train(data.matrix, k=opts["k"], n_iter=opts["iters"], seed=opts["seed"],
+                                  data_version=data.data_version,
+                                  progress=lambda msg: self.stdout.write(f"  {msg} ({time.perf_counter() - t1:.1f}s)"))
+        out = FactorModel.path_for(data_dir)
+        model.save(out)
+        self.stdout.write(self.style.SUCCESS(
+            f"Factores k={opts['k']} de {len(model.item_ids)} animes guardados en {out} "
+            f"({time.perf_counter() - t1:.1f}s)"))
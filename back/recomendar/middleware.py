@@ -1,15 +1,83 @@
-import time, logging
-from typing import Callable
+import os, random, time, logging
+from pathlib import Path
+from typing import Callable, Optional
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from .utils import metrics
 logger = logging.getLogger("recomendar.request")
+profile_logger = logging.getLogger("recomendar.profile")
+
+request_seconds = metrics.histogram("recomendar_request_seconds", "Duración de las peticiones HTTP",
+                                    ["method", "route", "status"])
+
 
 class RequestTimingMiddleware:
+    """
+    Duración por petición (log e histograma de /metrics) con el desglose por etapa de utils/metrics.py.
+    Perfilador opcional por muestreo (PROFILE_SLOW_MS): en una fracción PROFILE_SAMPLE de las
+    peticiones se muestrean las pilas cada PROFILE_INTERVAL_MS y, si la petición supera el umbral,
+    se registran las más frecuentes (y en PROFILE_DIR, el perfil completo en formato folded).
+    """
+    # síncrono y asíncrono: con ASGI no fuerza a ejecutar las vistas async en un hilo
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response: Callable):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        slow = os.environ.get("PROFILE_SLOW_MS")
+        self.slow_s = float(slow) / 1000 if slow else None
+        self.sample = float(os.environ.get("PROFILE_SAMPLE", 1.0))
+        self.interval = float(os.environ.get("PROFILE_INTERVAL_MS", 5)) / 1000
+        profile_dir = os.environ.get("PROFILE_DIR")
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+
+    def _start(self):
+        stats, token = metrics.begin_request()
+        sampler = None
+        if self.slow_s is not None and random.random() < self.sample:
+            sampler = metrics.StackSampler(stats, self.interval).start()
+        return stats, token, sampler, time.perf_counter()
+
+    def _finish(self, request, response, state) -> None:
+        stats, token, sampler, t0 = state
+        elapsed = time.perf_counter() - t0
+        metrics.end_request(token)
+        code = getattr(response, "status_code", "?")
+        match = getattr(request, "resolver_match", None)
+        request_seconds.observe(elapsed, request.method, match.route if match else "", code)
+        stages = stats.summary()
+        logger.info("%s %s -> %s in %.3fs%s", request.method, request.path, code, elapsed,
+                    f" [{stages}]" if stages else "")
+        if sampler is not None:
+            sampler.stop()
+            if elapsed >= self.slow_s:
+                self._report(request, elapsed, stages, sampler)
+
+    def _report(self, request, elapsed: float, stages: str, sampler: metrics.StackSampler) -> None:
+        top = sampler.counts.most_common(5)
+        total = sum(sampler.counts.values()) or 1
+        lines = [f"  {n * 100 // total:3d}%  " + " <- ".join(reversed(stack.split(";")[-4:])) for stack, n in top]
+        path: Optional[Path] = None
+        if self.profile_dir is not None:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            name = request.path.strip("/").replace("/", "_") or "root"
+            path = self.profile_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{int(elapsed * 1000)}ms.folded"
+            path.write_text(sampler.folded(), encoding="utf-8")
+        profile_logger.warning("Petición lenta %s %s: %.3fs [%s], %d muestras%s\n%s",
+                               request.method, request.path, elapsed, stages, total,
+                               f" → {path}" if path else "", "\n".join(lines))
 
     def __call__(self, request):
-        t0 = time.time()
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self._start()
         response = self.get_response(request)
-        logger.info("%s %s -> %s in %.3fs",
-                    request.method, request.path, getattr(response, "status_code", "?"),
-                    time.time() - t0)
+        self._finish(request, response, state)
+        return response
+
+    async def __acall__(self, request):
+        state = self._start()
+        response = await self.get_response(request)
+        self._finish(request, response, state)
         return response
@@ -0,0 +1,193 @@
+"""
+Vistas del modo serve (settings_serve.py): mismas rutas y respuestas que views.py para
+consultas sin filtros, leídas del almacén exportado con `manage.py export_store`
+(utils/store.py). No importan DRF, numpy, pandas ni el recomendador.
+"""
+import json
+from typing import Any, Mapping, Tuple
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from .utils.batch import parse_lines
+from .utils.httpcache import etag_for, headers_for, matches, not_modified
+from .utils.metrics import render as render_metrics, span
+from .utils.store import get_store
+
+# parámetros que necesitan el recomendador completo
+UNSUPPORTED = ("genre", "genre_mode", "exclude_genre", "min_episodes", "max_episodes", "diversity")
+_JSON = {"ensure_ascii": False, "separators": (",", ":"), "allow_nan": False}
+
+
+def _json(payload: Any, code: int, headers=None) -> HttpResponse:
+    if code == 304:
+        resp = HttpResponseNotModified()
+    elif isinstance(payload, bytes):
+        resp = HttpResponse(payload, status=code, content_type="application/json")
+    else:
+        resp = JsonResponse(payload, status=code, safe=False, json_dumps_params=_JSON)
+    for k, v in (headers or {}).items():
+        resp[k] = v
+    return resp
+
+
+def _store():
+    return get_store(settings.SERVE_STORE)
+
+
+def _check(store, params: Mapping, minp: int = None, engine: str = None) -> None:
+    """ValueError si la consulta no se puede responder desde el almacén."""
+    used = [k for k in UNSUPPORTED if params.get(k) not in (None, "", [], 0, "0")]
+    if used:
+        raise ValueError(f"No disponible en modo serve: {', '.join(used)}.")
+    if minp is not None and minp != store.min_periods:
+        raise ValueError(f"El almacén se exportó con minp={store.min_periods}.")
+    if engine is not None and engine != store.engine:
+        raise ValueError(f"El almacén se exportó con engine={store.engine}.")
+
+
+def getrecomenders_payload(params: Mapping) -> Tuple[Any, int]:
+    q = params.get("q", "")
+    topk = int(params.get("topk", 10))
+    minp = int(params.get("minp", 3))
+    engine = params.get("engine", "pearson")
+
+    if not q.strip():
+        return {"error": "Parámetro 'q' requerido."}, 400
+    try:
+        store = _store()
+        _check(store, params, minp, engine)
+        aid = store.title_to_id(q)
+        if aid is None:
+            return b"[]", 200
+        top = store.similar(aid, topk)
+        with span("serialize"):
+            return store.scored_json(top, field=b"correlation"), 200
+    except Exception as e:
+        return {"error": str(e)}, 400
+
+
+def titles_payload(params: Mapping) -> Tuple[Any, int]:
+    s = params.get("s", "").strip()
+    limit = max(1, min(int(params.get("limit", 50)), 500))
+    offset = max(0, int(params.get("offset", 0)))
+    min_r = int(params.get("min_r", 0))
+
+    try:
+        store = _store()
+        _check(store, params)
+        if s:
+            rows = store.search(s, min_r)
+            total = len(rows)
+            rows = rows[:limit]
+        else:
+            rows, total = store.page(offset=offset, limit=limit, min_r=min_r)
+        with span("serialize"):
+            results = store.catalog_json(rows)
+        return b'{"count":%d,"results":%s}' % (total, results), 200
+    except Exception as e:
+        return {"error": str(e)}, 400
+
+
+def recommend_by_seen_payload(data: Any, params: Mapping) -> Tuple[Any, int]:
+    data = data if isinstance(data, dict) else {}
+    seen_names = data.get("seen_names") or []
+    seen_ids = data.get("seen_ids") or []
+    minp = int(params.get("minp", data.get("minp", 3)))
+    engine = params.get("engine", data.get("engine", "pearson"))
+
+    if not seen_names and not seen_ids:
+        return {"error": "Debes enviar 'seen_names' o 'seen_ids'."}, 400
+    try:
+        store = _store()
+        _check(store, {**data, **params}, minp, engine)
+        top = store.recommend(seen_ids, seen_names, data.get("ratings") or None,
+                              float(data.get("rating", 10.0)), int(data.get("topk", 10)))
+        with span("serialize"):
+            return store.scored_json(top), 200
+    except Exception as e:
+        return {"error": str(e)}, 400
+
+
+def _cached(route: str, request, fn) -> HttpResponse:
+    # el almacén es inmutable: su versión identifica las respuestas
+    params = request.GET.dict()
+    try:
+        etag = etag_for(_store().version, route, params)
+    except Exception:
+        return _json(*fn(params))
+    if matches(request.headers.get("If-None-Match"), etag):
+        not_modified.inc(route)
+        return _json(b"", 304, headers_for(etag))
+    payload, code = fn(params)
+    return _json(payload, code, headers_for(etag) if code == 200 else None)
+
+
+@require_GET
+def healthz(_request):
+    return _json({"status": "ok"}, 200)
+
+
+@require_GET
+def readyz(_request):
+    try:
+        store = _store()
+    except Exception as e:
+        return _json({"status": "error", "error": str(e)}, 503)
+    return _json({"status": "ready", "store": str(store.path), "version": store.version}, 200)
+
+
+@require_GET
+def metrics(_request):
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@require_GET
+def getrecomenders(request):
+    return _cached("getrecomenders", request, getrecomenders_payload)
+
+
+@require_GET
+def titles(request):
+    return _cached("titles", request, titles_payload)
+
+
+@csrf_exempt
+@require_POST
+def recommend_by_seen(request):
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        return _json({"error": "JSON inválido."}, 400)
+    return _json(*recommend_by_seen_payload(data, request.GET.dict()))
+
+
+@csrf_exempt
+@require_POST
+def recommend_batch(request):
+    topk = int(request.GET.get("topk", 10))
+    try:
+        store = _store()
+        _check(store, {}, int(request.GET.get("minp", 3)), request.GET.get("engine", "pearson"))
+    except Exception as e:
+        return _json({"error": str(e)}, 400)
+
+    def stream():
+        for r in parse_lines(request.body.splitlines()):
+            if "error" not in r:
+                try:
+                    top = store.recommend(r.get("seen_ids"), r.get("seen_names"), r.get("ratings"),
+                                          float(r.get("rating", 10.0)), int(r.get("topk", topk)))
+                    r = {"user": r.get("user"), "results": store.items(top)}
+                except Exception as e:
+                    r = {"user": r.get("user"), "error": str(e)}
+            yield json.dumps(r, ensure_ascii=False) + "\n"
+
+    return StreamingHttpResponse(stream(), content_type="application/x-ndjson")
+
+
+@csrf_exempt
+@require_POST
+def ingest_ratings(_request):
+    return _json({"error": "Modo serve de solo lectura: las valoraciones se ingieren en el despliegue completo "
+                           "y se publican con manage.py export_store."}, 405)
@@ -0,0 +1,30 @@
+"""
+Perfil serve-only: DJANGO_SETTINGS_MODULE=recomendar.settings_serve.
+
+Sirve las lecturas desde el almacén de solo lectura exportado con `manage.py export_store`
+(serve_views.py): sin admin, auth, sesiones, DRF ni base de datos, y sin importar numpy,
+pandas ni el recomendador, así que los workers arrancan en milisegundos y ocupan poca memoria.
+  SERVE_STORE  ruta del almacén (por defecto recomendar/utils/serve.sqlite3)
+"""
+import os
+from pathlib import Path
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+SERVE_STORE = Path(os.environ.get("SERVE_STORE", BASE_DIR / "recomendar" / "utils" / "serve.sqlite3"))
+
+DEBUG = os.environ.get("DJANGO_DEBUG", "0") == "1"
+
+INSTALLED_APPS = [
+    "recomendar.apps.RecomendarConfig",
+]
+
+MIDDLEWARE = [
+    'django.middleware.common.CommonMiddleware',
+    "recomendar.middleware.RequestTimingMiddleware",
+]
+
+TEMPLATES = []
+DATABASES = {}
+AUTH_PASSWORD_VALIDATORS = []
+USE_I18N = False
@@ -0,0 +1,75 @@
+import shutil
+import tempfile
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+from .utils.cache import ResultCache
+from .utils.neighbors import NeighborIndex, RatingsMatrix
+from .utils.recommender import LightRecommender, RecommenderData, load_anime_csv, load_ratings_csv
+from .utils.snapshot import write_snapshot
+
+
+def _write_csvs(data_dir: Path, users: int = 60, items: int = 25, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    rows = [(u, a, int(rng.integers(1, 11))) for u in range(users) for a in range(items) if rng.random() < 0.5]
+    pd.DataFrame(rows, columns=["user_id", "anime_id", "rating"]).to_csv(data_dir / "ratings_clean_1.csv", index=False)
+    pd.DataFrame({"anime_id": range(items), "name": [f"Anime {a}" for a in range(items)],
+                  "members": range(items, 0, -1), "genre": "Action", "episodes": 12}).to_csv(
+        data_dir / "anime.csv", index=False)
+
+
+class DataVersionTests(SimpleTestCase):
+    def setUp(self):
+        self.data_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        _write_csvs(self.data_dir)
+
+    def test_index_survives_snapshot_of_same_csvs(self):
+        csv_data = RecommenderData(self.data_dir, deltas=False)
+        NeighborIndex.build(csv_data.matrix, 3, data_version=csv_data.data_version).save(
+            NeighborIndex.path_for(self.data_dir, 3))
+        write_snapshot(self.data_dir, load_anime_csv(self.data_dir),
+                       RatingsMatrix.from_frame(load_ratings_csv(self.data_dir)))
+
+        snap_data = RecommenderData(self.data_dir, deltas=False)
+        self.assertIsNotNone(snap_data.snapshot)
+        self.assertEqual(snap_data.data_version, csv_data.data_version)
+        rec = LightRecommender(self.data_dir, 3, cache=ResultCache(), data=snap_data)
+        self.assertIsNotNone(rec.neighbors)
+
+
+class SnapshotTests(SimpleTestCase):
+    def setUp(self):
+        self.data_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.data_dir)
+        _write_csvs(self.data_dir)
+
+    def test_rebuild_keeps_mapped_snapshot_readable(self):
+        matrix = RatingsMatrix.from_frame(load_ratings_csv(self.data_dir))
+        write_snapshot(self.data_dir, load_anime_csv(self.data_dir), matrix)
+        live = RecommenderData(self.data_dir, deltas=False).matrix   # arrays mapeados
+        before = np.array(live.data)
+
+        _write_csvs(self.data_dir, users=80, seed=1)
+        write_snapshot(self.data_dir, load_anime_csv(self.data_dir),
+                       RatingsMatrix.from_frame(load_ratings_csv(self.data_dir)))
+        np.testing.assert_array_equal(live.data, before)
+        self.assertEqual(RecommenderData(self.data_dir, deltas=False).matrix.n_users, 80)
+        self.assertEqual(sorted(p.name for p in self.data_dir.iterdir() if "snapshot" in p.name), ["snapshot"])
+
+
+class SQLiteBackendTests(SimpleTestCase):
+    def test_invalidate_ids_deletes_shared_entries(self):
+        from .utils.cache import SQLiteBackend
+        tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, tmp)
+        backend = SQLiteBackend(tmp / "cache.sqlite3")
+        writer = ResultCache(backend=backend)
+        value = (np.arange(3), np.ones(3))
+        for aid in range(1200):
+            writer.put((aid, 10, 3, "v"), value)
+        ResultCache(backend=backend).invalidate_ids(range(0, 1200, 2))
+        reader = ResultCache(backend=backend)
+        self.assertIsNone(reader.get((4, 10, 3, "v")))
+        self.assertIsNotNone(reader.get((5, 10, 3, "v")))
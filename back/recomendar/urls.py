@@ -1,9 +1,23 @@
+import os
+from django.conf import settings
 from django.urls import path
-from .views import healthz, getrecomenders, recommend_by_seen, titles
+
+# Perfil serve-only (settings_serve.py): lecturas desde el almacén exportado, sin el recomendador
+if getattr(settings, "SERVE_STORE", None):
+    from . import serve_views as views
+# ASGI (asgi.py fija RECOMENDAR_ASYNC=1): vistas asíncronas con cálculo fuera del event loop
+elif os.environ.get("RECOMENDAR_ASYNC") == "1":
+    from . import async_views as views
+else:
+    from . import views
 
 urlpatterns = [
-    path("healthz", healthz, name="healthz"),
-    path("getrecomenders", getrecomenders, name="getrecomenders"),
-    path("recommend_by_seen", recommend_by_seen, name="recommend_by_seen"),
-    path("titles", titles, name="titles"),
+    path("healthz", views.healthz, name="healthz"),
+    path("readyz", views.readyz, name="readyz"),
+    path("metrics", views.metrics, name="metrics"),
+    path("getrecomenders", views.getrecomenders, name="getrecomenders"),
+    path("recommend_by_seen", views.recommend_by_seen, name="recommend_by_seen"),
+    path("recommend_batch", views.recommend_batch, name="recommend_batch"),
+    path("titles", views.titles, name="titles"),
+    path("ratings", views.ingest_ratings, name="ingest_ratings"),
 ]
@@ -1,54 +1,150 @@
+"""
+Limpieza de rating.csv → ratings_clean_1.csv (y opcionalmente el snapshot binario).
+
+Se procesa en streaming, por bloques y con dtypes compactos:
+  1ª pasada: conteo de reviews y de '-1' por usuario (bincount por bloque).
+  2ª pasada: se escriben solo las filas de los usuarios válidos seleccionados.
+El tope de filas se aplica sobre los conteos de la 1ª pasada (usuarios en orden de
+user_id, incluyendo entero el usuario que cruza el tope), sin agrupar en memoria.
+
+Uso (desde back/):
+    python -m recomendar.utils.Anime_limpieza rating.csv -o recomendar/utils/ratings_clean_1.csv
+    python -m recomendar.utils.Anime_limpieza rating.csv --snapshot recomendar/utils
+"""
+from __future__ import annotations
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+import numpy as np
 import pandas as pd
 
-input_path = "rating.csv"         
-output_path = "ratings_clean_1.csv"  
-max_rows = 7_000_000                  
-min_reviews = 50                      
-max_missing = 0                   
-
-
-df = pd.read_csv(input_path)
-
-
-expected_cols = {"user_id", "anime_id", "rating"}
-if not expected_cols.issubset(df.columns):
-    raise ValueError(f"El CSV debe contener las columnas: {expected_cols}")
-
-
-user_stats = (
-    df.groupby("user_id")["rating"]
-      .agg(total_reviews="count", missing_reviews=lambda x: (x == -1).sum())
-      .reset_index()
-)
-
-
-valid_users = user_stats[
-    (user_stats["total_reviews"] >= min_reviews) &
-    (user_stats["missing_reviews"] <= max_missing)
-]["user_id"]
-
-df_filtered = df[df["user_id"].isin(valid_users)].copy()
-
-
-df_filtered.sort_values(by="user_id", inplace=True)
-
-
-final_users = []
-total_rows = 0
-
-for user_id, group in df_filtered.groupby("user_id"):
-    group_size = len(group)
-    total_rows += group_size
-    final_users.append(group)
-    if total_rows >= max_rows:
-        break
-
-df_clean = pd.concat(final_users, ignore_index=True)
-
-df_clean.to_csv(output_path, index=False)
-
-
-print(f"Usuarios originales: {df['user_id'].nunique()}")
-print(f"Usuarios válidos (>= {min_reviews} reviews y <= {max_missing} '-1'): {len(valid_users)}")
-print(f"Total de filas finales: {len(df_clean)} (objetivo {max_rows})")
-print(f"Archivo limpio guardado en: {output_path}")
\ No newline at end of file
+EXPECTED_COLS = ["user_id", "anime_id", "rating"]
+DTYPES = {"user_id": "int32", "anime_id": "int32", "rating": "int8"}
+
+
+def _chunks(path: Path, chunksize: int, usecols=EXPECTED_COLS) -> Iterator[pd.DataFrame]:
+    header = pd.read_csv(path, nrows=0).columns
+    if not set(EXPECTED_COLS).issubset(header):
+        raise ValueError(f"El CSV debe contener las columnas: {set(EXPECTED_COLS)}")
+    yield from pd.read_csv(path, usecols=usecols, dtype={c: DTYPES[c] for c in usecols},
+                           chunksize=chunksize)
+
+
+def _grow(a: np.ndarray, n: int) -> np.ndarray:
+    return a if len(a) >= n else np.concatenate([a, np.zeros(n - len(a), dtype=a.dtype)])
+
+
+def count_users(path: Path, chunksize: int) -> Tuple[np.ndarray, np.ndarray, bool, int]:
+    """1ª pasada: (total_reviews, missing_reviews) indexados por user_id, si viene ordenado y nº de filas."""
+    total = np.zeros(0, dtype="int64")
+    missing = np.zeros(0, dtype="int64")
+    is_sorted, last, rows = True, -1, 0
+    for chunk in _chunks(path, chunksize, usecols=["user_id", "rating"]):
+        uid = chunk["user_id"].to_numpy()
+        if len(uid) == 0:
+            continue
+        if uid.min() < 0:
+            raise ValueError("user_id negativo en el CSV")
+        n = int(uid.max()) + 1
+        total, missing = _grow(total, n), _grow(missing, n)
+        total[:n] += np.bincount(uid, minlength=n)
+        missing[:n] += np.bincount(uid[chunk["rating"].to_numpy() == -1], minlength=n)
+        is_sorted = is_sorted and bool(uid[0] >= last) and bool(np.all(uid[1:] >= uid[:-1]))
+        last = int(uid[-1])
+        rows += len(uid)
+    return total, missing, is_sorted, rows
+
+
+def select_users(total: np.ndarray, missing: np.ndarray, min_reviews: int,
+                 max_missing: int, max_rows: int) -> Tuple[np.ndarray, int]:
+    """Máscara por user_id de los usuarios que entran y nº de usuarios válidos."""
+    valid = (total >= min_reviews) & (missing <= max_missing)
+    ids = np.flatnonzero(valid)
+    sizes = total[ids]
+    before = np.cumsum(sizes) - sizes
+    keep = np.zeros(len(total), dtype=bool)
+    keep[ids[before < max_rows]] = True
+    return keep, int(len(ids))
+
+
+def write_filtered(path: Path, output: Optional[Path], keep: np.ndarray, is_sorted: bool,
+                   chunksize: int, collect: bool = False) -> Tuple[int, Optional[pd.DataFrame]]:
+    """
+    2ª pasada. Si la entrada ya viene ordenada por user_id se escribe bloque a bloque;
+    si no, se acumulan solo las filas seleccionadas (acotadas por el tope) y se ordenan al final.
+    Devuelve (nº de filas, DataFrame si `collect`).
+    """
+    stream = is_sorted and output is not None
+    buffer = collect or (output is not None and not stream)
+    parts, n, first = [], 0, True
+    for chunk in _chunks(path, chunksize):
+        sel = chunk[keep[chunk["user_id"].to_numpy()]]
+        if sel.empty:
+            continue
+        n += len(sel)
+        if stream:
+            sel.to_csv(output, mode="w" if first else "a", header=first, index=False)
+            first = False
+        if buffer:
+            parts.append(sel)
+
+    df = None
+    if buffer:
+        df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=EXPECTED_COLS)
+        if not is_sorted:
+            df = df.sort_values("user_id", kind="stable", ignore_index=True)
+    if output is not None and (not stream or first):
+        (df if df is not None else pd.DataFrame(columns=EXPECTED_COLS)).to_csv(output, index=False)
+    return n, (df if collect else None)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Filtra rating.csv por usuario en streaming.")
+    parser.add_argument("input", nargs="?", default="rating.csv")
+    parser.add_argument("-o", "--output", default="ratings_clean_1.csv",
+                        help="CSV de salida ('-' para no escribir CSV)")
+    parser.add_argument("--max-rows", type=int, default=7_000_000)
+    parser.add_argument("--min-reviews", type=int, default=50)
+    parser.add_argument("--max-missing", type=int, default=0)
+    parser.add_argument("--chunksize", type=int, default=1_000_000)
+    parser.add_argument("--snapshot", default=None, metavar="DATA_DIR",
+                        help="escribe también el snapshot binario en DATA_DIR/snapshot (necesita DATA_DIR/anime.csv)")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    src = Path(args.input)
+    output = None if args.output == "-" else Path(args.output)
+
+    total, missing, is_sorted, rows = count_users(src, args.chunksize)
+    keep, n_valid = select_users(total, missing, args.min_reviews, args.max_missing, args.max_rows)
+    print(f"1ª pasada: {rows} filas en {time.perf_counter() - t0:.1f}s")
+
+    n_rows, df_clean = write_filtered(src, output, keep, is_sorted, args.chunksize,
+                                      collect=bool(args.snapshot))
+
+    print(f"Usuarios originales: {int((total > 0).sum())}")
+    print(f"Usuarios válidos (>= {args.min_reviews} reviews y <= {args.max_missing} '-1'): {n_valid}")
+    print(f"Total de filas finales: {n_rows} (objetivo {args.max_rows})")
+    if output is not None:
+        print(f"Archivo limpio guardado en: {output}")
+
+    if args.snapshot:
+        if not __package__:
+            sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+        from recomendar.utils.neighbors import RatingsMatrix
+        from recomendar.utils.recommender import load_anime_csv
+        from recomendar.utils.snapshot import write_snapshot
+
+        data_dir = Path(args.snapshot)
+        ratings = df_clean[df_clean["rating"] != -1].astype({"rating": "float32"})
+        out = write_snapshot(data_dir, load_anime_csv(data_dir), RatingsMatrix.from_frame(ratings))
+        print(f"Snapshot escrito en: {out}")
+
+    print(f"Tiempo total: {time.perf_counter() - t0:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Optional, Tuple
+import numpy as np
+from .neighbors import _concat_ranges
+
+
+def spherical_kmeans(X: np.ndarray, k: int, n_iter: int = 20, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """k-means sobre vectores unitarios (asignación por producto escalar). Devuelve (centroides, asignación)."""
+    rng = np.random.default_rng(seed)
+    k = max(1, min(int(k), len(X)))
+    C = X[rng.choice(len(X), size=k, replace=False)].astype("float32")
+    assign = np.zeros(len(X), dtype="int64")
+    for _ in range(n_iter):
+        assign = np.argmax(X @ C.T, axis=1)
+        sums = np.zeros_like(C)
+        np.add.at(sums, assign, X)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        if empty.any():
+            # listas vacías: se re-siembran con los puntos peor representados
+            worst = np.argsort((X * C[assign]).sum(axis=1))[:int(empty.sum())]
+            sums[empty] = X[worst]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        C = (sums / np.where(norms > 0, norms, 1.0)).astype("float32")
+    return C, np.argmax(X @ C.T, axis=1)
+
+
+class IVFIndex:
+    """
+    Índice aproximado de vecinos (IVF): los vectores se agrupan por k-means en `nlist`
+    listas y una consulta solo puntúa las `nprobe` listas con centroide más cercano.
+    nprobe es el mando recall/latencia: nprobe = nlist equivale a búsqueda exacta.
+    """
+
+    FILENAME = "ann_ivf.npz"
+
+    def __init__(self, centroids: np.ndarray, list_ptr: np.ndarray, ids: np.ndarray,
+                 vectors: np.ndarray, nprobe: int = 8, source: str = ""):
+        self.centroids = centroids
+        self.list_ptr = list_ptr
+        self.ids = ids
+        self.vectors = vectors
+        self.nprobe = int(nprobe)
+        self.source = source      # huella del modelo de factores del que salen los vectores
+
+    @property
+    def nlist(self) -> int:
+        return int(len(self.centroids))
+
+    @classmethod
+    def path_for(cls, data_dir: Path) -> Path:
+        return Path(data_dir) / cls.FILENAME
+
+    @classmethod
+    def build(cls, ids: np.ndarray, vectors: np.ndarray, nlist: Optional[int] = None,
+              nprobe: int = 8, n_iter: int = 20, seed: int = 0, source: str = "") -> "IVFIndex":
+        vectors = np.asarray(vectors, dtype="float32")
+        if nlist is None:
+            nlist = max(1, int(np.sqrt(len(vectors))))
+        C, assign = spherical_kmeans(vectors, nlist, n_iter=n_iter, seed=seed)
+        order = np.argsort(assign, kind="stable")
+        list_ptr = np.zeros(len(C) + 1, dtype="int64")
+        np.cumsum(np.bincount(assign, minlength=len(C)), out=list_ptr[1:])
+        return cls(C, list_ptr, np.asarray(ids)[order], vectors[order], nprobe=nprobe, source=source)
+
+    def save(self, path: Path) -> None:
+        with open(path, "wb") as fh:
+            np.savez(fh, centroids=self.centroids, list_ptr=self.list_ptr, ids=self.ids,
+                     vectors=self.vectors, nprobe=np.array(self.nprobe), source=np.array(self.source))
+
+    @classmethod
+    def load(cls, path: Path, nprobe: Optional[int] = None) -> "IVFIndex":
+        with np.load(path) as z:
+            return cls(z["centroids"], z["list_ptr"], z["ids"], z["vectors"],
+                       nprobe=int(z["nprobe"]) if nprobe is None else nprobe, source=str(z["source"]))
+
+    def search(self, query: np.ndarray, topk: int, nprobe: Optional[int] = None,
+               exclude: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids, scores) de los topk vectores con mayor producto escalar con `query`."""
+        nprobe = min(int(nprobe or self.nprobe), self.nlist)
+        cs = self.centroids @ query
+        probe = np.argpartition(-cs, nprobe - 1)[:nprobe] if nprobe < self.nlist else np.arange(self.nlist)
+        rows = _concat_ranges(self.list_ptr[probe], self.list_ptr[probe + 1] - self.list_ptr[probe])
+        if exclude is not None:
+            rows = rows[self.ids[rows] != exclude]
+        if len(rows) == 0:
+            return np.empty(0, dtype=self.ids.dtype), np.empty(0, dtype="float32")
+        scores = self.vectors[rows] @ query
+        k = min(int(topk), len(rows))
+        if k < len(rows):
+            part = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[part], scores[part]
+        order = np.argsort(-scores, kind="stable")
+        return self.ids[rows[order]], scores[order].astype("float32")
@@ -0,0 +1,117 @@
+"""
+Recomendaciones por lotes (JSON lines): una línea de entrada por usuario,
+  {"user": <id>, "seen_ids": [...], "seen_names": [...], "ratings": {...}, "rating": 10, "topk": 10}
+y una línea de salida por usuario, en el mismo orden:
+  {"user": <id>, "results": [{anime_id, name, score, genre, episodes}]}  ó  {"user": <id>, "error": "..."}
+Se usa desde POST /recommend_batch y desde manage.py recommend_batch.
+"""
+from __future__ import annotations
+import json
+from itertools import islice
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional
+
+if TYPE_CHECKING:   # el modo serve usa parse_lines/chunked sin cargar numpy ni pandas
+    from .recommender import LightRecommender
+
+DEFAULT_CHUNK = 256
+
+
+def _coerce(req: dict) -> dict:
+    """Normaliza tipos (ids enteros, valoraciones float); ValueError/TypeError si no se puede."""
+    req = dict(req)
+    for key, cast in (("seen_ids", int), ("seen_names", str)):
+        vals = req.get(key) or []
+        if not isinstance(vals, list) or any(isinstance(v, (list, dict, bool)) for v in vals):
+            raise ValueError(f"'{key}' debe ser una lista de valores simples")
+        req[key] = [cast(v) for v in vals]
+    ratings = req.get("ratings") or {}
+    if not isinstance(ratings, dict):
+        raise ValueError("'ratings' debe ser un objeto {anime_id: valoración}")
+    req["ratings"] = {int(k): float(v) for k, v in ratings.items()}
+    for key, cast in (("rating", float), ("topk", int)):
+        if key in req:
+            if isinstance(req[key], (list, dict, bool)):
+                raise ValueError(f"'{key}' debe ser un número")
+            req[key] = cast(req[key])
+    return req
+
+
+def parse_lines(lines: Iterable) -> Iterator[dict]:
+    """Peticiones por línea; las líneas inválidas (JSON o tipos) se devuelven como {"error": ...}."""
+    for n, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            req = json.loads(line)
+        except ValueError as e:
+            yield {"user": None, "error": f"línea {n}: JSON inválido ({e})"}
+            continue
+        if not isinstance(req, dict):
+            yield {"user": None, "error": f"línea {n}: se esperaba un objeto"}
+        elif not req.get("seen_ids") and not req.get("seen_names"):
+            yield {"user": req.get("user"), "error": "Debes enviar 'seen_names' o 'seen_ids'."}
+        else:
+            try:
+                yield _coerce(req)
+            except (TypeError, ValueError) as e:
+                yield {"user": req.get("user"), "error": f"línea {n}: petición inválida ({e})"}
+
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    it = iter(items)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def recommend_chunk(rec: LightRecommender, requests: List[dict], topk: int = 10) -> List[str]:
+    """Puntúa un bloque de peticiones juntas y devuelve sus líneas JSON de salida."""
+    valid = [r for r in requests if "error" not in r]
+    try:
+        results = iter(rec.recomendar_lote(valid, topk=topk))
+    except Exception:
+        # un fallo del bloque no debe arrastrar a todos: se repite usuario a usuario
+        requests, ok = list(requests), []
+        for i, r in enumerate(requests):
+            if "error" not in r:
+                try:
+                    ok.append(rec.recomendar_lote([r], topk=topk)[0])
+                except Exception as e:
+                    requests[i] = {"user": r.get("user"), "error": str(e)}
+        results = iter(ok)
+
+    anime = rec.anime
+    names = anime["name"].to_numpy()
+    genres = anime["genre"].to_numpy()
+    episodes = anime["episodes"].to_numpy()
+
+    out = []
+    for r in requests:
+        if "error" in r:
+            out.append(json.dumps(r, ensure_ascii=False))
+            continue
+        ids, scores, rows = next(results)
+        items = []
+        for aid, score, row in zip(ids.tolist(), scores.tolist(), rows.tolist()):
+            items.append({
+                "anime_id": aid,
+                "name": str(names[row]) if row >= 0 else None,
+                "score": score,
+                "genre": str(genres[row]) if row >= 0 else None,
+                "episodes": int(episodes[row]) if row >= 0 else None,
+            })
+        out.append(json.dumps({"user": r.get("user"), "results": items}, ensure_ascii=False))
+    return out
+
+
+def recommend_stream(rec: LightRecommender, lines: Iterable, topk: int = 10,
+                     chunk: Optional[int] = None) -> Iterator[str]:
+    """Líneas de salida (con '\\n') a medida que se procesa cada bloque."""
+    for reqs in chunked(parse_lines(lines), int(chunk or DEFAULT_CHUNK)):
+        for line in recommend_chunk(rec, reqs, topk=topk):
+            yield line + "\n"
@@ -0,0 +1,164 @@
+"""
+Medición de latencia y memoria de los caminos calientes (manage.py benchmark).
+Cada caso es una lista de llamadas sin argumentos; se mide cada una en frío (caché de
+resultados vacía antes de cada llamada) y en caliente (repeticiones tras la primera pasada).
+Los informes son JSON planos para poder compararlos entre ejecuciones (compare).
+"""
+from __future__ import annotations
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+from .recommender import LightRecommender
+
+Calls = List[Callable[[], Any]]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Pico de memoria residente del proceso (MB)."""
+    try:
+        import resource
+    except ImportError:   # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def rss_mb() -> Optional[float]:
+    """Memoria residente actual (MB), si /proc está disponible."""
+    try:
+        with open("/proc/self/statm") as fh:
+            pages = int(fh.read().split()[1])
+    except OSError:
+        return None
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """n, media y percentiles (ms) de unas latencias en segundos."""
+    ms = np.asarray(samples, dtype="float64") * 1e3
+    if len(ms) == 0:
+        return {"n": 0}
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"n": int(len(ms)), "mean_ms": round(float(ms.mean()), 3), "p50_ms": round(float(p50), 3),
+            "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3), "max_ms": round(float(ms.max()), 3)}
+
+
+def measure(calls: Calls, repeat: int = 5, reset: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    """{"cold": ..., "warm": ...} de una lista de llamadas."""
+    cold, warm = [], []
+    for fn in calls:
+        if reset is not None:
+            reset()
+        t = time.perf_counter()
+        fn()
+        cold.append(time.perf_counter() - t)
+    for _ in range(repeat):
+        for fn in calls:
+            t = time.perf_counter()
+            fn()
+            warm.append(time.perf_counter() - t)
+    return {"cold": summarize(cold), "warm": summarize(warm)}
+
+
+def workload(rec: LightRecommender, n: int = 50, seed: int = 0) -> Dict[str, list]:
+    """Consultas de prueba: animes por popularidad (nº de valoraciones), títulos, prefijos y listas de vistos."""
+    rng = np.random.default_rng(seed)
+    m = rec.matrix
+    counts = np.diff(m.item_indptr).astype("float64")
+    known = np.isin(m.item_ids, rec.anime["anime_id"].to_numpy()) & (counts > 0)
+    p = np.where(known, counts, 0)
+    ids = m.item_ids[rng.choice(m.n_items, size=n, p=p / p.sum())].astype("int64")
+    names = rec.anime.set_index("anime_id").loc[ids, "name"].astype(str).tolist()
+
+    # listas de vistos: animes valorados por usuarios reales (hasta 20 por usuario)
+    users = rng.choice(m.n_users, size=n, replace=m.n_users < n)
+    seen = []
+    for u in users:
+        cols = m.indices[m.indptr[u]:m.indptr[u + 1]]
+        cols = rng.permutation(cols)[:20]
+        seen.append([int(a) for a in m.item_ids[cols]])
+    return {
+        "anime_ids": [int(a) for a in ids],
+        "titles": names,
+        "prefixes": [s[:int(rng.integers(3, 7))].lower() for s in names],
+        "seen": seen,
+    }
+
+
+def method_cases(rec: LightRecommender, work: Dict[str, list], topk: int = 10) -> Dict[str, Calls]:
+    return {
+        "similares_por_id": [lambda a=a: rec.similares_por_id(a, topk=topk) for a in work["anime_ids"]],
+        "similares_por_titulo": [lambda t=t: rec.similares_por_titulo(t, topk=topk) for t in work["titles"]],
+        "recomendar_por_vistos": [lambda s=s: rec.recomendar_por_vistos(seen_ids=s, topk=topk)
+                                  for s in work["seen"]],
+        "recomendar_lote": [lambda: rec.recomendar_lote([{"seen_ids": s} for s in work["seen"]], topk=topk)],
+        "suggest_titles": [lambda q=q: rec.suggest_titles(q) for q in work["prefixes"]],
+    }
+
+
+def endpoint_cases(client, work: Dict[str, list], minp: int = 3, engine: str = "pearson",
+                   topk: int = 10) -> Dict[str, Calls]:
+    """Casos HTTP sobre un cliente con get/post (django.test.Client); fallan si la respuesta no es 200."""
+
+    def get(url, params):
+        def call():
+            r = client.get(url, params)
+            assert r.status_code == 200, (url, params, r.status_code)
+        return call
+
+    def post(url, body):
+        def call():
+            r = client.post(f"{url}?minp={minp}&engine={engine}", data=json.dumps(body),
+                            content_type="application/json")
+            assert r.status_code == 200, (url, body, r.status_code)
+        return call
+
+    base = {"minp": minp, "engine": engine}
+    n = len(work["anime_ids"])
+    return {
+        "GET /getrecomenders": [get("/getrecomenders", {**base, "q": t, "topk": topk}) for t in work["titles"]],
+        "GET /titles?s=": [get("/titles", {**base, "s": q}) for q in work["prefixes"]],
+        "GET /titles (página)": [get("/titles", {**base, "offset": i * 50, "limit": 50}) for i in range(n)],
+        "POST /recommend_by_seen": [post("/recommend_by_seen", {"seen_ids": s, "topk": topk})
+                                    for s in work["seen"]],
+    }
+
+
+def run_cases(cases: Dict[str, Calls], repeat: int = 5,
+              reset: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    return {name: measure(calls, repeat=repeat, reset=reset) for name, calls in cases.items()}
+
+
+def _flatten(report: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    out = {}
+    for k, v in report.items():
+        name = f"{prefix}{k}"
+        if isinstance(v, dict):
+            out.update(_flatten(v, name + "."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[name] = float(v)
+    return out
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.25,
+            min_ms: float = 0.5) -> List[str]:
+    """
+    Regresiones de `current` frente a `baseline`: p50/p95, tiempos de carga (_s) y memoria (_mb)
+    que empeoran más de `tolerance` (relativo). En latencias se exige además una diferencia
+    de al menos `min_ms`, para no fallar por ruido en llamadas de microsegundos.
+    """
+    cur, base = _flatten(current), _flatten(baseline)
+    out = []
+    for name, b in sorted(base.items()):
+        c = cur.get(name)
+        if c is None or b <= 0 or name.startswith("meta."):
+            continue
+        timing = name.endswith(("p50_ms", "p95_ms"))
+        if not (timing or name.endswith(("_s", "_mb"))):
+            continue
+        if c > b * (1 + tolerance) and (not timing or c - b >= min_ms):
+            out.append(f"{name}: {b:g} → {c:g} (+{(c / b - 1) * 100:.0f}%)")
+    return out
@@ -0,0 +1,264 @@
+from __future__ import annotations
+import io
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Hashable, Iterable, Optional, Tuple
+import numpy as np
+from . import metrics
+
+logger = logging.getLogger("recomendar")
+
+# Los valores cacheados son tuplas de arrays (p. ej. vecinos: ids, correlación, comunes)
+Value = Tuple[np.ndarray, ...]
+
+
+def _nbytes(value: Value) -> int:
+    return int(sum(a.nbytes for a in value)) + 64 * len(value)
+
+
+def _encode(value: Value) -> bytes:
+    buf = io.BytesIO()
+    np.savez(buf, *value)
+    return buf.getvalue()
+
+
+def _decode(blob: bytes) -> Value:
+    with np.load(io.BytesIO(blob)) as z:
+        return tuple(z[f"arr_{i}"] for i in range(len(z.files)))
+
+
+class SQLiteBackend:
+    """
+    Almacén compartido entre procesos (p. ej. workers de gunicorn) en un fichero SQLite
+    local en modo WAL. Es best-effort: cualquier error se registra y se trata como fallo de caché.
+    Expulsa por último acceso (LRU): los aciertos actualizan `atime` por lotes, al escribir o
+    cada TOUCH_BATCH aciertos, para no abrir una transacción de escritura por lectura.
+    """
+
+    TOUCH_BATCH = 64
+
+    def __init__(self, path: Path, max_bytes: int = 512 * 1024 * 1024):
+        self.path = Path(path)
+        self.max_bytes = int(max_bytes)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}   # aciertos con atime pendiente de escribir
+
+    def _connection(self) -> sqlite3.Connection:
+        # una conexión por proceso: no se heredan tras fork
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(str(self.path), timeout=1.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            # ficheros anteriores sin la columna anime_id: es una caché, se empieza de cero
+            columns = {r[1] for r in conn.execute("PRAGMA table_info(results)")}
+            if columns and "anime_id" not in columns:
+                conn.execute("DROP TABLE results")
+            conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                         "size INTEGER NOT NULL, atime REAL NOT NULL, anime_id INTEGER)")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_atime ON results(atime)")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_anime_id ON results(anime_id)")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with self._lock:
+                conn = self._connection()
+                row = conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._touched[key] = time.time()
+                    if len(self._touched) >= self.TOUCH_BATCH:
+                        with conn:
+                            self._flush_touched(conn)
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            logger.warning("Caché SQLite no disponible (get): %s", e)
+            return None
+
+    def _flush_touched(self, conn: sqlite3.Connection) -> None:
+        # con self._lock tomado y dentro de una transacción
+        if self._touched:
+            conn.executemany("UPDATE results SET atime = ? WHERE key = ?",
+                             [(t, k) for k, t in self._touched.items()])
+            self._touched.clear()
+
+    def put(self, key: str, blob: bytes, anime_id: Optional[int] = None) -> None:
+        try:
+            with self._lock:
+                conn = self._connection()
+                with conn:
+                    self._flush_touched(conn)
+                    conn.execute("INSERT OR REPLACE INTO results(key, value, size, atime, anime_id) "
+                                 "VALUES (?, ?, ?, ?, ?)", (key, blob, len(blob), time.time(), anime_id))
+                    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+                    if total > self.max_bytes:
+                        # expulsa las de acceso más antiguo hasta volver a ~90% del límite
+                        excess = total - int(self.max_bytes * 0.9)
+                        conn.execute(
+                            "DELETE FROM results WHERE key IN ("
+                            " SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY atime ROWS UNBOUNDED PRECEDING)"
+                            "   - size AS before FROM results) WHERE before < ?)", (excess,))
+        except sqlite3.Error as e:
+            logger.warning("Caché SQLite no disponible (put): %s", e)
+
+    def delete_ids(self, anime_ids: Iterable[int], chunk: int = 500) -> None:
+        """Borra las entradas de esos anime_id (columna indexada, por tandas de `chunk`)."""
+        ids = sorted({int(i) for i in anime_ids})
+        try:
+            with self._lock:
+                conn = self._connection()
+                with conn:
+                    for i in range(0, len(ids), chunk):
+                        part = ids[i:i + chunk]
+                        conn.execute(f"DELETE FROM results WHERE anime_id IN ({','.join('?' * len(part))})", part)
+        except sqlite3.Error as e:
+            logger.warning("Caché SQLite no disponible (delete): %s", e)
+
+
+class ResultCache:
+    """
+    Caché LRU acotada por bytes para resultados de similitud, con contadores
+    de aciertos/fallos/expulsiones. Las claves no referencian al recomendador
+    (a diferencia de @lru_cache sobre el método), así que no retienen instancias.
+    Con `backend` los fallos locales se consultan también en el almacén compartido.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, backend: Optional[SQLiteBackend] = None):
+        self.max_bytes = int(max_bytes)
+        self.backend = backend
+        self._data: "OrderedDict[Hashable, Tuple[Value, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.backend_hits = 0
+
+    @staticmethod
+    def _key_str(key: Hashable) -> str:
+        return ":".join(str(k) for k in key) if isinstance(key, tuple) else str(key)
+
+    def get(self, key: Hashable) -> Optional[Value]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[0]
+        if self.backend is not None:
+            blob = self.backend.get(self._key_str(key))
+            if blob is not None:
+                value = _decode(blob)
+                self._store(key, value)
+                with self._lock:
+                    self.hits += 1
+                    self.backend_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _store(self, key: Hashable, value: Value) -> None:
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, s) = self._data.popitem(last=False)
+                self._bytes -= s
+                self.evictions += 1
+
+    def put(self, key: Hashable, value: Value) -> None:
+        self._store(key, value)
+        if self.backend is not None:
+            anime_id = key[0] if isinstance(key, tuple) and isinstance(key[0], int) else None
+            self.backend.put(self._key_str(key), _encode(value), anime_id)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Value]) -> Value:
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Elimina las entradas locales cuya clave cumpla `predicate`."""
+        with self._lock:
+            dead = [k for k in self._data if predicate(k)]
+            for k in dead:
+                self._bytes -= self._data.pop(k)[1]
+        return len(dead)
+
+    def invalidate_ids(self, ids: Iterable[int]) -> int:
+        """Elimina (también del almacén compartido) las entradas cuya clave empieza por uno de `ids`."""
+        ids = {int(i) for i in ids}
+        n = self.invalidate(lambda k: isinstance(k, tuple) and k[0] in ids)
+        if self.backend is not None and ids:
+            self.backend.delete_ids(ids)
+        return n
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "backend_hits": self.backend_hits,
+            }
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def _cache_stat(field: str):
+    def fn():
+        return [({}, _cache.stats()[field])] if _cache is not None else []
+    return fn
+
+
+for _field, _kind, _help in [("hits", "counter", "Aciertos de la caché de resultados"),
+                             ("misses", "counter", "Fallos de la caché de resultados"),
+                             ("evictions", "counter", "Expulsiones por tamaño"),
+                             ("backend_hits", "counter", "Aciertos servidos por el almacén compartido"),
+                             ("entries", "gauge", "Entradas en la caché local"),
+                             ("bytes", "gauge", "Bytes en la caché local")]:
+    metrics.collect(f"recomendar_result_cache_{_field}", _help, _kind)(_cache_stat(_field))
+
+
+def get_result_cache() -> ResultCache:
+    """
+    Caché compartida del proceso. Configuración por entorno:
+      RESULT_CACHE_MB      tamaño de la caché local (64 por defecto)
+      RESULT_CACHE_SQLITE  ruta de un SQLite compartido entre workers (opcional)
+      RESULT_CACHE_SQLITE_MB  límite del SQLite (512 por defecto)
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            backend = None
+            path = os.environ.get("RESULT_CACHE_SQLITE")
+            if path:
+                backend = SQLiteBackend(Path(path), int(os.environ.get("RESULT_CACHE_SQLITE_MB", 512)) * 1024 * 1024)
+            _cache = ResultCache(int(os.environ.get("RESULT_CACHE_MB", 64)) * 1024 * 1024, backend=backend)
+        return _cache
@@ -0,0 +1,91 @@
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+import numpy as np
+import pandas as pd
+from .genres import AnimeFilter
+from .neighbors import RatingsMatrix
+from .serialize import AnimeFragments
+
+
+class Catalog:
+    """
+    Vista de catálogo para /titles, construida una vez al cargar:
+    rating_count por anime, orden por nombre y por popularidad, y los conteos
+    ordenados para responder `rating_count >= min_r` por búsqueda binaria.
+    Las páginas son cortes de arrays ya ordenados: O(limit) por petición.
+    """
+
+    COLUMNS = ["anime_id", "name", "members", "rating_count", "genre", "episodes"]
+    MAX_FILTERS = 32
+
+    def __init__(self, anime: pd.DataFrame, matrix: RatingsMatrix,
+                 by_members: Optional[np.ndarray] = None):
+        frame = anime[["anime_id", "name", "members", "genre", "episodes"]].reset_index(drop=True)
+        counts = np.zeros(len(frame), dtype="int32")
+        if matrix.n_items > 0:
+            ids = frame["anime_id"].to_numpy()
+            pos = np.minimum(np.searchsorted(matrix.item_ids, ids), matrix.n_items - 1)
+            found = matrix.item_ids[pos] == ids
+            counts[found] = np.diff(matrix.item_indptr)[pos[found]]
+        frame.insert(3, "rating_count", counts)
+        self.frame = frame[self.COLUMNS]
+        self.rating_count = counts
+        self.anime_ids = frame["anime_id"].to_numpy()
+        self.members = frame["members"].to_numpy()
+        # sin ratings no hay conteo útil: min_r no filtra (mismo criterio que antes)
+        self.has_counts = bool(matrix.n_items > 0)
+
+        self.by_name = np.argsort(frame["name"].astype(str).to_numpy(), kind="stable")
+        self.by_members = (by_members if by_members is not None else
+                           np.lexsort((frame["name"].astype(str).to_numpy(), -frame["members"].to_numpy())))
+        self.sorted_counts = np.sort(counts)
+        self._by_name_min_r: "OrderedDict[int, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def count(self, min_r: int = 0) -> int:
+        if min_r <= 0 or not self.has_counts:
+            return len(self.frame)
+        return int(len(self.sorted_counts) - np.searchsorted(self.sorted_counts, min_r, side="left"))
+
+    def filter(self, rows: np.ndarray, min_r: int = 0) -> np.ndarray:
+        """Filtra filas (en su orden) por rating_count >= min_r."""
+        if min_r <= 0 or not self.has_counts:
+            return rows
+        return rows[self.rating_count[rows] >= min_r]
+
+    def _name_order(self, min_r: int) -> np.ndarray:
+        if min_r <= 0 or not self.has_counts:
+            return self.by_name
+        with self._lock:
+            order = self._by_name_min_r.get(min_r)
+            if order is None:
+                order = self.filter(self.by_name, min_r)
+                self._by_name_min_r[min_r] = order
+                if len(self._by_name_min_r) > self.MAX_FILTERS:
+                    self._by_name_min_r.popitem(last=False)
+            else:
+                self._by_name_min_r.move_to_end(min_r)
+        return order
+
+    def page(self, offset: int = 0, limit: int = 50, min_r: int = 0,
+             flt: Optional[AnimeFilter] = None) -> Tuple[np.ndarray, int]:
+        """Filas del listado alfabético [offset, offset+limit) y total tras filtrar."""
+        order = self._name_order(int(min_r))
+        if flt is None:
+            return order[int(offset):int(offset) + int(limit)], self.count(int(min_r))
+        order = order[flt.allows(order)]
+        return order[int(offset):int(offset) + int(limit)], len(order)
+
+    def rows(self, rows: np.ndarray) -> pd.DataFrame:
+        return self.frame.iloc[rows]
+
+    def rows_json(self, rows: np.ndarray, fragments: AnimeFragments) -> bytes:
+        """Las mismas filas que rows(), ya codificadas como lista JSON."""
+        rows = np.asarray(rows)
+        return fragments.catalog(rows, self.anime_ids[rows].tolist(), self.members[rows].tolist(),
+                                 self.rating_count[rows].tolist())
@@ -0,0 +1,77 @@
+"""
+Registro de valoraciones nuevas (ratings_delta.csv) que se aplican sobre los datos
+cargados sin releer ratings_clean_1.csv. El fichero es de solo-añadir: cada proceso
+recuerda hasta qué byte lo ha leído y aplica únicamente las líneas nuevas.
+"""
+from __future__ import annotations
+import fcntl
+import io
+import os
+from pathlib import Path
+from typing import Iterable, Tuple, Union
+import numpy as np
+import pandas as pd
+
+DELTA_FILE = "ratings_delta.csv"
+COLUMNS = ["user_id", "anime_id", "rating"]
+
+
+def delta_path(data_dir: Path) -> Path:
+    return Path(data_dir) / DELTA_FILE
+
+
+def validate(records: Union[pd.DataFrame, Iterable[dict]]) -> pd.DataFrame:
+    """Valoraciones [{user_id, anime_id, rating}] → DataFrame tipado; ValueError si alguna no es válida."""
+    df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(list(records))
+    missing = [c for c in COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Faltan columnas: {', '.join(missing)}")
+    df = df[COLUMNS]
+    num = df.apply(pd.to_numeric, errors="coerce")
+    bad = num.isna().any(axis=1)
+    if bad.any():
+        raise ValueError(f"Valores no numéricos en la fila {int(np.flatnonzero(bad.to_numpy())[0])}")
+    if (num["user_id"] < 0).any() or (num["anime_id"] < 0).any():
+        raise ValueError("user_id y anime_id deben ser no negativos")
+    if ((num["rating"] != -1) & ((num["rating"] < 1) | (num["rating"] > 10))).any():
+        raise ValueError("rating debe estar entre 1 y 10 (o -1)")
+    return num.astype({"user_id": "int32", "anime_id": "int32", "rating": "float32"})
+
+
+def append(data_dir: Path, df: pd.DataFrame) -> int:
+    """
+    Añade las filas al registro en una sola escritura O_APPEND bajo flock (con la cabecera
+    si el fichero está vacío): ningún escritor concurrente intercala filas antes de la cabecera.
+    Devuelve cuántas filas.
+    """
+    body = df[COLUMNS].to_csv(header=False, index=False, float_format="%g").encode("utf-8")
+    fd = os.open(delta_path(data_dir), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        if os.fstat(fd).st_size == 0:
+            body = (",".join(COLUMNS) + "\n").encode("utf-8") + body
+        view = memoryview(body)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)   # libera el flock
+    return len(df)
+
+
+def read_from(path: Path, offset: int) -> Tuple[pd.DataFrame, int]:
+    """
+    Líneas completas del registro a partir del byte `offset` (sin la cabecera):
+    (valoraciones sin los '-1', nuevo offset). Una línea a medio escribir se deja para la siguiente lectura.
+    """
+    with open(path, "rb") as fh:
+        fh.seek(offset)
+        chunk = fh.read()
+    end = chunk.rfind(b"\n") + 1
+    if end == 0:
+        return pd.DataFrame(columns=COLUMNS), offset
+    text = chunk[:end].decode("utf-8")
+    if offset == 0:
+        text = text.split("\n", 1)[1]
+    df = pd.read_csv(io.StringIO(text), names=COLUMNS, header=None,
+                     dtype={"user_id": "int32", "anime_id": "int32", "rating": "float32"})
+    return df[df["rating"] != -1], offset + end
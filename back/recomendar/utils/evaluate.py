@@ -0,0 +1,205 @@
+"""
+Evaluación offline de calidad frente a coste (manage.py evaluate).
+
+Partición holdout por usuario: a cada usuario evaluado se le apartan al azar una fracción de
+sus valoraciones (test) y el resto queda en los datos de entrenamiento junto con las de los
+demás usuarios. Cada variante (motor y artefactos precalculados) se entrena sobre esos datos en
+un proceso propio, para medir su carga y su memoria por separado, y reproduce las listas de
+vistos (held-in) por cada camino de puntuación. Relevantes = animes de test con valoración
+>= relevant_min. Métricas: precision@k, recall@k, NDCG@k (binaria), hit_rate@k y cobertura del
+catálogo, junto a la latencia por consulta (bench.summarize) y el pico de memoria.
+"""
+from __future__ import annotations
+import math
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence, Set, Tuple
+import numpy as np
+from . import bench
+from .ann import IVFIndex
+from .batch import DEFAULT_CHUNK, chunked
+from .factorization import FactorModel
+from .neighbor_build import build_parallel
+from .neighbors import NeighborIndex, RatingsMatrix
+from .recommender import FactorRecommender, LightRecommender, RecommenderData
+
+# pearson: vecinos calculados bajo demanda; pearson_index: neighbors_mp<minp>.npz;
+# svd / svd_ann: factores exactos / con índice IVF; popular: los más valorados (referencia)
+VARIANTS = ("pearson", "pearson_index", "svd", "svd_ann", "popular")
+PATHS = ("recomendar_por_vistos", "recomendar_lote", "similares")
+
+
+def holdout_split(matrix: RatingsMatrix, users: int = 500, test_frac: float = 0.2, min_ratings: int = 5,
+                  relevant_min: float = 8.0, seed: int = 0) -> Tuple[RatingsMatrix, List[dict], Dict[str, int]]:
+    """
+    (matriz de entrenamiento, casos, resumen). Cada caso: user, seen_ids y ratings (held-in),
+    relevant (test con valoración >= relevant_min) y seed (su anime held-in mejor valorado,
+    consulta del camino `similares`). Los usuarios sin relevantes en test no generan caso.
+    """
+    rng = np.random.default_rng(seed)
+    counts = np.diff(matrix.indptr)
+    eligible = np.flatnonzero(counts >= max(int(min_ratings), 2))
+    chosen = np.sort(rng.choice(eligible, size=min(int(users), len(eligible)), replace=False))
+
+    test = np.zeros(len(matrix.data), dtype=bool)
+    cases = []
+    for u in chosen.tolist():
+        s, e = int(matrix.indptr[u]), int(matrix.indptr[u + 1])
+        perm = s + rng.permutation(e - s)
+        n_test = max(1, int(round((e - s) * test_frac)))
+        held_out, held_in = perm[:n_test], perm[n_test:]
+        test[held_out] = True
+        relevant = [int(matrix.item_ids[matrix.indices[p]]) for p in held_out
+                    if float(matrix.data[p]) >= relevant_min]
+        if not relevant:
+            continue
+        seen = [int(a) for a in matrix.item_ids[matrix.indices[held_in]]]
+        vals = [float(v) for v in matrix.data[held_in]]
+        cases.append({"user": int(matrix.user_ids[u]), "seen_ids": seen, "ratings": dict(zip(seen, vals)),
+                      "relevant": relevant, "seed": seen[int(np.argmax(vals))]})
+
+    keep = ~test
+    train = RatingsMatrix.from_coo(np.repeat(np.asarray(matrix.user_ids), counts)[keep],
+                                   np.asarray(matrix.item_ids)[matrix.indices][keep],
+                                   np.asarray(matrix.data, dtype="float64")[keep])
+    stats = {"users_sampled": int(len(chosen)), "users_evaluated": len(cases),
+             "train_ratings": int(keep.sum()), "test_ratings": int(test.sum()),
+             "relevant": int(sum(len(c["relevant"]) for c in cases))}
+    return train, cases, stats
+
+
+def ranking_metrics(ranked: Sequence[Sequence[int]], relevant: Sequence[Set[int]], ks: Sequence[int],
+                    n_items: int) -> Dict[str, float]:
+    out: Dict[str, float] = {"users": len(ranked), "empty": sum(1 for r in ranked if len(r) == 0)}
+    discount = 1.0 / np.log2(np.arange(2, max(ks) + 2))
+    for k in ks:
+        p = r = ndcg = hit = 0.0
+        covered: Set[int] = set()
+        for items, rel in zip(ranked, relevant):
+            top = list(items)[:k]
+            covered.update(top)
+            gains = np.array([a in rel for a in top], dtype="float64")
+            n = float(gains.sum())
+            p += n / k
+            r += n / len(rel)
+            hit += n > 0
+            ndcg += float(gains @ discount[:len(top)]) / float(discount[:min(len(rel), k)].sum())
+        users = max(len(ranked), 1)
+        out.update({f"precision@{k}": round(p / users, 5), f"recall@{k}": round(r / users, 5),
+                    f"ndcg@{k}": round(ndcg / users, 5), f"hit_rate@{k}": round(hit / users, 5),
+                    f"coverage@{k}": round(len(covered) / max(n_items, 1), 5)})
+    return out
+
+
+class PopularRecommender:
+    """Referencia sin personalizar: los animes con más valoraciones que el usuario no ha visto."""
+
+    def __init__(self, matrix: RatingsMatrix):
+        self.order = [int(a) for a in matrix.item_ids[np.argsort(-matrix.item_count, kind="stable")]]
+
+    def top(self, exclude: Set[int], topk: int) -> List[int]:
+        out = []
+        for a in self.order:
+            if a not in exclude:
+                out.append(a)
+                if len(out) == topk:
+                    break
+        return out
+
+
+def prepare(variant: str, data_dir: Path, min_periods: int, factors: int, seed: int) -> float:
+    """Genera en data_dir los artefactos que necesita la variante; devuelve los segundos empleados."""
+    t = time.perf_counter()
+    data_dir = Path(data_dir)
+    if variant == "pearson_index" and not NeighborIndex.path_for(data_dir, min_periods).exists():
+        data = RecommenderData(data_dir, deltas=False)
+        build_parallel(data.matrix, NeighborIndex.path_for(data_dir, min_periods), min_periods,
+                       fingerprint=data.data_version)
+    if variant in ("svd", "svd_ann") and not FactorModel.path_for(data_dir).exists():
+        data = RecommenderData(data_dir, deltas=False)
+        FactorModel.train(data.matrix, k=factors, seed=seed, data_version=data.data_version).save(
+            FactorModel.path_for(data_dir))
+    if variant == "svd_ann" and not IVFIndex.path_for(data_dir).exists():
+        model = FactorModel.load(FactorModel.path_for(data_dir))
+        IVFIndex.build(model.item_ids[model.valid], model.unit[model.valid],
+                       source=model.fingerprint).save(IVFIndex.path_for(data_dir))
+    return time.perf_counter() - t
+
+
+def _timed(fn: Callable[[], Any], lat: List[float]):
+    t = time.perf_counter()
+    out = fn()
+    lat.append(time.perf_counter() - t)
+    return out
+
+
+def evaluate_variant(variant: str, data_dir: Path, cases: List[dict], ks: Sequence[int],
+                     paths: Sequence[str] = PATHS, min_periods: int = 3, factors: int = 64,
+                     seed: int = 0) -> Dict[str, Any]:
+    """Calidad y coste de una variante. Pensada para ejecutarse en un proceso nuevo (memoria aislada)."""
+    prepare_s = prepare(variant, data_dir, min_periods, factors, seed)
+    rss0 = bench.rss_mb()
+    t0 = time.perf_counter()
+    data = RecommenderData(data_dir, deltas=False)
+    if variant == "popular":
+        rec = PopularRecommender(data.matrix)
+    elif variant.startswith("svd"):
+        rec = FactorRecommender(data_dir, min_periods=min_periods, data=data)
+        if variant == "svd":
+            rec.model.ann = None
+    else:
+        rec = LightRecommender(data_dir, min_periods=min_periods, data=data)
+        if variant == "pearson":
+            rec.neighbors = None
+    load_s = time.perf_counter() - t0
+    report: Dict[str, Any] = {"load": {"prepare_s": round(prepare_s, 3), "load_s": round(load_s, 3),
+                                       "rss_mb": bench.rss_mb(),
+                                       "rss_delta_mb": round(bench.rss_mb() - rss0, 1) if rss0 is not None else None},
+                              "paths": {}}
+
+    topk = max(ks)
+    relevant = [set(c["relevant"]) for c in cases]
+    for path in paths:
+        lat: List[float] = []
+        if variant == "popular":
+            if path == "recomendar_lote":
+                continue
+            exclude = (lambda c: {c["seed"]}) if path == "similares" else (lambda c: set(c["seen_ids"]))
+            ranked = [_timed(lambda c=c: rec.top(exclude(c), topk), lat) for c in cases]
+        elif path == "recomendar_por_vistos":
+            ranked = [_timed(lambda c=c: rec.recomendar_por_vistos_arrays(
+                seen_ids=c["seen_ids"], ratings_map=c["ratings"], topk=topk)[0].tolist(), lat) for c in cases]
+        elif path == "recomendar_lote":
+            ranked = []
+            for chunk in chunked(cases, DEFAULT_CHUNK):
+                reqs = [{"seen_ids": c["seen_ids"], "ratings": c["ratings"]} for c in chunk]
+                t = time.perf_counter()
+                out = rec.recomendar_lote(reqs, topk=topk)
+                # latencia amortizada por usuario del lote
+                lat.extend([(time.perf_counter() - t) / len(chunk)] * len(chunk))
+                ranked.extend(ids.tolist() for ids, _, _ in out)
+        elif path == "similares":
+            def similar(c):
+                ids, corr, _, _ = rec.similares_arrays(c["seed"], topk=topk)
+                return ids[np.argsort(-corr, kind="stable")].tolist()   # por similitud, no por nombre
+            ranked = [_timed(lambda c=c: similar(c), lat) for c in cases]
+        else:
+            raise ValueError(f"Camino desconocido '{path}'. Opciones: {', '.join(PATHS)}")
+        report["paths"][path] = {**ranking_metrics(ranked, relevant, ks, data.matrix.n_items),
+                                 "latency": bench.summarize(lat)}
+    report["peak_rss_mb"] = bench.peak_rss_mb()
+    return report
+
+
+def quality_drops(current: Dict[str, Any], baseline: Dict[str, Any], max_drop: float = 0.01) -> List[str]:
+    """Métricas de calidad de `baseline` que en `current` bajan más de `max_drop` (absoluto)."""
+    out = []
+    for variant, b in baseline.get("variants", {}).items():
+        for path, bm in b.get("paths", {}).items():
+            cm = current.get("variants", {}).get(variant, {}).get("paths", {}).get(path)
+            if cm is None:
+                continue
+            for name, bv in bm.items():
+                if "@" in name and name in cm and not math.isclose(bv, cm[name]) and bv - cm[name] > max_drop:
+                    out.append(f"{variant}.{path}.{name}: {bv:g} → {cm[name]:g}")
+    return out
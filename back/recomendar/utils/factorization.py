@@ -0,0 +1,130 @@
+from __future__ import annotations
+import logging
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+import numpy as np
+from .neighbors import Neighbors, RatingsMatrix, _empty_neighbors
+
+logger = logging.getLogger("recomendar")
+
+
+def _nnz_rows(matrix: RatingsMatrix) -> np.ndarray:
+    return np.repeat(np.arange(matrix.n_users, dtype="int32"), np.diff(matrix.indptr))
+
+
+def _matmul(rows: np.ndarray, cols: np.ndarray, vals: np.ndarray, n_out: int, X: np.ndarray) -> np.ndarray:
+    """(A @ X) para A dispersa dada en coordenadas (rows, cols, vals): una columna por bincount."""
+    out = np.empty((n_out, X.shape[1]), dtype="float64")
+    for c in range(X.shape[1]):
+        out[:, c] = np.bincount(rows, weights=vals * X[cols, c], minlength=n_out)
+    return out
+
+
+def randomized_svd(matrix: RatingsMatrix, vals: np.ndarray, k: int, oversample: int = 10,
+                   n_iter: int = 4, seed: int = 0,
+                   progress: Optional[Callable[[str], None]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    SVD truncada aleatorizada (Halko et al.) de la matriz usuario×anime con valores `vals`
+    (alineados con matrix.data). Solo NumPy: los productos dispersos se hacen con bincount.
+    Devuelve (s, V) con V de forma n_items×k.
+    """
+    rows, cols = _nnz_rows(matrix), np.asarray(matrix.indices)
+    n_u, n_i = matrix.n_users, matrix.n_items
+    rng = np.random.default_rng(seed)
+    ell = min(k + oversample, n_u, n_i)
+
+    Q, _ = np.linalg.qr(_matmul(rows, cols, vals, n_u, rng.standard_normal((n_i, ell))))
+    for it in range(n_iter):
+        Z, _ = np.linalg.qr(_matmul(cols, rows, vals, n_i, Q))     # Aᵀ Q
+        Q, _ = np.linalg.qr(_matmul(rows, cols, vals, n_u, Z))     # A Z
+        if progress is not None:
+            progress(f"iteración de potencia {it + 1}/{n_iter}")
+    Bt = _matmul(cols, rows, vals, n_i, Q)                           # (Qᵀ A)ᵀ
+    _, s, Vt = np.linalg.svd(Bt.T, full_matrices=False)
+    return s[:k], Vt[:k].T
+
+
+class FactorModel:
+    """Vectores latentes de anime (SVD truncada sobre ratings centrados por usuario)."""
+
+    FILENAME = "factors.npz"
+
+    def __init__(self, item_ids: np.ndarray, item_factors: np.ndarray, singular_values: np.ndarray,
+                 data_version: str = ""):
+        self.item_ids = item_ids
+        self.item_factors = item_factors
+        self.singular_values = singular_values
+        self.data_version = data_version
+        self.ann = None   # IVFIndex opcional (manage.py build_ann)
+        norms = np.linalg.norm(item_factors, axis=1)
+        self.valid = norms > 1e-9
+        # vectores unitarios: similitud coseno = producto escalar
+        self.unit = (item_factors / np.where(self.valid, norms, 1.0)[:, None]).astype("float32")
+
+    @classmethod
+    def path_for(cls, data_dir: Path) -> Path:
+        return Path(data_dir) / cls.FILENAME
+
+    @classmethod
+    def train(cls, matrix: RatingsMatrix, k: int = 64, n_iter: int = 4, seed: int = 0,
+              data_version: str = "", progress: Optional[Callable[[str], None]] = None) -> "FactorModel":
+        data = np.asarray(matrix.data, dtype="float64")
+        counts = np.diff(matrix.indptr)
+        user_mean = np.bincount(_nnz_rows(matrix), weights=data, minlength=matrix.n_users) / np.maximum(counts, 1)
+        vals = data - np.repeat(user_mean, counts)
+        s, V = randomized_svd(matrix, vals, k, n_iter=n_iter, seed=seed, progress=progress)
+        return cls(np.asarray(matrix.item_ids).copy(), (V * s).astype("float32"), s.astype("float32"), data_version)
+
+    def save(self, path: Path) -> None:
+        with open(path, "wb") as fh:
+            np.savez(fh, item_ids=self.item_ids, item_factors=self.item_factors,
+                     singular_values=self.singular_values, data_version=np.array(self.data_version))
+
+    @classmethod
+    def load(cls, path: Path) -> "FactorModel":
+        with np.load(path) as z:
+            return cls(z["item_ids"], z["item_factors"], z["singular_values"], str(z["data_version"]))
+
+    def positions(self, anime_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(posiciones, encontrados) de anime_ids dentro de item_ids."""
+        anime_ids = np.asarray(anime_ids, dtype="int64")
+        if len(self.item_ids) == 0:
+            return np.zeros(len(anime_ids), dtype="int64"), np.zeros(len(anime_ids), dtype=bool)
+        pos = np.minimum(np.searchsorted(self.item_ids, anime_ids), len(self.item_ids) - 1)
+        return pos, (self.item_ids[pos] == anime_ids) & self.valid[pos]
+
+    @property
+    def fingerprint(self) -> str:
+        return f"{self.data_version}:{self.item_factors.shape[1]}:{len(self.item_ids)}"
+
+    def similar(self, anime_id: int, topk: int, nprobe: Optional[int] = None,
+                allowed: Optional[np.ndarray] = None) -> Neighbors:
+        """Top-k por coseno; `allowed` (bool por item) restringe los candidatos (búsqueda exacta)."""
+        pos, found = self.positions(np.array([anime_id]))
+        if not found[0]:
+            return _empty_neighbors()
+        if self.ann is not None and allowed is None:
+            ids, sims = self.ann.search(self.unit[pos[0]], topk, nprobe=nprobe, exclude=int(anime_id))
+            return ids.astype("int32"), sims, np.zeros(len(ids), dtype="int32")
+        sims = self.unit @ self.unit[pos[0]]
+        sims[~self.valid] = -np.inf
+        if allowed is not None:
+            sims[~allowed] = -np.inf
+        sims[pos[0]] = -np.inf
+        cand = np.flatnonzero(np.isfinite(sims))
+        k = min(int(topk), len(cand))
+        if k == 0:
+            return _empty_neighbors()
+        if k < len(cand):
+            cand = cand[np.argpartition(-sims[cand], k - 1)[:k]]
+        cand = cand[np.argsort(-sims[cand], kind="stable")]
+        # 'common' no aplica a este motor
+        return self.item_ids[cand], sims[cand].astype("float32"), np.zeros(len(cand), dtype="int32")
+
+    def score(self, seen: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Σ w_i·cos(v_i, v_j) para todo j, en forma de un único producto denso."""
+        pos, found = self.positions(seen)
+        profile = self.unit[pos[found]].T @ weights[found].astype("float32")
+        scores = (self.unit @ profile).astype("float64")
+        hit = self.valid.copy() if found.any() else np.zeros(len(self.item_ids), dtype=bool)
+        return scores, hit
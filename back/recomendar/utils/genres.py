@@ -0,0 +1,139 @@
+"""
+Filtros por género y número de episodios, y reordenación por diversidad (MMR).
+Los géneros de cada anime se guardan como bitset (uint64 por cada 64 géneros) al cargar:
+filtrar es un AND vectorizado sobre las filas candidatas, antes de elegir el top-k.
+"""
+from __future__ import annotations
+from typing import List, Mapping, Optional, Sequence
+import numpy as np
+
+FILTER_PARAMS = ("genre", "genre_mode", "exclude_genre", "min_episodes", "max_episodes")
+
+
+def _split(value) -> List[str]:
+    """'Action, Comedy' o ["Action", "Comedy"] → ["Action", "Comedy"]."""
+    if value is None:
+        return []
+    items = value if isinstance(value, (list, tuple)) else str(value).split(",")
+    return [str(g).strip() for g in items if str(g).strip()]
+
+
+class GenreIndex:
+    """Bitset de géneros y episodios por fila de `anime`; la fila -1 (sin ficha) no tiene géneros."""
+
+    def __init__(self, genres: Sequence[str], episodes: np.ndarray):
+        per_row = [[g for g in _split(s) if g != "Unknown"] for s in genres]
+        self.names = sorted({g for gs in per_row for g in gs})
+        self.bit = {g.lower(): i for i, g in enumerate(self.names)}
+        self.bits = np.zeros((len(per_row) + 1, max(1, (len(self.names) + 63) // 64)), dtype="uint64")
+        for r, gs in enumerate(per_row):
+            for g in gs:
+                i = self.bit[g.lower()]
+                self.bits[r, i // 64] |= np.uint64(1 << (i % 64))
+        self.sizes = np.bitwise_count(self.bits).sum(axis=1)
+        self.episodes = np.append(np.asarray(episodes, dtype="int64"), 0)
+
+    def mask(self, names: Sequence[str]) -> np.ndarray:
+        """Bitset de unos géneros; ValueError si alguno no existe."""
+        m = np.zeros(self.bits.shape[1], dtype="uint64")
+        for g in names:
+            i = self.bit.get(g.lower())
+            if i is None:
+                raise ValueError(f"Género desconocido '{g}'.")
+            m[i // 64] |= np.uint64(1 << (i % 64))
+        return m
+
+
+class AnimeFilter:
+    """
+    Condiciones sobre filas de `anime`:
+      genre          géneros requeridos (todos, o alguno con genre_mode=any)
+      exclude_genre  géneros excluidos
+      min_episodes / max_episodes  rango de episodios (los desconocidos, 0, quedan fuera)
+    """
+
+    def __init__(self, index: GenreIndex, genres: Sequence[str] = (), mode: str = "all",
+                 exclude: Sequence[str] = (), min_episodes: Optional[int] = None,
+                 max_episodes: Optional[int] = None):
+        if mode not in ("all", "any"):
+            raise ValueError("genre_mode debe ser 'all' o 'any'.")
+        self.index = index
+        self.mode = mode
+        self.include = index.mask(genres) if genres else None
+        self.exclude = index.mask(exclude) if exclude else None
+        self.min_episodes = min_episodes
+        self.max_episodes = max_episodes
+        # identifica el filtro en las claves de caché
+        self.key = (tuple(sorted(g.lower() for g in genres)), mode, tuple(sorted(g.lower() for g in exclude)),
+                    min_episodes, max_episodes)
+
+    @classmethod
+    def from_params(cls, index: GenreIndex, params: Mapping) -> Optional["AnimeFilter"]:
+        """Filtro de los parámetros de una petición; None si no piden ninguno."""
+        if not any(params.get(k) not in (None, "", []) for k in FILTER_PARAMS):
+            return None
+        episodes = [params.get(k) for k in ("min_episodes", "max_episodes")]
+        lo, hi = (int(v) if v not in (None, "") else None for v in episodes)
+        return cls(index, _split(params.get("genre")), str(params.get("genre_mode") or "all").lower(),
+                   _split(params.get("exclude_genre")), lo, hi)
+
+    def allows(self, rows: np.ndarray) -> np.ndarray:
+        """Máscara booleana de las filas (de `anime`, -1 = sin ficha) que cumplen el filtro."""
+        rows = np.asarray(rows)
+        ok = np.ones(len(rows), dtype=bool)
+        if self.include is not None or self.exclude is not None:
+            b = self.index.bits[rows]
+            if self.include is not None:
+                both = b & self.include
+                ok &= (both == self.include).all(axis=1) if self.mode == "all" else both.any(axis=1)
+            if self.exclude is not None:
+                ok &= ~(b & self.exclude).any(axis=1)
+        if self.min_episodes is not None or self.max_episodes is not None:
+            ep = self.index.episodes[rows]
+            ok &= ep > 0
+            if self.min_episodes is not None:
+                ok &= ep >= self.min_episodes
+            if self.max_episodes is not None:
+                ok &= ep <= self.max_episodes
+        return ok
+
+
+def parse_diversity(value) -> float:
+    d = float(value or 0)
+    if not 0.0 <= d <= 1.0:
+        raise ValueError("diversity debe estar entre 0 y 1.")
+    return d
+
+
+def pool_size(topk: int, diversity: float) -> int:
+    """Candidatos entre los que elige MMR (solo los mejores por relevancia)."""
+    return int(topk) if diversity <= 0 else max(5 * int(topk), 50)
+
+
+def mmr(index: GenreIndex, rows: np.ndarray, scores: np.ndarray, k: int, diversity: float) -> np.ndarray:
+    """
+    Maximal Marginal Relevance sobre los bitsets de género: elige k posiciones maximizando
+    (1-diversity)·relevancia - diversity·max Jaccard(géneros, ya elegidos). Relevancia = score
+    normalizado a [0, 1]. Devuelve las posiciones en orden de elección.
+    """
+    n = len(rows)
+    k = min(int(k), n)
+    if k == 0:
+        return np.empty(0, dtype="int64")
+    s = np.asarray(scores, dtype="float64")
+    span = s.max() - s.min()
+    rel = (s - s.min()) / span if span > 0 else np.ones(n)
+    b = index.bits[rows]
+    size = index.sizes[rows]
+    redundancy = np.zeros(n)
+    free = np.ones(n, dtype=bool)
+    chosen = np.empty(k, dtype="int64")
+    for t in range(k):
+        value = np.where(free, (1 - diversity) * rel - diversity * redundancy, -np.inf)
+        j = int(np.argmax(value))
+        chosen[t] = j
+        free[j] = False
+        inter = np.bitwise_count(b & b[j]).sum(axis=1)
+        union = size + size[j] - inter
+        redundancy = np.maximum(redundancy, np.where(union > 0, inter / np.maximum(union, 1), 0.0))
+    return chosen
@@ -0,0 +1,91 @@
+"""
+Caché HTTP de las lecturas (/titles, /getrecomenders): ETag = hash de la versión de los datos
+(firma del snapshot/CSV, valoraciones incrementales aplicadas, min_periods y motor) y de la
+consulta. Con If-None-Match coincidente se responde 304 sin calcular nada, y los cuerpos ya
+serializados se guardan en una LRU por proceso acotada por bytes.
+  HTTP_CACHE_MAX_AGE  segundos de Cache-Control: max-age (60 por defecto)
+  RESPONSE_CACHE_MB   tamaño de la caché de respuestas (16 por defecto; 0 la desactiva)
+"""
+from __future__ import annotations
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Mapping, Optional
+from . import metrics
+
+not_modified = metrics.counter("recomendar_http_not_modified", "Respuestas 304 por If-None-Match", ["route"])
+
+
+def etag_for(version: str, route: str, params: Mapping) -> str:
+    query = "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+    return '"' + hashlib.sha1(f"{version}|{route}|{query}".encode()).hexdigest()[:20] + '"'
+
+
+def matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match (lista de ETags, débiles o no, o '*') contiene `etag`."""
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or any((t[2:] if t.startswith("W/") else t) == etag for t in tags)
+
+
+def headers_for(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": f"public, max-age={int(os.environ.get('HTTP_CACHE_MAX_AGE', 60))}"}
+
+
+class ResponseCache:
+    """LRU etag → cuerpo (bytes), acotada por bytes. La versión va en la clave: no hay que invalidar."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = int(max_bytes)
+        self._data: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, etag: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._data.get(etag)
+            if body is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(etag)
+            self.hits += 1
+            return body
+
+    def put(self, etag: str, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(etag, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._data[etag] = body
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                self._bytes -= len(self._data.popitem(last=False)[1])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._data), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+response_cache = ResponseCache(int(float(os.environ.get("RESPONSE_CACHE_MB", 16)) * 1024 * 1024))
+
+
+def _stat(field: str):
+    return lambda: [({}, response_cache.stats()[field])]
+
+
+for _field, _kind, _help in [("hits", "counter", "Respuestas servidas desde la caché de respuestas"),
+                             ("misses", "counter", "Fallos de la caché de respuestas"),
+                             ("bytes", "gauge", "Bytes en la caché de respuestas")]:
+    metrics.collect(f"recomendar_response_cache_{_field}", _help, _kind)(_stat(_field))
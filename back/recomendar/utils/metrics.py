@@ -0,0 +1,275 @@
+"""
+Métricas del proceso en formato de texto de Prometheus (GET /metrics), sin dependencias:
+contadores e histogramas con etiquetas, `span(etapa)` para medir etapas internas con reloj
+monótono y colectores que leen estado ya existente (cachés, matrices, pools) al exportar.
+Cada petición lleva además un RequestStats (contextvar) con el tiempo por etapa, que el
+middleware registra y que el perfilador por muestreo usa para saber qué hilos muestrear.
+"""
+from __future__ import annotations
+import contextvars
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, Dict[str, str], float]      # (sufijo, etiquetas, valor)
+
+
+def _labels(names: Sequence[str], values: Sequence) -> Labels:
+    return tuple(zip(names, (str(v) for v in values)))
+
+
+def _fmt_labels(labels) -> str:
+    items = labels.items() if isinstance(labels, dict) else labels
+    if not items:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not v.is_integer() else str(int(v))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount: float = 1) -> None:
+        key = _labels(self.labelnames, labelvalues)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        for labels, v in items:
+            yield "_total", dict(labels), v
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values: Dict[Labels, List] = {}    # etiquetas → [cuentas por cubo..., suma]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues) -> None:
+        key = _labels(self.labelnames, labelvalues)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            v = self._values.get(key)
+            if v is None:
+                v = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            v[i] += 1
+            v[-1] += value
+
+    def samples(self) -> Iterator[Sample]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        for labels, v in items:
+            base, acc = dict(labels), 0
+            for le, n in zip(self.buckets + (float("inf"),), v[:-1]):
+                acc += n
+                yield "_bucket", {**base, "le": _fmt_value(le)}, acc
+            yield "_count", base, acc
+            yield "_sum", base, v[-1]
+
+
+class Collected:
+    """Métrica calculada al exportar: fn() → [(etiquetas, valor)]."""
+
+    def __init__(self, name: str, help: str, kind: str, fn: Callable[[], List[Tuple[Dict[str, str], float]]]):
+        self.name, self.help, self.kind, self.fn = name, help, kind, fn
+
+    def samples(self) -> Iterator[Sample]:
+        suffix = "_total" if self.kind == "counter" else ""
+        for labels, v in self.fn():
+            yield suffix, labels, v
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # re-importar un módulo no duplica la métrica
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        out = []
+        for m in metrics:
+            try:
+                samples = list(m.samples())
+            except Exception:   # un colector roto no debe tumbar /metrics
+                continue
+            # formato 0.0.4: la cabecera de un contador lleva el nombre de la serie (_total)
+            name = m.name + "_total" if m.kind == "counter" else m.name
+            out.append(f"# HELP {name} {m.help}")
+            out.append(f"# TYPE {name} {m.kind}")
+            out.extend(f"{m.name}{suffix}{_fmt_labels(labels)} {_fmt_value(v)}" for suffix, labels, v in samples)
+        return "\n".join(out) + "\n"
+
+
+registry = Registry()
+
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+    return registry.register(Counter(name, help, labelnames))
+
+
+def histogram(name: str, help: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, help, labelnames, buckets))
+
+
+def collect(name: str, help: str, kind: str = "gauge"):
+    """Decorador: registra fn() → [(etiquetas, valor)] como métrica leída al exportar."""
+    def deco(fn):
+        registry.register(Collected(name, help, kind, fn))
+        return fn
+    return deco
+
+
+def render() -> str:
+    return registry.render()
+
+
+# --- etapas ---
+
+stage_seconds = histogram("recomendar_stage_seconds", "Duración de las etapas internas", ["stage"])
+
+
+class RequestStats:
+    """Tiempo por etapa de una petición y los hilos que han trabajado para ella."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.threads: Set[int] = {threading.get_ident()}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def summary(self) -> str:
+        with self._lock:
+            return " ".join(f"{k}={v * 1e3:.1f}ms" for k, v in self.stages.items())
+
+
+_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("recomendar_request", default=None)
+
+
+def begin_request() -> Tuple[RequestStats, contextvars.Token]:
+    stats = RequestStats()
+    return stats, _request.set(stats)
+
+
+def end_request(token: contextvars.Token) -> None:
+    _request.reset(token)
+
+
+def record(stage: str, seconds: float) -> None:
+    stage_seconds.observe(seconds, stage)
+    stats = _request.get()
+    if stats is not None:
+        stats.add(stage, seconds)
+
+
+@contextmanager
+def span(stage: str):
+    """Mide el bloque como `stage` (las etapas anidadas cuentan también en la de fuera)."""
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - t)
+
+
+def bind(fn: Callable, *args) -> Callable[[], object]:
+    """
+    fn(*args) para ejecutar en otro hilo con el contexto de la petición actual
+    (run_in_executor no copia contextvars): las etapas y el perfilador siguen a la petición.
+    """
+    ctx = contextvars.copy_context()
+    stats = ctx.get(_request)
+
+    def run():
+        if stats is None:
+            return ctx.run(fn, *args)
+        tid = threading.get_ident()
+        with stats._lock:
+            stats.threads.add(tid)
+        try:
+            return ctx.run(fn, *args)
+        finally:
+            with stats._lock:
+                stats.threads.discard(tid)
+    return run
+
+
+# --- perfilador por muestreo ---
+
+def _fold(frame) -> str:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+class StackSampler:
+    """
+    Muestrea cada `interval` segundos las pilas de los hilos de una petición
+    (RequestStats.threads). Resultado en formato "folded" (flamegraph.pl / speedscope).
+    """
+
+    def __init__(self, stats: RequestStats, interval: float = 0.005):
+        self.stats = stats
+        self.interval = float(interval)
+        self.counts: _Tally = _Tally()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="recomendar-profiler", daemon=True)
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self.stats._lock:
+                threads = list(self.stats.threads)
+            for tid in threads:
+                f = frames.get(tid)
+                if f is not None:
+                    self.counts[_fold(f)] += 1
+
+    def stop(self) -> _Tally:
+        self._stop.set()
+        self._thread.join()
+        return self.counts
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.counts.most_common())
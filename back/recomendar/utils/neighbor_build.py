@@ -0,0 +1,171 @@
+"""
+Construcción paralela y reanudable del índice de vecinos (neighbors_mp<minp>.npz).
+
+La matriz de valoraciones se copia una sola vez a bloques de multiprocessing.shared_memory;
+cada worker la abre sin copiarla (RatingsMatrix sobre esos buffers) y calcula tramos
+contiguos de columnas (shards). Cada shard terminado se guarda como checkpoint en
+neighbors_mp<minp>.parts/, de modo que una construcción interrumpida continúa donde se quedó
+si los datos, minp, topn y el reparto no han cambiado. Al final se fusionan en el .npz.
+"""
+from __future__ import annotations
+import json
+import multiprocessing as mp
+import shutil
+import time
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from .neighbors import NeighborIndex, RatingsMatrix
+
+_ARRAYS = ("user_ids", "item_ids", "indptr", "indices", "data",
+           "item_indptr", "item_users", "item_data", "item_mean", "item_std")
+
+# (shard, animes calculados)
+ShardResult = Tuple[int, int]
+# (animes hechos, total, de ellos ya hechos al reanudar, segundos)
+Progress = Callable[[int, int, int, float], None]
+
+
+class SharedMatrix:
+    """Arrays de una RatingsMatrix en shared_memory; `spec` basta para abrirla en otro proceso."""
+
+    def __init__(self, matrix: RatingsMatrix):
+        self.blocks: List[shared_memory.SharedMemory] = []
+        self.spec: Dict[str, Tuple[str, str, Tuple[int, ...]]] = {}
+        for name in _ARRAYS:
+            src = np.ascontiguousarray(getattr(matrix, name))
+            shm = shared_memory.SharedMemory(create=True, size=max(src.nbytes, 1))
+            np.ndarray(src.shape, dtype=src.dtype, buffer=shm.buf)[...] = src
+            self.blocks.append(shm)
+            self.spec[name] = (shm.name, src.dtype.str, src.shape)
+
+    @staticmethod
+    def attach(spec: Dict[str, Tuple[str, str, Tuple[int, ...]]]) -> Tuple[RatingsMatrix, list]:
+        """(matriz sobre la memoria compartida, bloques abiertos: hay que mantenerlos vivos)."""
+        blocks, arrays = [], {}
+        for name, (shm_name, dtype, shape) in spec.items():
+            shm = shared_memory.SharedMemory(name=shm_name)
+            blocks.append(shm)
+            arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        matrix = RatingsMatrix(arrays["user_ids"], arrays["item_ids"], arrays["indptr"], arrays["indices"],
+                               arrays["data"], csc=(arrays["item_indptr"], arrays["item_users"], arrays["item_data"]),
+                               item_mean=arrays["item_mean"], item_std=arrays["item_std"])
+        return matrix, blocks
+
+    def close(self) -> None:
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+
+
+def shard_bounds(n_items: int, shard_size: int) -> List[List[int]]:
+    """Tramos [inicio, fin) de columnas; no dependen del número de workers (los checkpoints sí valen)."""
+    edges = list(range(0, n_items, max(1, int(shard_size)))) + [n_items]
+    return [[a, b] for a, b in zip(edges[:-1], edges[1:])]
+
+
+def _shard_path(parts: Path, i: int) -> Path:
+    return parts / f"shard_{i:05d}.npz"
+
+
+def build_shard(matrix: RatingsMatrix, i: int, start: int, end: int, min_periods: int, topn: int,
+                parts: Path) -> ShardResult:
+    """Calcula las columnas [start, end) y las guarda como checkpoint (escritura atómica)."""
+    rows = [matrix.pearson_neighbors(int(aid), min_periods, topn) for aid in matrix.item_ids[start:end]]
+    lens = np.array([len(r[0]) for r in rows], dtype="int64")
+    def cat(k, dtype):
+        return np.concatenate([r[k] for r in rows]).astype(dtype) if rows else np.empty(0, dtype=dtype)
+    tmp = parts / f".shard_{i:05d}.tmp.npz"
+    np.savez(tmp, lens=lens, neighbor_ids=cat(0, "int32"), correlation=cat(1, "float32"), common=cat(2, "int32"))
+    tmp.replace(_shard_path(parts, i))
+    return i, end - start
+
+
+# estado del proceso worker (initializer)
+_matrix: Optional[RatingsMatrix] = None
+_blocks: list = []
+_job: tuple = ()
+
+
+def _init_worker(spec, min_periods, topn, parts):
+    global _matrix, _blocks, _job
+    _matrix, _blocks = SharedMatrix.attach(spec)
+    _job = (min_periods, topn, Path(parts))
+
+
+def _run_shard(task: Tuple[int, int, int]) -> ShardResult:
+    i, start, end = task
+    return build_shard(_matrix, i, start, end, *_job)
+
+
+def _prepare(parts: Path, manifest: dict, restart: bool) -> None:
+    """Deja `parts` lista: conserva los checkpoints si el manifiesto coincide, si no la vacía."""
+    path = parts / "manifest.json"
+    if parts.exists() and (restart or not path.exists() or json.loads(path.read_text()) != manifest):
+        shutil.rmtree(parts)
+    parts.mkdir(parents=True, exist_ok=True)
+    if not path.exists():
+        path.write_text(json.dumps(manifest, indent=2))
+
+
+def build_parallel(matrix: RatingsMatrix, out: Path, min_periods: int, topn: int = 200,
+                   workers: int = 1, shard_size: int = 128, fingerprint: str = "",
+                   restart: bool = False, progress: Optional[Progress] = None) -> NeighborIndex:
+    """
+    Índice de vecinos de `matrix` calculado en `workers` procesos y guardado en `out`.
+    `fingerprint` identifica los datos (RecommenderData.data_version): con otro valor los
+    checkpoints anteriores se descartan, y se guarda en el índice para verificarlo al cargar.
+    progress(hechos, total, reanudados, segundos) tras cada shard.
+    """
+    out = Path(out)
+    parts = out.with_suffix(".parts")
+    bounds = shard_bounds(matrix.n_items, shard_size)
+    manifest = {"fingerprint": fingerprint, "min_periods": int(min_periods), "topn": int(topn),
+                "n_items": matrix.n_items, "nnz": int(len(matrix.data)), "shards": bounds}
+    _prepare(parts, manifest, restart)
+
+    pending = [(i, a, b) for i, (a, b) in enumerate(bounds) if not _shard_path(parts, i).exists()]
+    done = sum(b - a for i, (a, b) in enumerate(bounds) if _shard_path(parts, i).exists())
+    resumed, total, t0 = done, matrix.n_items, time.perf_counter()
+
+    def report(result: ShardResult) -> None:
+        nonlocal done
+        done += result[1]
+        if progress is not None:
+            progress(done, total, resumed, time.perf_counter() - t0)
+
+    if workers > 1 and len(pending) > 1:
+        shm = SharedMatrix(matrix)
+        try:
+            ctx = mp.get_context("fork") if "fork" in mp.get_all_start_methods() else mp.get_context()
+            with ctx.Pool(min(workers, len(pending)), initializer=_init_worker,
+                          initargs=(shm.spec, min_periods, topn, str(parts))) as pool:
+                for result in pool.imap_unordered(_run_shard, pending):
+                    report(result)
+        finally:
+            shm.close()
+    else:
+        for i, a, b in pending:
+            report(build_shard(matrix, i, a, b, min_periods, topn, parts))
+
+    index = merge_shards(matrix, parts, len(bounds), min_periods, topn, data_version=fingerprint)
+    index.save(out)
+    shutil.rmtree(parts)
+    return index
+
+
+def merge_shards(matrix: RatingsMatrix, parts: Path, n_shards: int, min_periods: int, topn: int,
+                 data_version: str = "") -> NeighborIndex:
+    lens, ids, corr, common = [], [], [], []
+    for i in range(n_shards):
+        with np.load(_shard_path(parts, i)) as z:
+            lens.append(z["lens"])
+            ids.append(z["neighbor_ids"])
+            corr.append(z["correlation"])
+            common.append(z["common"])
+    indptr = np.zeros(matrix.n_items + 1, dtype="int64")
+    np.cumsum(np.concatenate(lens), out=indptr[1:])
+    return NeighborIndex(np.array(matrix.item_ids), indptr, np.concatenate(ids), np.concatenate(corr),
+                         np.concatenate(common), min_periods, topn, data_version)
@@ -0,0 +1,298 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+# (anime_ids, correlation, common)
+Neighbors = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def _empty_neighbors() -> Neighbors:
+    return (np.empty(0, dtype="int32"), np.empty(0, dtype="float32"), np.empty(0, dtype="int32"))
+
+
+def _concat_ranges(starts: np.ndarray, lens: np.ndarray) -> np.ndarray:
+    """Posiciones concatenadas de [start, start+len) para cada par, sin bucles Python."""
+    starts = starts.astype("int64")
+    lens = lens.astype("int64")
+    total = int(lens.sum())
+    if total == 0:
+        return np.empty(0, dtype="int64")
+    offsets = np.cumsum(lens) - lens
+    return np.arange(total, dtype="int64") - np.repeat(offsets - starts, lens)
+
+
+def _gather_ranges(indptr: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Posiciones concatenadas de indptr[r]:indptr[r+1] para cada r en rows."""
+    starts = indptr[rows]
+    return _concat_ranges(starts, indptr[rows + 1] - starts)
+
+
+# varianza por debajo de la cual un anime (o un par) se trata como constante
+EPS = 1e-9
+
+
+class RatingsMatrix:
+    """
+    Matriz usuario×anime dispersa: CSR (filas = usuarios) y su transpuesta CSC
+    (filas = animes). Los índices de columna son posiciones en `item_ids`.
+    Tabla de estadísticas por anime: item_count (valoraciones), item_mean e item_std
+    (desviación poblacional), para descartar en O(1) los que no pueden tener vecinos.
+    """
+
+    def __init__(self, user_ids: np.ndarray, item_ids: np.ndarray,
+                 indptr: np.ndarray, indices: np.ndarray, data: np.ndarray,
+                 csc: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None,
+                 item_mean: Optional[np.ndarray] = None, item_std: Optional[np.ndarray] = None):
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.n_users = int(len(user_ids))
+        self.n_items = int(len(item_ids))
+
+        if csc is not None:
+            self.item_indptr, self.item_users, self.item_data = csc
+        else:
+            # CSC vía ordenación estable por columna
+            order = np.argsort(indices, kind="stable")
+            self.item_indptr = np.zeros(self.n_items + 1, dtype="int64")
+            np.cumsum(np.bincount(indices, minlength=self.n_items), out=self.item_indptr[1:])
+            self.item_users = np.repeat(np.arange(self.n_users, dtype="int32"), np.diff(indptr))[order]
+            self.item_data = data[order]
+
+        self.item_count = np.diff(self.item_indptr)
+        if item_mean is not None:
+            self.item_mean = item_mean
+        else:
+            sums = np.bincount(indices, weights=data, minlength=self.n_items)
+            self.item_mean = np.where(self.item_count > 0, sums / np.maximum(self.item_count, 1), 0.0)
+        if item_std is not None:
+            self.item_std = item_std
+        else:
+            # dos pasadas (desviaciones respecto a la media): un anime constante da 0 exacto
+            dev = np.asarray(data, dtype="float64") - self.item_mean[indices]
+            ss = np.bincount(indices, weights=dev * dev, minlength=self.n_items)
+            self.item_std = np.sqrt(ss / np.maximum(self.item_count, 1))
+
+    @classmethod
+    def from_frame(cls, ratings: pd.DataFrame) -> "RatingsMatrix":
+        """Construye la matriz desde un DataFrame (user_id, anime_id, rating); duplicados → media."""
+        return cls.from_coo(ratings["user_id"].to_numpy(), ratings["anime_id"].to_numpy(),
+                            ratings["rating"].to_numpy(dtype="float64"))
+
+    @classmethod
+    def from_coo(cls, users: np.ndarray, items: np.ndarray, vals: np.ndarray,
+                 keep_last: bool = False) -> "RatingsMatrix":
+        """Desde coordenadas (user_id, anime_id, rating); duplicados → media, o el último si `keep_last`."""
+        vals = np.asarray(vals, dtype="float64")
+        user_ids, u = np.unique(users, return_inverse=True)
+        item_ids, i = np.unique(items, return_inverse=True)
+        order = np.lexsort((i, u))
+        u, i, vals = u[order], i[order], vals[order]
+
+        # mismo criterio que pivot_table(aggfunc="mean")
+        first = np.ones(len(u), dtype=bool)
+        if len(u) > 1:
+            first[1:] = (u[1:] != u[:-1]) | (i[1:] != i[:-1])
+        starts = np.flatnonzero(first)
+        if len(starts) != len(u):
+            if keep_last:
+                # lexsort es estable: el último de cada grupo es el más reciente
+                last = np.append(starts[1:], len(u)) - 1
+                vals, u, i = vals[last], u[last], i[last]
+            else:
+                vals = np.add.reduceat(vals, starts) / np.diff(np.append(starts, len(u)))
+                u, i = u[starts], i[starts]
+
+        indptr = np.zeros(len(user_ids) + 1, dtype="int64")
+        np.cumsum(np.bincount(u, minlength=len(user_ids)), out=indptr[1:])
+        return cls(user_ids.astype("int32"), item_ids.astype("int32"), indptr,
+                   i.astype("int32"), vals.astype("float32"))
+
+    def upsert(self, users: np.ndarray, items: np.ndarray, vals: np.ndarray) -> "RatingsMatrix":
+        """Nueva matriz con las valoraciones añadidas; un (usuario, anime) existente se sustituye."""
+        return self.from_coo(
+            np.concatenate([np.repeat(np.asarray(self.user_ids), np.diff(self.indptr)), users]),
+            np.concatenate([np.asarray(self.item_ids)[self.indices], items]),
+            np.concatenate([np.asarray(self.data, dtype="float64"), vals]),
+            keep_last=True)
+
+    def items_of_users(self, user_ids: np.ndarray) -> np.ndarray:
+        """anime_ids valorados por alguno de `user_ids` (únicos, ordenados)."""
+        user_ids = np.unique(np.asarray(user_ids, dtype="int64"))
+        pos = np.minimum(np.searchsorted(self.user_ids, user_ids), max(self.n_users - 1, 0))
+        rows = pos[(self.n_users > 0) & (self.user_ids[pos] == user_ids)]
+        return np.unique(np.asarray(self.item_ids)[self.indices[_gather_ranges(self.indptr, rows)]])
+
+    def to_frame(self) -> pd.DataFrame:
+        """Vista larga (user_id, anime_id, rating), compatible con el antiguo `ratings`."""
+        return pd.DataFrame({
+            "user_id": np.repeat(np.asarray(self.user_ids), np.diff(self.indptr)),
+            "anime_id": np.asarray(self.item_ids)[self.indices],
+            "rating": np.asarray(self.data),
+        })
+
+    def item_index(self, anime_id: int) -> Optional[int]:
+        pos = int(np.searchsorted(self.item_ids, anime_id))
+        if pos < self.n_items and int(self.item_ids[pos]) == int(anime_id):
+            return pos
+        return None
+
+    def _eligible(self, col: int, min_periods: int) -> bool:
+        return int(self.item_count[col]) >= min_periods and float(self.item_std[col]) ** 2 > EPS
+
+    def eligible(self, anime_id: int, min_periods: int) -> bool:
+        """Si `anime_id` puede tener vecinos Pearson: min_periods valoraciones y varianza no nula."""
+        col = self.item_index(anime_id)
+        return col is not None and self._eligible(col, min_periods)
+
+    def pearson_neighbors(self, anime_id: int, min_periods: int, topk: int,
+                          allowed: Optional[np.ndarray] = None) -> Neighbors:
+        """
+        Pearson de `anime_id` contra cada anime co-valorado, con las mismas reglas que
+        el antiguo pivot + corrwith: solo usuarios en común, al menos `min_periods`
+        co-valoraciones y varianza no nula. Coste O(valoraciones de sus usuarios).
+        `allowed` (bool por columna) restringe los candidatos antes del top-k.
+        """
+        col = self.item_index(anime_id)
+        if col is None or not self._eligible(col, min_periods):
+            return _empty_neighbors()
+
+        s, e = self.item_indptr[col], self.item_indptr[col + 1]
+        raters = self.item_users[s:e]
+        x = self.item_data[s:e].astype("float64")
+
+        pos = _gather_ranges(self.indptr, raters)
+        cols = self.indices[pos]
+        # centrar antes de acumular evita cancelación numérica; Pearson no cambia
+        xr = np.repeat(x - x.mean(), self.indptr[raters + 1] - self.indptr[raters])
+        y = self.data[pos].astype("float64") - self.item_mean[cols]
+
+        m = self.n_items
+        n = np.bincount(cols, minlength=m)
+        sx = np.bincount(cols, weights=xr, minlength=m)
+        sy = np.bincount(cols, weights=y, minlength=m)
+        sxx = np.bincount(cols, weights=xr * xr, minlength=m)
+        syy = np.bincount(cols, weights=y * y, minlength=m)
+        sxy = np.bincount(cols, weights=xr * y, minlength=m)
+
+        with np.errstate(all="ignore"):
+            nf = n.astype("float64")
+            cov = sxy - sx * sy / nf
+            vx = sxx - sx * sx / nf
+            vy = syy - sy * sy / nf
+            corr = cov / np.sqrt(vx * vy)
+
+        valid = (n >= min_periods) & (vx > EPS) & (vy > EPS) & np.isfinite(corr)
+        valid[col] = False
+        if allowed is not None:
+            valid &= allowed
+        cand = np.flatnonzero(valid)
+        if len(cand) == 0:
+            return _empty_neighbors()
+
+        k = min(int(topk), len(cand))
+        c = corr[cand]
+        if k < len(cand):
+            part = np.argpartition(-c, k - 1)[:k]
+            cand, c = cand[part], c[part]
+        order = np.argsort(-c, kind="stable")
+        cand, c = cand[order], np.clip(c[order], -1.0, 1.0)
+        return self.item_ids[cand], c.astype("float32"), n[cand].astype("int32")
+
+
+class NeighborIndex:
+    """
+    Top-N vecinos Pearson por anime, en formato CSR:
+    fila i (anime item_ids[i]) = neighbor_ids/correlation/common[indptr[i]:indptr[i+1]],
+    ordenada por correlación descendente. `data_version` identifica los datos con los
+    que se calculó (RecommenderData.data_version).
+    """
+
+    FILENAME = "neighbors_mp{minp}.npz"
+
+    def __init__(self, item_ids: np.ndarray, indptr: np.ndarray, neighbor_ids: np.ndarray,
+                 correlation: np.ndarray, common: np.ndarray, min_periods: int, topn: int,
+                 data_version: str = ""):
+        self.item_ids = item_ids
+        self.indptr = indptr
+        self.neighbor_ids = neighbor_ids
+        self.correlation = correlation
+        self.common = common
+        self.min_periods = int(min_periods)
+        self.topn = int(topn)
+        self.data_version = data_version
+
+    @classmethod
+    def path_for(cls, data_dir: Path, min_periods: int) -> Path:
+        return Path(data_dir) / cls.FILENAME.format(minp=int(min_periods))
+
+    @classmethod
+    def build(cls, matrix: RatingsMatrix, min_periods: int, topn: int = 200,
+              progress: Optional[Callable[[int, int], None]] = None, data_version: str = "") -> "NeighborIndex":
+        rows = []
+        total = matrix.n_items
+        for j, aid in enumerate(matrix.item_ids):
+            rows.append(matrix.pearson_neighbors(int(aid), min_periods, topn))
+            if progress is not None and ((j + 1) % 500 == 0 or j + 1 == total):
+                progress(j + 1, total)
+
+        indptr = np.zeros(total + 1, dtype="int64")
+        np.cumsum([len(r[0]) for r in rows], out=indptr[1:])
+        def cat(k, dtype):
+            return np.concatenate([r[k] for r in rows]).astype(dtype) if rows else np.empty(0, dtype=dtype)
+        return cls(matrix.item_ids.copy(), indptr, cat(0, "int32"), cat(1, "float32"),
+                   cat(2, "int32"), min_periods, topn, data_version)
+
+    def save(self, path: Path) -> None:
+        # temporal + rename: un proceso que carga el índice nunca ve uno a medio escribir
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as fh:
+            np.savez(fh, item_ids=self.item_ids, indptr=self.indptr,
+                     neighbor_ids=self.neighbor_ids, correlation=self.correlation,
+                     common=self.common, meta=np.array([self.min_periods, self.topn], dtype="int64"),
+                     data_version=np.array(self.data_version))
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "NeighborIndex":
+        with np.load(path) as z:
+            minp, topn = (int(v) for v in z["meta"])
+            # índices anteriores sin huella: data_version vacío (no verificables)
+            version = str(z["data_version"]) if "data_version" in z.files else ""
+            return cls(z["item_ids"], z["indptr"], z["neighbor_ids"], z["correlation"],
+                       z["common"], minp, topn, version)
+
+    def lookup(self, anime_id: int, topk: int) -> Optional[Neighbors]:
+        """Vecinos de `anime_id` en O(topk); None si no está en el índice o la fila no basta."""
+        pos = int(np.searchsorted(self.item_ids, anime_id))
+        if pos >= len(self.item_ids) or int(self.item_ids[pos]) != int(anime_id):
+            return None
+        s, e = int(self.indptr[pos]), int(self.indptr[pos + 1])
+        # una fila llena puede estar truncada: solo sirve para topk <= topn
+        if e - s >= self.topn and int(topk) > self.topn:
+            return None
+        e = min(e, s + int(topk))
+        return self.neighbor_ids[s:e], self.correlation[s:e], self.common[s:e]
+
+    def gather(self, anime_ids: np.ndarray, topk: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Filas de varios animes de una vez: (owner, neighbor_ids, correlation, missing).
+        owner[j] es la posición en `anime_ids` de la fila a la que pertenece el vecino j;
+        missing marca los animes que no están en el índice o cuya fila truncada no alcanza `topk`.
+        """
+        anime_ids = np.asarray(anime_ids, dtype="int64")
+        pos = np.minimum(np.searchsorted(self.item_ids, anime_ids), max(len(self.item_ids) - 1, 0))
+        present = (len(self.item_ids) > 0) & (self.item_ids[pos] == anime_ids)
+        starts = np.where(present, self.indptr[pos], 0)
+        lens = np.where(present, self.indptr[pos + 1] - self.indptr[pos], 0)
+        missing = ~present | ((lens >= self.topn) & (int(topk) > self.topn))
+        lens = np.where(missing, 0, np.minimum(lens, int(topk)))
+
+        idx = _concat_ranges(starts, lens)
+        owner = np.repeat(np.arange(len(anime_ids)), lens)
+        return owner, self.neighbor_ids[idx], self.correlation[idx], missing
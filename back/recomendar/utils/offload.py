@@ -0,0 +1,103 @@
+from __future__ import annotations
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+from . import metrics
+
+
+class Overloaded(Exception):
+    """Cola llena: la petición se rechaza (503) en vez de esperar."""
+
+
+class Offloader:
+    """
+    Ejecuta trabajo de CPU fuera del event loop en un pool de hilos acotado.
+    - Coalescing: peticiones concurrentes con la misma clave esperan un único cálculo.
+    - Control de admisión: con `max_pending` trabajos en curso o en cola se lanza Overloaded.
+    Los kernels NumPy sueltan el GIL en buena parte, y el loop sigue atendiendo lo barato.
+    """
+
+    def __init__(self, name: str, workers: int, max_pending: int):
+        self.name = name
+        self.workers = int(workers)
+        self.max_pending = int(max_pending)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # perezoso: no se crean hilos en procesos que nunca sirven ASGI
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix=f"recomendar-{self.name}")
+        return self._executor
+
+    def _done(self, key: Optional[Hashable], fut: asyncio.Future) -> None:
+        with self._lock:
+            self.pending -= 1
+            self.completed += 1
+            if key is not None and self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+    async def run(self, key: Optional[Hashable], fn: Callable[..., Any], *args) -> Any:
+        """Resultado de fn(*args) calculado en el pool; key=None desactiva el coalescing."""
+        executor = self.executor
+        with self._lock:
+            fut = self._inflight.get(key) if key is not None else None
+            if fut is not None:
+                self.coalesced += 1
+            elif self.pending >= self.max_pending:
+                self.rejected += 1
+                raise Overloaded(f"{self.name}: {self.pending} trabajos pendientes")
+            else:
+                self.pending += 1
+                # con el contexto de la petición: etapas y perfilador la siguen al hilo del pool
+                fut = asyncio.get_running_loop().run_in_executor(executor, metrics.bind(fn, *args))
+                fut.add_done_callback(lambda f: self._done(key, f))
+                if key is not None:
+                    self._inflight[key] = fut
+        # shield: si un cliente se desconecta, el cálculo sigue para los demás que lo esperan
+        return await asyncio.shield(fut)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "completed": self.completed,
+                "coalesced": self.coalesced,
+                "rejected": self.rejected,
+            }
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+# recomendaciones (cálculo pesado) y consultas de catálogo por separado, para que un
+# fallo de caché lento no deje en cola el autocompletado
+compute = Offloader("compute", _env_int("ASYNC_WORKERS", min(8, os.cpu_count() or 4)),
+                    _env_int("ASYNC_MAX_PENDING", 64))
+lookup = Offloader("lookup", _env_int("ASYNC_LOOKUP_WORKERS", 4), _env_int("ASYNC_LOOKUP_MAX_PENDING", 256))
+
+
+def _pool_stat(field: str):
+    def fn():
+        return [({"pool": p.name}, p.stats()[field]) for p in (compute, lookup)]
+    return fn
+
+
+for _field, _kind, _help in [("pending", "gauge", "Trabajos en curso o en cola"),
+                             ("completed", "counter", "Trabajos terminados"),
+                             ("coalesced", "counter", "Peticiones servidas por un cálculo ya en curso"),
+                             ("rejected", "counter", "Peticiones rechazadas con 503 por cola llena")]:
+    metrics.collect(f"recomendar_offload_{_field}", _help, _kind)(_pool_stat(_field))
@@ -1,112 +1,538 @@
 from __future__ import annotations
 from pathlib import Path
-from functools import lru_cache
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+from .ann import IVFIndex
+from .cache import ResultCache, get_result_cache
+from .catalog import Catalog
+from .deltas import append as append_deltas, delta_path, read_from as read_deltas
+from . import metrics
+from .factorization import FactorModel
+from .genres import AnimeFilter, GenreIndex, mmr, pool_size
+from .neighbors import NeighborIndex, Neighbors, RatingsMatrix, _concat_ranges, _empty_neighbors
+from .search import TitleIndex
+from .serialize import AnimeFragments
+from .snapshot import load_snapshot, snapshot_meta, source_signature
 
-class LightRecommender:
-    def __init__(self, data_dir: Path, min_periods: int = 3):
+logger = logging.getLogger("recomendar")
+
+neighbor_lookups = metrics.counter("recomendar_neighbor_lookups", "Listas de vecinos por origen", ["source"])
+neighbor_rows = metrics.histogram("recomendar_neighbor_rows", "Filas de vecinos leídas por consulta de vistos",
+                                  ["engine"], buckets=metrics.SIZE_BUCKETS)
+candidates = metrics.histogram("recomendar_candidates", "Candidatos puntuados por usuario",
+                               ["engine"], buckets=metrics.SIZE_BUCKETS)
+
+def load_anime_csv(data_dir: Path) -> pd.DataFrame:
+    anime = pd.read_csv(Path(data_dir) / "anime.csv",
+                        usecols=["anime_id","name","members","genre","episodes"])  # Añadidos genre y episodes
+    anime["anime_id"] = anime["anime_id"].astype("int32")
+    anime["members"] = anime["members"].fillna(0).astype("int64")
+    anime["episodes"] = pd.to_numeric(anime["episodes"], errors="coerce").fillna(0).astype("int32")  # Convertir episodes a int
+    anime["genre"] = anime["genre"].fillna("Unknown")  # Manejar géneros vacíos
+    return anime
+
+
+def load_ratings_csv(data_dir: Path) -> pd.DataFrame:
+    ratings = pd.read_csv(Path(data_dir) / "ratings_clean_1.csv",
+                          usecols=["user_id","anime_id","rating"])
+    ratings = ratings[ratings["rating"] != -1].copy()
+    ratings["user_id"] = ratings["user_id"].astype("int32")
+    ratings["anime_id"] = ratings["anime_id"].astype("int32")
+    ratings["rating"] = ratings["rating"].astype("float32")
+    return ratings
+
+
+def _columns(m: RatingsMatrix, anime_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(columnas en m, encontrados) de anime_ids; las no encontradas apuntan a la columna 0."""
+    anime_ids = np.asarray(anime_ids)
+    if m.n_items == 0:
+        return np.zeros(len(anime_ids), dtype="int64"), np.zeros(len(anime_ids), dtype=bool)
+    cols = np.minimum(np.searchsorted(m.item_ids, anime_ids), m.n_items - 1)
+    found = m.item_ids[cols] == anime_ids
+    return np.where(found, cols, 0), found
+
+
+class RecommenderData:
+    """
+    Datos cargados (anime, matriz de ratings, índices de títulos y catálogo),
+    independientes de min_periods: se comparten entre todas las vistas LightRecommender.
+    Las valoraciones de ratings_delta.csv se aplican encima (refresh) sustituyendo la matriz.
+    """
+
+    def __init__(self, data_dir: Path, deltas: bool = True):
         self.data_dir = Path(data_dir)
-        self.min_periods = int(min_periods)
+        t0 = time.perf_counter()
 
-        self.anime = pd.read_csv(self.data_dir / "anime.csv",
-                                 usecols=["anime_id","name","members","genre","episodes"])  # Añadidos genre y episodes
-        self.anime["anime_id"] = self.anime["anime_id"].astype("int32")
-        self.anime["members"] = self.anime["members"].fillna(0).astype("int64")
-        self.anime["episodes"] = self.anime["episodes"].fillna(0).astype("int32")  # Convertir episodes a int
-        self.anime["genre"] = self.anime["genre"].fillna("Unknown")  # Manejar géneros vacíos
-        self.anime["name_norm"] = self.anime["name"].astype(str).str.strip().str.lower()
+        # Snapshot binario (manage.py build_snapshot) si existe y está al día; si no, CSV
+        self._ratings: Optional[pd.DataFrame] = None
+        self.snapshot = snapshot_meta(self.data_dir)
+        if self.snapshot is not None:
+            self.anime, self.matrix = load_snapshot(self.data_dir)
+        else:
+            self.anime = load_anime_csv(self.data_dir)
+            self._ratings = load_ratings_csv(self.data_dir)
+            self.matrix = RatingsMatrix.from_frame(self._ratings)
 
-        self.ratings = pd.read_csv(self.data_dir / "ratings_clean_1.csv",
-                                   usecols=["user_id","anime_id","rating"])
-        self.ratings = self.ratings[self.ratings["rating"] != -1].copy()
-        self.ratings["user_id"] = self.ratings["user_id"].astype("int32")
-        self.ratings["anime_id"] = self.ratings["anime_id"].astype("int32")
-        self.ratings["rating"] = self.ratings["rating"].astype("float32")
+        # identifica los datos base: forma parte de las claves de caché (las
+        # valoraciones incrementales se cubren invalidando los anime_id tocados). Es la firma
+        # de los CSV de origen tanto si se cargó el snapshot como los CSV: mismos datos, misma versión
+        if self.snapshot is not None:
+            signature = self.snapshot.get("sources", self.snapshot)
+        else:
+            signature = source_signature(self.data_dir)
+        self.data_version = hashlib.sha1(json.dumps(signature, sort_keys=True).encode()).hexdigest()[:12]
 
+        self.anime["name_norm"] = self.anime["name"].astype(str).str.strip().str.lower()
         self.id_by_name = dict(zip(self.anime["name_norm"], self.anime["anime_id"]))
+        self.titles_index = TitleIndex(self.anime["name"], self.anime["members"])
+        self.catalog = Catalog(self.anime, self.matrix, by_members=self.titles_index.positions)
+        self.fragments = AnimeFragments(self.anime)
+        self.genres = GenreIndex(self.anime["genre"].tolist(), self.anime["episodes"].to_numpy())
+
+        # anime_id → fila de `anime`, y rango alfabético del nombre por fila (orden de sort_values)
+        aids = self.anime["anime_id"].to_numpy()
+        self._anime_order = np.argsort(aids, kind="stable")
+        self._sorted_aids = aids[self._anime_order]
+        self.name_rank = np.empty(len(aids) + 1, dtype="int64")
+        self.name_rank[np.argsort(self.anime["name"].astype(str).to_numpy(), kind="stable")] = np.arange(len(aids))
+        self.name_rank[-1] = len(aids)   # fila -1 (sin ficha): al final, como NaN en sort_values
+        self._item_lookup = (self.matrix,) + self._item_arrays(self.matrix)
+
+        # anime_ids cuyas filas precalculadas (neighbors_mp*.npz) ya no valen
+        self.stale_ids = np.empty(0, dtype="int64")
+        self._caches: List[ResultCache] = []
+        self._lock = threading.Lock()
+        self._delta_offset = 0
+        self._deltas = delta_path(self.data_dir) if deltas else None
+        self._rebuild: Optional[Future] = None
+        self._failed_size: Optional[int] = None
+        metrics.record("load", time.perf_counter() - t0)
+        self.refresh(wait=True)
+
+    @property
+    def ratings(self) -> pd.DataFrame:
+        # con snapshot la tabla larga solo se materializa si alguien la pide
+        if self._ratings is None:
+            self._ratings = self.matrix.to_frame()
+        return self._ratings
+
+    def anime_rows(self, anime_ids: np.ndarray) -> np.ndarray:
+        """Fila de `anime` de cada anime_id (-1 si no tiene ficha)."""
+        anime_ids = np.asarray(anime_ids)
+        if len(self._sorted_aids) == 0:
+            return np.full(len(anime_ids), -1, dtype="int64")
+        pos = np.minimum(np.searchsorted(self._sorted_aids, anime_ids), len(self._sorted_aids) - 1)
+        return np.where(self._sorted_aids[pos] == anime_ids, self._anime_order[pos], -1)
+
+    def _item_arrays(self, matrix: RatingsMatrix) -> Tuple[np.ndarray, np.ndarray]:
+        # por columna de la matriz: fila en `anime` (-1 si no está) y rango alfabético del nombre
+        rows = self.anime_rows(matrix.item_ids)
+        return rows, self.name_rank[rows]
+
+    def item_lookup(self, matrix: RatingsMatrix) -> Tuple[np.ndarray, np.ndarray]:
+        """(fila en anime, rango del nombre) por columna de `matrix` (la que use la petición)."""
+        cached = self._item_lookup
+        if cached[0] is matrix:
+            return cached[1], cached[2]
+        return self._item_arrays(matrix)
+
+    def attach_cache(self, cache: ResultCache) -> None:
+        """Registra una caché para invalidarla cuando lleguen valoraciones nuevas."""
+        with self._lock:
+            if any(c is cache for c in self._caches):
+                return
+            self._caches.append(cache)
+            stale = self.stale_ids
+        # lo ya aplicado al cargar puede estar cacheado de antes en el almacén compartido
+        if len(stale):
+            cache.invalidate_ids(stale)
+
+    def refresh(self, wait: bool = False) -> np.ndarray:
+        """
+        Aplica las líneas nuevas de ratings_delta.csv. La matriz nueva se construye en un hilo,
+        fuera del camino de las peticiones, y se sustituye de una vez: con wait=False se lanza
+        (si no hay otra en curso) y se vuelve enseguida, mientras las consultas siguen con la
+        matriz actual; con wait=True se espera y se devuelven los anime_ids afectados.
+        """
+        touched = np.empty(0, dtype="int64")
+        while self.has_pending():
+            with self._lock:
+                job = self._rebuild
+                if job is None or job.done():
+                    size = self._deltas.stat().st_size
+                    if size == self._failed_size and not wait:
+                        return touched   # mismo fichero que ya falló: no se reintenta en cada petición
+                    job = self._rebuild = Future()
+                    threading.Thread(target=self._run_rebuild, args=(job, size), name="recomendar-deltas",
+                                     daemon=True).start()
+            if not wait:
+                return touched
+            before = self._delta_offset
+            touched = np.union1d(touched, job.result())
+            if self._delta_offset == before:
+                break   # solo queda una línea a medio escribir
+        return touched
+
+    def _run_rebuild(self, job: Future, size: int) -> None:
+        touched = np.empty(0, dtype="int64")
+        try:
+            # lo añadido mientras se construía se aplica en la misma tanda
+            while True:
+                df, offset = read_deltas(self._deltas, self._delta_offset)
+                if df.empty:
+                    self._delta_offset = offset   # solo líneas '-1' o a medio escribir
+                    break
+                touched = np.union1d(touched, self._apply(df, offset))
+            self._failed_size = None
+            job.set_result(touched)
+        except Exception as e:
+            logger.exception("No se pudieron aplicar las valoraciones de %s", self._deltas)
+            self._failed_size = size
+            job.set_exception(e)
+
+    def _apply(self, df: pd.DataFrame, offset: int) -> np.ndarray:
+        t0 = time.perf_counter()
+        users = df["user_id"].to_numpy()
+        with metrics.span("ingest"):
+            matrix = self.matrix.upsert(users, df["anime_id"].to_numpy(), df["rating"].to_numpy())
+            # Pearson(a, b) depende de los usuarios que valoraron ambos: cambia para todo
+            # anime valorado por un usuario con valoraciones nuevas
+            touched = matrix.items_of_users(users).astype("int64")
+            catalog = Catalog(self.anime, matrix, by_members=self.titles_index.positions)
+            lookup = (matrix,) + self._item_arrays(matrix)
+
+        # sustitución: las peticiones en curso terminan con la matriz que ya tenían
+        with self._lock:
+            self.matrix, self.catalog, self._item_lookup = matrix, catalog, lookup
+            self._ratings = None
+            self.stale_ids = np.union1d(self.stale_ids, touched)
+            self._delta_offset = offset
+            caches = list(self._caches)
+        for cache in caches:
+            cache.invalidate_ids(touched)
+        logger.info("%d valoraciones nuevas aplicadas en %.2fs (%d animes afectados)",
+                    len(df), time.perf_counter() - t0, len(touched))
+        return touched
+
+    def is_stale(self, anime_ids: np.ndarray) -> np.ndarray:
+        return np.isin(np.asarray(anime_ids, dtype="int64"), self.stale_ids)
+
+    @property
+    def version(self) -> str:
+        """Datos base + valoraciones incrementales aplicadas (cambia con cada refresh que aplica algo)."""
+        return f"{self.data_version}.{self._delta_offset}"
+
+    def has_pending(self) -> bool:
+        """Si ratings_delta.csv tiene líneas sin aplicar (un stat(), sin leer nada)."""
+        if self._deltas is None:
+            return False
+        try:
+            return self._deltas.stat().st_size > self._delta_offset
+        except FileNotFoundError:
+            return False
+
+
+class LightRecommender:
+    """Vista de consulta para un min_periods concreto sobre unos RecommenderData compartidos."""
+
+    engine = "pearson"
+
+    def __init__(self, data_dir: Path, min_periods: int = 3, cache: Optional[ResultCache] = None,
+                 data: Optional[RecommenderData] = None):
+        self.data = data if data is not None else RecommenderData(data_dir)
+        self.data_dir = self.data.data_dir
+        self.min_periods = int(min_periods)
+        self.cache = cache if cache is not None else get_result_cache()
+
+        self.data.attach_cache(self.cache)
+
+        self.anime = self.data.anime
+        self.data_version = self.data.data_version
+        self.id_by_name = self.data.id_by_name
+        self.titles_index = self.data.titles_index
+
+        # Vecinos precalculados (manage.py build_neighbors)
+        self.neighbors: Optional[NeighborIndex] = None
+        self._index_signature = "-"
+        nb_path = NeighborIndex.path_for(self.data_dir, self.min_periods)
+        if self.engine == "pearson" and nb_path.exists():
+            st = nb_path.stat()
+            index = NeighborIndex.load(nb_path)
+            if index.data_version == self.data_version:
+                self.neighbors = index
+                self._index_signature = f"{st.st_size:x}-{st.st_mtime_ns:x}"
+            else:
+                # calculado con otros datos: sus filas serían incorrectas
+                logger.warning("%s calculado con otros datos (%s != %s); se calcula bajo demanda "
+                               "(vuelve a ejecutar build_neighbors)", nb_path.name,
+                               index.data_version or "sin huella", self.data_version)
+
+    @property
+    def ratings(self) -> pd.DataFrame:
+        return self.data.ratings
+
+    @property
+    def version(self) -> str:
+        """Identifica las respuestas de esta vista: datos, min_periods, motor e índice de vecinos cargado."""
+        return f"{self.data.version}.{self.engine}.{self.min_periods}.{self._index_signature}"
+
+    # matriz y catálogo se sustituyen al aplicar valoraciones nuevas
+    @property
+    def matrix(self) -> RatingsMatrix:
+        return self.data.matrix
+
+    @property
+    def catalog(self) -> Catalog:
+        return self.data.catalog
 
     def _title_to_id_exact(self, title: str) -> Optional[int]:
         return self.id_by_name.get(str(title).strip().lower())
 
-    def best_match_id(self, query: str) -> Optional[int]:
-        q = str(query).strip().lower()
-        if not q:
-            return None
-        mask = self.anime["name_norm"].str.contains(q, na=False)
-        cand = self.anime.loc[mask, ["anime_id","members"]].sort_values("members", ascending=False)
-        if cand.empty:
+    def best_match_id(self, query: str, fuzzy: bool = True) -> Optional[int]:
+        rows, _ = self.titles_index.search(query, limit=1)
+        if len(rows) == 0 and fuzzy:
+            # títulos mal escritos: mejor candidato dentro de la tolerancia de errores
+            rows = self.titles_index.fuzzy(query, limit=1)
+        if len(rows) == 0:
             return None
-        return int(cand.iloc[0]["anime_id"])
+        return int(self.anime["anime_id"].iat[int(rows[0])])
 
     def suggest_titles(self, q: str, limit: int = 50) -> pd.DataFrame:
         qn = str(q).strip().lower()
         if not qn or len(qn) < 2:
             return pd.DataFrame(columns=["anime_id","name","members","genre","episodes"])
-        df = (
-            self.anime.loc[self.anime["name_norm"].str.contains(qn, na=False), 
-                          ["anime_id","name","members","genre","episodes"]]
-            .sort_values(["members","name"], ascending=[False, True])
-            .head(int(limit))
-            .reset_index(drop=True)
-        )
-        return df
-
-    @lru_cache(maxsize=1024)
-    def similares_por_id(self, anime_id: int, topk: int = 10) -> pd.DataFrame:
-        users = self.ratings.loc[self.ratings["anime_id"] == anime_id, "user_id"].unique()
-        if len(users) < self.min_periods:
-            return pd.DataFrame(columns=["anime_id","correlation","common","name"])
+        rows, _ = self.titles_index.search(qn, limit=int(limit))
+        return self.anime.iloc[rows][["anime_id","name","members","genre","episodes"]].reset_index(drop=True)
 
-        sub = self.ratings[self.ratings["user_id"].isin(users)].copy()
-        ui = sub.pivot_table(index="user_id", columns="anime_id", values="rating", aggfunc="mean").astype("float32")
-        if anime_id not in ui.columns:
-            return pd.DataFrame(columns=["anime_id","correlation","common","name"])
-
-        target = ui[anime_id]
-        if target.count() < self.min_periods or float(target.std(ddof=0)) == 0.0:
-            return pd.DataFrame(columns=["anime_id","correlation","common","name"])
+    def _neighbors(self, anime_id: int, topk: int) -> Neighbors:
+        hit = None
+        if self.neighbors is not None and not self.data.is_stale([anime_id])[0]:
+            hit = self.neighbors.lookup(anime_id, topk)
+        if hit is not None:
+            neighbor_lookups.inc("index")
+            return hit
+        # sin índice (o topk mayor que el precalculado, o fila desfasada por valoraciones
+        # nuevas): cálculo disperso bajo demanda, cacheado. Los animes sin min_periods
+        # valoraciones o de varianza nula se descartan sin tocar caché ni matriz.
+        if not self.matrix.eligible(anime_id, self.min_periods):
+            neighbor_lookups.inc("ineligible")
+            return _empty_neighbors()
+        key = (int(anime_id), int(topk), self.min_periods, self.data_version)
+        hit = self.cache.get(key)
+        if hit is not None:
+            neighbor_lookups.inc("cache")
+            return hit
+        neighbor_lookups.inc("computed")
+        m = self.matrix
+        with metrics.span("pearson"):
+            hit = m.pearson_neighbors(anime_id, self.min_periods, topk)
+        if m is self.matrix:   # no se cachea lo calculado con una matriz ya sustituida
+            self.cache.put(key, hit)
+        return hit
 
-        common = (~target.isna() & ~ui.isna()).sum(axis=0)
-        mask = common >= self.min_periods
-        if anime_id in mask.index:
-            mask.loc[anime_id] = False
+    def _neighbor_rows(self, anime_ids: np.ndarray, topk: int):
+        """Vecinos de varios animes concatenados: (owner, neighbor_ids, correlation)."""
+        if self.neighbors is not None:
+            owner, nbr, corr, missing = self.neighbors.gather(anime_ids, topk)
+            stale = self.data.is_stale(anime_ids)
+            if stale.any():
+                keep = ~stale[owner]
+                owner, nbr, corr, missing = owner[keep], nbr[keep], corr[keep], missing | stale
+        else:
+            owner, nbr, corr = np.empty(0, "int64"), np.empty(0, "int32"), np.empty(0, "float32")
+            missing = np.ones(len(anime_ids), dtype=bool)
 
-        cand = ui.loc[:, mask]
-        if cand.shape[1] == 0:
-            return pd.DataFrame(columns=["anime_id","correlation","common","name"])
+        parts = [(owner, nbr, corr)]
+        for j in np.flatnonzero(missing):
+            ids, c, _ = self._neighbors(int(anime_ids[j]), topk)
+            parts.append((np.full(len(ids), j, dtype="int64"), ids, c))
+        return tuple(np.concatenate([p[k] for p in parts]) for k in range(3))
 
-        stds = cand.std(axis=0, ddof=0)
-        cand = cand.loc[:, stds > 0]
-        if cand.shape[1] == 0:
-            return pd.DataFrame(columns=["anime_id","correlation","common","name"])
+    def _filtered_neighbors(self, anime_id: int, topk: int, flt: AnimeFilter) -> Neighbors:
+        """Top-k vecinos que cumplen `flt` (el filtro se aplica antes de cortar)."""
+        if self.neighbors is not None and not self.data.is_stale([anime_id])[0]:
+            hit = self.neighbors.lookup(anime_id, self.neighbors.topn)
+            ids, corr, common = hit if hit is not None else _empty_neighbors()
+            keep = np.flatnonzero(flt.allows(self.data.anime_rows(ids)))
+            # vale la fila precalculada si basta o si no estaba truncada
+            if hit is not None and (len(keep) >= topk or len(ids) < self.neighbors.topn):
+                neighbor_lookups.inc("index")
+                keep = keep[:topk]
+                return ids[keep], corr[keep], common[keep]
+        if not self.matrix.eligible(anime_id, self.min_periods):
+            return _empty_neighbors()
+        key = (int(anime_id), int(topk), self.min_periods, self.data_version, flt.key)
+        hit = self.cache.get(key)
+        if hit is not None:
+            neighbor_lookups.inc("cache")
+            return hit
+        neighbor_lookups.inc("computed")
+        m = self.matrix
+        with metrics.span("pearson"):
+            hit = m.pearson_neighbors(anime_id, self.min_periods, topk,
+                                      allowed=flt.allows(self.data.item_lookup(m)[0]))
+        if m is self.matrix:
+            self.cache.put(key, hit)
+        return hit
 
-        with np.errstate(all="ignore"):
-            sims = cand.corrwith(target, axis=0, method="pearson")
+    def similares_arrays(self, anime_id: int, topk: int = 10, flt: Optional[AnimeFilter] = None,
+                         diversity: float = 0.0) -> Tuple[np.ndarray, ...]:
+        """
+        (anime_ids, correlation, common, filas en anime) ordenados por nombre.
+        Con `flt` solo vecinos que lo cumplen; con `diversity` > 0 el top-k se elige por MMR
+        de géneros entre los mejores pool_size(topk) vecinos.
+        """
+        pool = pool_size(topk, diversity)
+        with metrics.span("neighbors"):
+            ids, corr, common = (self._neighbors(anime_id, pool) if flt is None
+                                 else self._filtered_neighbors(anime_id, pool, flt))
+        with metrics.span("rank"):
+            rows = self.data.anime_rows(ids)
+            if diversity > 0:
+                pick = np.sort(mmr(self.data.genres, rows, corr, topk, diversity))
+                ids, corr, common, rows = ids[pick], corr[pick], common[pick], rows[pick]
+            order = np.argsort(self.data.name_rank[rows], kind="stable")
+        return ids[order], corr[order], common[order], rows[order]
 
-        sims = sims.dropna()
-        if sims.empty:
+    def similares_por_id(self, anime_id: int, topk: int = 10, flt: Optional[AnimeFilter] = None,
+                         diversity: float = 0.0) -> pd.DataFrame:
+        ids, corr, common, _ = self.similares_arrays(anime_id, topk, flt=flt, diversity=diversity)
+        if len(ids) == 0:
             return pd.DataFrame(columns=["anime_id","correlation","common","name","genre","episodes"])
 
-        top = sims.sort_values(ascending=False).head(int(topk))
         out = pd.DataFrame({
-            "anime_id": top.index.astype("int32"),
-            "correlation": top.values.astype("float32"),
-            "common": common.loc[top.index].astype("int32").values
+            "anime_id": np.asarray(ids, dtype="int32"),
+            "correlation": np.asarray(corr, dtype="float32"),
+            "common": np.asarray(common, dtype="int32"),
         })
-        out = out.merge(self.anime[["anime_id","name","genre","episodes"]], on="anime_id", how="left")
-        out = out.sort_values(["name"], ascending=[True]).reset_index(drop=True)
-        return out
+        # merge por la izquierda conserva el orden (por nombre)
+        return out.merge(self.anime[["anime_id","name","genre","episodes"]], on="anime_id", how="left")
+
+    def title_to_id(self, title: str) -> Optional[int]:
+        with metrics.span("resolve_title"):
+            aid = self._title_to_id_exact(title)
+            return aid if aid is not None else self.best_match_id(title)
 
     def similares_por_titulo(self, title: str, topk: int = 10) -> pd.DataFrame:
-        aid = self._title_to_id_exact(title)
-        if aid is None:
-            aid = self.best_match_id(title)
+        aid = self.title_to_id(title)
         if aid is None:
             return pd.DataFrame(columns=["anime_id","correlation","common","name"])
         return self.similares_por_id(aid, topk=topk)
 
+    def _resolve_seen(self, seen_ids: Optional[List[int]], seen_names: Optional[List[str]]) -> np.ndarray:
+        seen_ids = list(seen_ids or [])
+        if seen_names:
+            with metrics.span("resolve_title"):
+                for n in seen_names:
+                    aid = self._title_to_id_exact(n)
+                    if aid is None:
+                        aid = self.best_match_id(n)
+                    if aid is not None:
+                        seen_ids.append(int(aid))
+        return np.unique(np.asarray(seen_ids, dtype="int64"))
+
+    @staticmethod
+    def _seen_weights(seen: np.ndarray, ratings_map: Optional[Dict[int, float]], default_rating: float) -> np.ndarray:
+        # las claves llegan como str desde JSON ({"<anime_id>": rating})
+        rmap = {int(k): float(v) for k, v in (ratings_map or {}).items()}
+        return np.array([rmap.get(int(a), float(default_rating)) for a in seen], dtype="float64")
+
+    def _score_seen(self, m: RatingsMatrix, seen: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(scores, hit) sobre m.item_ids."""
+        # S = matriz dispersa vistos×catálogo (top-200 vecinos por fila, más ancho para mezclar);
+        # score = Sᵀ·w en un único bincount
+        with metrics.span("neighbors"):
+            owner, nbr, corr = self._neighbor_rows(seen, topk=200)
+        neighbor_rows.observe(len(owner), self.engine)
+        cols, ok = _columns(m, nbr)
+        w = corr.astype("float64") * weights[owner] * ok
+        scores = np.bincount(cols, weights=w, minlength=m.n_items)
+        hit = np.bincount(cols, weights=ok, minlength=m.n_items) > 0
+        return scores, hit
+
+    def _score_batch(self, m: RatingsMatrix, seen_lists: List[np.ndarray],
+                     weight_lists: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        _score_seen para varios usuarios a la vez: (scores, hit) de forma usuarios×catálogo.
+        Los vecinos de cada anime visto se leen una sola vez para todo el lote.
+        """
+        n_users = len(seen_lists)
+        flat = np.concatenate(seen_lists) if n_users else np.empty(0, dtype="int64")
+        union = np.unique(flat)
+        with metrics.span("neighbors"):
+            owner, nbr, corr = self._neighbor_rows(union, topk=200)
+        neighbor_rows.observe(len(owner), self.engine)
+        order = np.argsort(owner, kind="stable")
+        cols, ok = _columns(m, nbr[order])
+        corr = corr[order].astype("float64") * ok
+        ptr = np.zeros(len(union) + 1, dtype="int64")
+        np.cumsum(np.bincount(owner, minlength=len(union)), out=ptr[1:])
+
+        # pares (usuario, visto) → sus filas de vecinos; clave plana usuario·n_items + columna
+        pair_user = np.repeat(np.arange(n_users), [len(s) for s in seen_lists])
+        pair_row = np.searchsorted(union, flat)
+        lens = ptr[pair_row + 1] - ptr[pair_row]
+        entries = _concat_ranges(ptr[pair_row], lens)
+        key = np.repeat(pair_user, lens) * m.n_items + cols[entries]
+        w = corr[entries] * np.repeat(np.concatenate(weight_lists) if n_users else flat, lens)
+        size = n_users * m.n_items
+        scores = np.bincount(key, weights=w, minlength=size).reshape(n_users, m.n_items)
+        hit = (np.bincount(key, weights=ok[entries], minlength=size) > 0).reshape(n_users, m.n_items)
+        return scores, hit
+
+    @staticmethod
+    def _top_items(m: RatingsMatrix, scores: np.ndarray, hit: np.ndarray, seen: np.ndarray,
+                   topk: int) -> np.ndarray:
+        """Posiciones (en m.item_ids) de los topk mejores no vistos, sin ordenar."""
+        cand = np.flatnonzero(hit & ~np.isin(m.item_ids, seen))
+        k = min(int(topk), len(cand))
+        if k < len(cand):
+            cand = cand[np.argpartition(-scores[cand], k - 1)[:k]]
+        return cand
+
+    def recomendar_por_vistos_arrays(
+        self,
+        seen_ids: Optional[List[int]] = None,
+        seen_names: Optional[List[str]] = None,
+        ratings_map: Optional[Dict[int, float]] = None,
+        default_rating: float = 10.0,
+        topk: int = 10,
+        flt: Optional[AnimeFilter] = None,
+        diversity: float = 0.0,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        (anime_ids, scores, filas en anime) ordenados por score desc y nombre.
+        Con `flt` los candidatos que no lo cumplen se descartan antes del top-k; con
+        `diversity` > 0 el orden es el de MMR de géneros sobre los pool_size(topk) mejores.
+        """
+        empty = (np.empty(0, dtype="int64"), np.empty(0, dtype="float64"), np.empty(0, dtype="int64"))
+        seen = self._resolve_seen(seen_ids, seen_names)
+        if len(seen) == 0:
+            return empty
+        weights = self._seen_weights(seen, ratings_map, default_rating)
+
+        m = self.matrix
+        with metrics.span("score"):
+            scores, hit = self._score_seen(m, seen, weights)
+        anime_rows, name_rank = self.data.item_lookup(m)
+        if flt is not None:
+            hit &= flt.allows(anime_rows)
+        candidates.observe(int(np.count_nonzero(hit)), self.engine)
+        with metrics.span("rank"):
+            cand = self._top_items(m, scores, hit, seen, pool_size(topk, diversity))
+            cand = cand[np.lexsort((name_rank[cand], -scores[cand]))]
+            if diversity > 0:
+                cand = cand[mmr(self.data.genres, anime_rows[cand], scores[cand], topk, diversity)]
+        return m.item_ids[cand].astype("int64"), scores[cand], anime_rows[cand]
+
     def recomendar_por_vistos(
         self,
         seen_ids: Optional[List[int]] = None,
@@ -114,48 +540,207 @@ class LightRecommender:
         ratings_map: Optional[Dict[int, float]] = None,
         default_rating: float = 10.0,
         topk: int = 10,
+        flt: Optional[AnimeFilter] = None,
+        diversity: float = 0.0,
     ) -> pd.DataFrame:
-
-        seen_ids = list(seen_ids or [])
-        if seen_names:
-            for n in seen_names:
-                aid = self._title_to_id_exact(n)
-                if aid is None:
-                    aid = self.best_match_id(n)
-                if aid is not None:
-                    seen_ids.append(int(aid))
-
-        seen_ids = [int(x) for x in set(seen_ids)]
-        if not seen_ids:
-            return pd.DataFrame(columns=["anime_id","name","score"])
-
-        acc: Dict[int, float] = {}
-        for aid in seen_ids:
-            df = self.similares_por_id(aid, topk=200)  # más ancho para mezclar
-            if df.empty:
-                continue
-            weight = float(ratings_map.get(aid, default_rating) if ratings_map else default_rating)
-            for row in df.itertuples():
-                if row.anime_id in seen_ids:
-                    continue
-                acc[row.anime_id] = acc.get(row.anime_id, 0.0) + (row.correlation * weight)
-
-        if not acc:
+        ids, scores, _ = self.recomendar_por_vistos_arrays(seen_ids, seen_names, ratings_map, default_rating,
+                                                           topk, flt=flt, diversity=diversity)
+        if len(ids) == 0:
             return pd.DataFrame(columns=["anime_id","name","score","genre","episodes"])
 
-        out = pd.DataFrame([(k, v) for k, v in acc.items()], columns=["anime_id","score"])
-        out = out.merge(self.anime[["anime_id","name","genre","episodes"]], on="anime_id", how="left")
-        out = out.sort_values(by=["name","score"], ascending=[True, False]).head(int(topk)).reset_index(drop=True)
+        out = pd.DataFrame({"anime_id": ids.astype("int32"), "score": scores})
+        return out.merge(self.anime[["anime_id","name","genre","episodes"]], on="anime_id", how="left")
+
+    def recomendar_lote(self, requests: List[dict],
+                        topk: int = 10) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Recomendaciones para varios usuarios en una pasada. Cada petición admite las claves
+        de /recommend_by_seen (seen_ids, seen_names, ratings, rating, topk).
+        Devuelve por usuario (anime_ids, scores, filas en anime) ordenados por score desc y nombre.
+        """
+        seen_lists = [self._resolve_seen(r.get("seen_ids"), r.get("seen_names")) for r in requests]
+        weight_lists = [self._seen_weights(s, r.get("ratings"), float(r.get("rating", 10.0)))
+                        for s, r in zip(seen_lists, requests)]
+        m = self.matrix
+        with metrics.span("score"):
+            scores, hit = self._score_batch(m, seen_lists, weight_lists)
+        for n in np.count_nonzero(hit, axis=1).tolist():
+            candidates.observe(n, self.engine)
+
+        anime_rows, name_rank = self.data.item_lookup(m)
+        out = []
+        with metrics.span("rank"):
+            for i, (r, seen) in enumerate(zip(requests, seen_lists)):
+                cand = self._top_items(m, scores[i], hit[i], seen, int(r.get("topk", topk))) if len(seen) else seen
+                cand = cand[np.lexsort((name_rank[cand], -scores[i][cand]))]
+                out.append((m.item_ids[cand].astype("int64"), scores[i][cand], anime_rows[cand]))
         return out
 
+class FactorRecommender(LightRecommender):
+    """
+    Motor alternativo: similitud coseno entre vectores latentes de una SVD truncada
+    (manage.py train_factors). Cubre también los títulos con menos de min_periods
+    valoraciones y puntúa con productos densos en vez de listas de vecinos.
+    """
+
+    engine = "svd"
+
+    def __init__(self, data_dir: Path, min_periods: int = 3, cache: Optional[ResultCache] = None,
+                 data: Optional[RecommenderData] = None, model: Optional[FactorModel] = None):
+        super().__init__(data_dir, min_periods=min_periods, cache=cache, data=data)
+        if model is None:
+            path = FactorModel.path_for(self.data_dir)
+            if not path.exists():
+                raise FileNotFoundError("Modelo de factores no disponible: ejecuta 'python manage.py train_factors'.")
+            model = FactorModel.load(path)
+        if model.data_version and model.data_version != self.data_version:
+            logger.warning("factors.npz entrenado con otros datos (%s != %s)", model.data_version, self.data_version)
+        self.model = model
+
+        # índice aproximado opcional (manage.py build_ann); ANN_NPROBE ajusta recall/latencia
+        ann_path = IVFIndex.path_for(self.data_dir)
+        if model.ann is None and ann_path.exists():
+            nprobe = os.environ.get("ANN_NPROBE")
+            ann = IVFIndex.load(ann_path, nprobe=int(nprobe) if nprobe else None)
+            if ann.source == model.fingerprint:
+                model.ann = ann
+            else:
+                logger.warning("ann_ivf.npz no corresponde a factors.npz; se usa búsqueda exacta")
+
+        self._model_map = (None, None, None)
+
+    @property
+    def version(self) -> str:
+        return f"{super().version}.{self.model.fingerprint}"
+
+    def _model_columns(self, m: RatingsMatrix) -> Tuple[np.ndarray, np.ndarray]:
+        """(columnas en m, encontrados) de los items del modelo; se recalcula si cambia la matriz."""
+        cached = self._model_map
+        if cached[0] is not m:
+            cols, found = _columns(m, self.model.item_ids)
+            cached = self._model_map = (m, cols[found], found)
+        return cached[1], cached[2]
+
+    def _neighbors(self, anime_id: int, topk: int) -> Neighbors:
+        neighbor_lookups.inc("factors")
+        return self.model.similar(anime_id, topk)
+
+    def _filtered_neighbors(self, anime_id: int, topk: int, flt: AnimeFilter) -> Neighbors:
+        neighbor_lookups.inc("factors")
+        return self.model.similar(anime_id, topk, allowed=flt.allows(self.data.anime_rows(self.model.item_ids)))
+
+    def _score_seen(self, m: RatingsMatrix, seen: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        s, h = self.model.score(seen, weights)
+        cols, found = self._model_columns(m)
+        scores = np.zeros(m.n_items, dtype="float64")
+        hit = np.zeros(m.n_items, dtype=bool)
+        scores[cols] = s[found]
+        hit[cols] = h[found]
+        return scores, hit
+
+    def _score_batch(self, m: RatingsMatrix, seen_lists: List[np.ndarray],
+                     weight_lists: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        # un perfil por usuario (Σ w·v) y un único producto denso usuarios×items
+        model, n_users = self.model, len(seen_lists)
+        flat = np.concatenate(seen_lists) if n_users else np.empty(0, dtype="int64")
+        pair_user = np.repeat(np.arange(n_users), [len(s) for s in seen_lists])
+        pos, found = model.positions(flat)
+        w = np.concatenate(weight_lists)[found] if n_users else np.empty(0)
+        profiles = np.zeros((n_users, model.unit.shape[1]), dtype="float32")
+        np.add.at(profiles, pair_user[found], model.unit[pos[found]] * w[:, None].astype("float32"))
+        s = (profiles @ model.unit.T).astype("float64")
+
+        cols, in_m = self._model_columns(m)
+        scores = np.zeros((n_users, m.n_items), dtype="float64")
+        hit = np.zeros((n_users, m.n_items), dtype=bool)
+        scores[:, cols] = s[:, in_m]
+        any_found = np.bincount(pair_user[found], minlength=n_users) > 0
+        hit[np.ix_(any_found, cols)] = model.valid[in_m]
+        return scores, hit
+
+
+ENGINES = {"pearson": LightRecommender, "svd": FactorRecommender}
+
+
+class RecommenderRegistry:
+    """
+    Un RecommenderData por directorio y una vista por (min_periods, motor),
+    creados perezosamente bajo lock. Cambiar de minp no relee los CSV ni sustituye
+    la instancia que otras peticiones están usando.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[Path, RecommenderData] = {}
+        self._views: Dict[Tuple[Path, int, str], LightRecommender] = {}
+
+    def get(self, base_dir: Path, min_periods: int = 3, engine: str = "pearson") -> LightRecommender:
+        if engine not in ENGINES:
+            raise ValueError(f"Motor desconocido '{engine}'. Opciones: {', '.join(ENGINES)}")
+        key = (Path(base_dir).resolve(), int(min_periods), engine)
+        rec = self._views.get(key)
+        if rec is not None:
+            rec.data.refresh()   # valoraciones nuevas: un stat() por petición; se aplican en otro hilo
+            return rec
+        with self._lock:
+            rec = self._views.get(key)
+            if rec is None:
+                data = self._data.get(key[0])
+                if data is None:
+                    data = self._data[key[0]] = RecommenderData(key[0])
+                rec = self._views[key] = ENGINES[engine](key[0], min_periods=key[1], data=data)
+            return rec
+
+    def adopt(self, data: RecommenderData) -> None:
+        """Usa unos datos ya cargados para su directorio (p. ej. benchmark), en vez de releerlos."""
+        with self._lock:
+            self._data.setdefault(data.data_dir.resolve(), data)
+
+    def loaded(self) -> List[Tuple[Path, int, str]]:
+        return list(self._views)
+
+    def version(self, base_dir: Path, min_periods: int = 3, engine: str = "pearson") -> Optional[str]:
+        """
+        Versión de la vista ya cargada, sin cargar ni calcular nada; None si no está cargada
+        o si hay valoraciones nuevas pendientes de aplicar (la versión va a cambiar).
+        """
+        rec = self._views.get((Path(base_dir).resolve(), int(min_periods), engine))
+        if rec is None or rec.data.has_pending():
+            return None
+        return rec.version
+
+    def ingest(self, base_dir: Path, ratings: pd.DataFrame) -> np.ndarray:
+        """
+        Añade valoraciones a ratings_delta.csv y las aplica ya en este proceso
+        (los demás las recogen en su siguiente petición). Devuelve los anime_ids afectados.
+        """
+        base_dir = Path(base_dir).resolve()
+        append_deltas(base_dir, ratings)
+        data = self._data.get(base_dir)
+        return data.refresh(wait=True) if data is not None else np.empty(0, dtype="int64")
+
+
+_registry = RecommenderRegistry()
+
+
+def _data_gauge(value):
+    def fn():
+        return [({"data_dir": d.data_dir.name}, value(d)) for d in list(_registry._data.values())]
+    return fn
+
+
+for _name, _help, _value in [
+    ("ratings", "Valoraciones cargadas", lambda d: len(d.matrix.data)),
+    ("matrix_users", "Usuarios en la matriz de valoraciones", lambda d: d.matrix.n_users),
+    ("matrix_items", "Animes en la matriz de valoraciones", lambda d: d.matrix.n_items),
+    ("stale_items", "Animes con vecinos precalculados desfasados por valoraciones nuevas", lambda d: len(d.stale_ids)),
+]:
+    metrics.collect(f"recomendar_{_name}", _help)(_data_gauge(_value))
+
+
+def get_registry() -> RecommenderRegistry:
+    return _registry
 
-_recommender: Optional[LightRecommender] = None
 
-def get_recommender(base_dir: Path, min_periods: int = 3) -> LightRecommender:
-    global _recommender
-    if _recommender is None:
-        _recommender = LightRecommender(base_dir, min_periods=min_periods)
-    else:
-        if _recommender.min_periods != int(min_periods):
-            _recommender = LightRecommender(base_dir, min_periods=min_periods)
-    return _recommender
+def get_recommender(base_dir: Path, min_periods: int = 3, engine: str = "pearson") -> LightRecommender:
+    return _registry.get(base_dir, min_periods, engine)
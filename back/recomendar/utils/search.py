@@ -0,0 +1,115 @@
+from __future__ import annotations
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from .text import fold
+
+NGRAM = 3
+# la distancia es O(len(q)·len(título)) en Python: consultas más largas no se corrigen
+FUZZY_MAX_LEN = 64
+FUZZY_MAX_DIST = 6
+
+
+def _grams(s: str, n: int) -> set:
+    return {s[i:i + n] for i in range(len(s) - n + 1)}
+
+
+def _substring_distance(q: str, s: str, limit: int) -> int:
+    """Distancia de edición de q contra el mejor substring de s (Sellers); corta al superar limit."""
+    prev = [0] * (len(s) + 1)
+    for i, qc in enumerate(q, 1):
+        cur = [i] + [0] * len(s)
+        for j, sc in enumerate(s, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (qc != sc))
+        if min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return min(prev)
+
+
+class TitleIndex:
+    """
+    Índice en memoria de títulos para autocompletado.
+
+    Las filas se ordenan una sola vez por popularidad (members desc, name asc) y cada
+    n-grama (1..3 caracteres) apunta a una lista ordenada de esos rangos, así que
+    cualquier resultado sale ya ordenado y el top-`limit` no necesita recorrer el frame.
+    Las posiciones devueltas son filas (iloc) del DataFrame de origen.
+    """
+
+    def __init__(self, names: Sequence[str], members: Sequence[int]):
+        names = [str(n) for n in names]
+        members = np.asarray(members, dtype="int64")
+        order = sorted(range(len(names)), key=lambda i: (-int(members[i]), names[i]))
+        self.positions = np.asarray(order, dtype="int64")     # rango -> fila
+        self.folded: List[str] = [fold(names[i]) for i in order]
+
+        postings: Dict[str, list] = defaultdict(list)
+        for rank, s in enumerate(self.folded):
+            for n in range(1, NGRAM + 1):
+                for g in _grams(s, n):
+                    postings[g].append(rank)
+        # los rangos se insertan en orden creciente: cada lista ya está ordenada
+        self.postings: Dict[str, np.ndarray] = {g: np.asarray(r, dtype="int32") for g, r in postings.items()}
+
+    def _candidate_ranks(self, q: str) -> Optional[np.ndarray]:
+        n = min(len(q), NGRAM)
+        lists = []
+        for g in _grams(q, n):
+            p = self.postings.get(g)
+            if p is None:
+                return None
+            lists.append(p)
+        lists.sort(key=len)
+        ranks = lists[0]
+        for p in lists[1:]:
+            ranks = np.intersect1d(ranks, p, assume_unique=True)
+            if len(ranks) == 0:
+                return None
+        return ranks
+
+    def search(self, query: str, limit: Optional[int] = None) -> Tuple[np.ndarray, int]:
+        """Filas cuyo título contiene `query`, por popularidad; devuelve (filas[:limit], total)."""
+        q = fold(query)
+        if not q:
+            return np.empty(0, dtype="int64"), 0
+        ranks = self._candidate_ranks(q)
+        if ranks is None:
+            return np.empty(0, dtype="int64"), 0
+        if len(q) > NGRAM:
+            # los n-gramas solo filtran: se confirma el substring real
+            ranks = np.asarray([r for r in ranks if q in self.folded[r]], dtype="int32")
+        total = int(len(ranks))
+        if limit is not None:
+            ranks = ranks[:int(limit)]
+        return self.positions[ranks], total
+
+    def fuzzy(self, query: str, limit: int = 1, max_dist: Optional[int] = None,
+              candidates: int = 64) -> np.ndarray:
+        """
+        Filas cuyo título contiene `query` con hasta `max_dist` errores de edición
+        (por defecto len/4, como mucho FUZZY_MAX_DIST). Los candidatos salen de los trigramas
+        compartidos. Las consultas de más de FUZZY_MAX_LEN caracteres no se corrigen.
+        """
+        q = fold(query)
+        if len(q) < NGRAM or len(q) > FUZZY_MAX_LEN:
+            return np.empty(0, dtype="int64")
+        if max_dist is None:
+            max_dist = max(1, len(q) // 4)
+        max_dist = min(int(max_dist), FUZZY_MAX_DIST)
+
+        lists = [self.postings[g] for g in _grams(q, NGRAM) if g in self.postings]
+        if not lists:
+            return np.empty(0, dtype="int64")
+        shared = np.bincount(np.concatenate(lists), minlength=len(self.folded))
+        cand = np.flatnonzero(shared)
+        if len(cand) > candidates:
+            cand = cand[np.argpartition(-shared[cand], candidates - 1)[:candidates]]
+
+        scored = []
+        for r in cand:
+            d = _substring_distance(q, self.folded[r], max_dist)
+            if d <= max_dist:
+                scored.append((d, int(r)))
+        scored.sort()
+        return self.positions[np.asarray([r for _, r in scored[:int(limit)]], dtype="int64")]
@@ -0,0 +1,54 @@
+"""
+Serialización JSON directa desde arrays: las respuestas se escriben como bytes a partir de
+ids/scores/filas y de fragmentos por anime (name, genre, episodes) codificados una sola vez
+al cargar, sin construir un dict por fila ni pasar por to_dict + JSONRenderer.
+La salida es idéntica a la de DRF (UTF-8 sin escapar, separadores compactos).
+"""
+from __future__ import annotations
+import json
+import math
+from typing import Any, List, Sequence
+import numpy as np
+import pandas as pd
+
+
+def dumps(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+
+def _float(v: float) -> bytes:
+    # mismo texto que json (float.__repr__)
+    return repr(v).encode() if math.isfinite(v) else b"null"
+
+
+class AnimeFragments:
+    """
+    Fragmentos por fila de `anime`: `"name":...` y `"genre":...,"episodes":...}`.
+    La fila -1 (anime sin ficha en anime.csv) se codifica con nulls.
+    """
+
+    def __init__(self, anime: pd.DataFrame):
+        names = anime["name"].tolist()
+        genres = anime["genre"].tolist()
+        episodes = anime["episodes"].tolist()
+        self.name: List[bytes] = [b'"name":' + dumps(n) for n in names] + [b'"name":null']
+        self.tail: List[bytes] = [b'"genre":' + dumps(g) + b',"episodes":%d}' % e
+                                  for g, e in zip(genres, episodes)] + [b'"genre":null,"episodes":null}']
+
+    def scored(self, ids: np.ndarray, values: np.ndarray, rows: np.ndarray, field: bytes = b"score") -> bytes:
+        """[{anime_id, name, <field>, genre, episodes}] en el orden dado."""
+        name, tail = self.name, self.tail
+        prefix = b',"' + field + b'":'
+        return b"[" + b",".join(
+            b'{"anime_id":%d,' % a + name[r] + prefix + _float(v) + b"," + tail[r]
+            for a, v, r in zip(ids.tolist(), values.tolist(), rows.tolist())
+        ) + b"]"
+
+    def catalog(self, rows: np.ndarray, ids: Sequence[int], members: Sequence[int],
+                counts: Sequence[int]) -> bytes:
+        """[{anime_id, name, members, rating_count, genre, episodes}] (forma de /titles)."""
+        name, tail = self.name, self.tail
+        return b"[" + b",".join(
+            b'{"anime_id":%d,' % a + name[r] + b',"members":%d,"rating_count":%d,' % (m, c) + tail[r]
+            for r, a, m, c in zip(rows.tolist(), ids, members, counts)
+        ) + b"]"
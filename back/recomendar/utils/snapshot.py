@@ -0,0 +1,135 @@
+"""
+Snapshot binario de anime + ratings: un directorio de .npy columnares que se abren
+con mmap (np.load(mmap_mode="r") → np.memmap), de forma que todos los workers
+comparten la misma copia en page cache y el arranque no parsea CSV.
+
+    snapshot/
+      meta.json                    versión, tamaños y firma de los CSV de origen
+      ratings.indptr.npy           int64  offsets por usuario (CSR)
+      ratings.user_ids.npy         int32
+      ratings.indices.npy          int32  columna = posición en item_ids
+      ratings.data.npy             float32
+      ratings.item_ids.npy         int32
+      ratings.item_indptr.npy      int64  offsets por anime (CSC)
+      ratings.item_users.npy       int32
+      ratings.item_data.npy        float32
+      ratings.item_mean.npy        float64
+      ratings.item_std.npy         float64 (opcional: los snapshots anteriores la calculan al cargar)
+      anime.<col>.npy              anime_id/members/episodes
+      anime.<col>.bin + .off.npy   name/genre como UTF-8 concatenado + offsets
+"""
+
+from __future__ import annotations
+import json
+import logging
+import shutil
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from .neighbors import RatingsMatrix
+
+logger = logging.getLogger("recomendar")
+
+SNAPSHOT_DIR = "snapshot"
+SNAPSHOT_VERSION = 1
+SOURCES = ("anime.csv", "ratings_clean_1.csv")
+
+_MATRIX_ARRAYS = ("user_ids", "item_ids", "indptr", "indices", "data",
+                  "item_indptr", "item_users", "item_data", "item_mean")
+_MATRIX_OPTIONAL = ("item_std",)
+_ANIME_NUMERIC = ("anime_id", "members", "episodes")
+_ANIME_TEXT = ("name", "genre")
+
+
+def source_signature(data_dir: Path) -> Dict[str, list]:
+    sig = {}
+    for name in SOURCES:
+        p = Path(data_dir) / name
+        if p.exists():
+            st = p.stat()
+            sig[name] = [int(st.st_size), int(st.st_mtime)]
+    return sig
+
+
+def write_snapshot(data_dir: Path, anime: pd.DataFrame, matrix: RatingsMatrix) -> Path:
+    """
+    Escribe <data_dir>/snapshot en un directorio temporal hermano y lo cambia por el anterior
+    con rename: los workers que tienen mapeados los .npy anteriores siguen leyéndolos (los
+    ficheros sustituidos no se truncan) y los que cargan después ven el snapshot completo.
+    """
+    final = Path(data_dir) / SNAPSHOT_DIR
+    out = final.with_name(f".{SNAPSHOT_DIR}.tmp")
+    shutil.rmtree(out, ignore_errors=True)
+    out.mkdir(parents=True)
+
+    for name in _MATRIX_ARRAYS + _MATRIX_OPTIONAL:
+        np.save(out / f"ratings.{name}.npy", np.ascontiguousarray(getattr(matrix, name)))
+
+    for col in _ANIME_NUMERIC:
+        np.save(out / f"anime.{col}.npy", anime[col].to_numpy())
+    for col in _ANIME_TEXT:
+        encoded = [str(v).encode("utf-8") for v in anime[col]]
+        off = np.zeros(len(encoded) + 1, dtype="int64")
+        np.cumsum([len(b) for b in encoded], out=off[1:])
+        (out / f"anime.{col}.bin").write_bytes(b"".join(encoded))
+        np.save(out / f"anime.{col}.off.npy", off)
+
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "n_users": matrix.n_users,
+        "n_items": matrix.n_items,
+        "nnz": int(len(matrix.data)),
+        "n_anime": int(len(anime)),
+        "sources": source_signature(data_dir),
+    }
+    (out / "meta.json").write_text(json.dumps(meta, indent=2))
+
+    # entre los dos rename no hay snapshot: quien cargue justo entonces lee los CSV
+    old = final.with_name(f".{SNAPSHOT_DIR}.old")
+    shutil.rmtree(old, ignore_errors=True)
+    if final.exists():
+        final.rename(old)
+    out.rename(final)
+    shutil.rmtree(old, ignore_errors=True)
+    return final
+
+
+def snapshot_meta(data_dir: Path) -> Optional[dict]:
+    """meta.json si hay un snapshot utilizable en data_dir; None si falta o está obsoleto."""
+    path = Path(data_dir) / SNAPSHOT_DIR / "meta.json"
+    if not path.exists():
+        return None
+    meta = json.loads(path.read_text())
+    if meta.get("version") != SNAPSHOT_VERSION:
+        logger.warning("Snapshot %s con versión %s ignorado", path.parent, meta.get("version"))
+        return None
+    # si los CSV están presentes y han cambiado, el snapshot no los refleja
+    current = source_signature(data_dir)
+    for name, sig in current.items():
+        if name in meta.get("sources", {}) and meta["sources"][name] != sig:
+            logger.warning("Snapshot %s obsoleto respecto a %s; se usará el CSV", path.parent, name)
+            return None
+    return meta
+
+
+def load_snapshot(data_dir: Path) -> Tuple[pd.DataFrame, RatingsMatrix]:
+    snap = Path(data_dir) / SNAPSHOT_DIR
+    arrays = {name: np.load(snap / f"ratings.{name}.npy", mmap_mode="r") for name in _MATRIX_ARRAYS}
+    for name in _MATRIX_OPTIONAL:
+        path = snap / f"ratings.{name}.npy"
+        arrays[name] = np.load(path, mmap_mode="r") if path.exists() else None
+    matrix = RatingsMatrix(
+        arrays["user_ids"], arrays["item_ids"], arrays["indptr"], arrays["indices"], arrays["data"],
+        csc=(arrays["item_indptr"], arrays["item_users"], arrays["item_data"]),
+        item_mean=arrays["item_mean"], item_std=arrays["item_std"],
+    )
+
+    # la tabla de anime es pequeña: se materializa como DataFrame normal
+    cols = {col: np.load(snap / f"anime.{col}.npy") for col in _ANIME_NUMERIC}
+    for col in _ANIME_TEXT:
+        blob = (snap / f"anime.{col}.bin").read_bytes()
+        off = np.load(snap / f"anime.{col}.off.npy")
+        cols[col] = [blob[off[i]:off[i + 1]].decode("utf-8") for i in range(len(off) - 1)]
+    anime = pd.DataFrame(cols)[["anime_id", "name", "members", "genre", "episodes"]]
+    return anime, matrix
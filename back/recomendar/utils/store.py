@@ -0,0 +1,241 @@
+"""
+Almacén de solo lectura para el modo serve (settings_serve.py): un fichero SQLite exportado
+con `manage.py export_store` que contiene el catálogo y las listas de vecinos ya calculadas,
+de modo que los workers responden sin cargar numpy, pandas ni la matriz de valoraciones.
+Este módulo solo usa la biblioteca estándar.
+
+    meta(key, value)        formato, versión de los datos, minp, motor, topn, n_anime, has_counts
+    anime(row, ...)         una fila por fila de anime.csv: anime_id, name, genre, episodes,
+                            members, rating_count, name_norm, folded, name_rank, pop_rank
+    neighbors(anime_id, ...) top-`topn` vecinos por anime: ids (int32), corr (float32) y
+                            filas de `anime` (int32, -1 = sin ficha), en orden de correlación
+"""
+from __future__ import annotations
+import json
+import math
+import sqlite3
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+from .text import fold
+
+STORE_FILE = "serve.sqlite3"
+STORE_FORMAT = 1
+
+# (anime_id, score, fila en anime)
+Scored = Tuple[int, float, int]
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE anime (
+    row INTEGER PRIMARY KEY, anime_id INTEGER NOT NULL, name TEXT NOT NULL, genre TEXT NOT NULL,
+    episodes INTEGER NOT NULL, members INTEGER NOT NULL, rating_count INTEGER NOT NULL,
+    name_norm TEXT NOT NULL, folded TEXT NOT NULL, name_rank INTEGER NOT NULL, pop_rank INTEGER NOT NULL);
+CREATE TABLE neighbors (anime_id INTEGER PRIMARY KEY, ids BLOB NOT NULL, corr BLOB NOT NULL, rows BLOB NOT NULL);
+"""
+_INDEXES = """
+CREATE INDEX anime_name_norm ON anime(name_norm);
+CREATE INDEX anime_name_rank ON anime(name_rank, rating_count);
+CREATE INDEX anime_pop_rank ON anime(pop_rank);
+"""
+
+
+def write_store(path: Path, meta: Mapping, anime: Iterable[tuple],
+                neighbors: Iterable[Tuple[int, bytes, bytes, bytes]]) -> Path:
+    """Escribe el almacén en un fichero temporal y lo renombra: los workers nunca ven uno a medias."""
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+    conn = sqlite3.connect(str(tmp))
+    try:
+        with conn:
+            conn.executescript(_SCHEMA)
+            conn.executemany("INSERT INTO meta VALUES (?, ?)", [(k, json.dumps(v)) for k, v in meta.items()])
+            conn.executemany("INSERT INTO anime VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", anime)
+            conn.executemany("INSERT INTO neighbors VALUES (?, ?, ?, ?)", neighbors)
+            conn.executescript(_INDEXES)
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+    tmp.replace(path)
+    return path
+
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+
+def _float(v: float) -> bytes:
+    return repr(v).encode() if math.isfinite(v) else b"null"
+
+
+class ServeStore:
+    """
+    Lecturas sobre el almacén exportado, con la misma semántica (y los mismos bytes JSON)
+    que LightRecommender/Catalog para las consultas sin filtros. Una conexión de solo lectura
+    por hilo; el fichero se abre como inmutable, así que no hay bloqueos entre workers.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        if not self.path.exists():
+            raise FileNotFoundError(f"No existe el almacén {self.path} (manage.py export_store).")
+        self._local = threading.local()
+        conn = self._conn()
+        self.meta: Dict = {k: json.loads(v) for k, v in conn.execute("SELECT key, value FROM meta")}
+        if self.meta.get("format") != STORE_FORMAT:
+            raise ValueError(f"Almacén {self.path} con formato {self.meta.get('format')}; vuelve a exportarlo.")
+        self.version: str = self.meta["version"]
+        self.min_periods: int = self.meta["minp"]
+        self.engine: str = self.meta["engine"]
+        self.topn: int = self.meta["topn"]
+        # rango alfabético por fila (la fila -1, sin ficha, va al final): desempata los scores
+        self.name_rank = array("q", [0] * (self.meta["n_anime"] + 1))
+        for row, rank in conn.execute("SELECT row, name_rank FROM anime"):
+            self.name_rank[row] = rank
+        self.name_rank[-1] = self.meta["n_anime"]
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"{self.path.resolve().as_uri()}?mode=ro&immutable=1", uri=True,
+                                   check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    # --- títulos ---
+
+    def title_to_id(self, title: str) -> Optional[int]:
+        """Nombre exacto (el último con ese nombre, como el dict del recomendador) o mejor substring."""
+        conn = self._conn()
+        row = conn.execute("SELECT anime_id FROM anime WHERE name_norm = ? ORDER BY row DESC LIMIT 1",
+                           (str(title).strip().lower(),)).fetchone()
+        if row is None:
+            q = fold(title)
+            if q:
+                row = conn.execute("SELECT anime_id FROM anime WHERE instr(folded, ?) > 0 "
+                                   "ORDER BY pop_rank LIMIT 1", (q,)).fetchone()
+        return int(row[0]) if row else None
+
+    def _min_r(self, min_r: int) -> int:
+        # sin valoraciones al exportar, min_r no filtra (como Catalog)
+        return int(min_r) if min_r > 0 and self.meta["has_counts"] else 0
+
+    def search(self, query: str, min_r: int = 0) -> List[int]:
+        """Filas cuyo título contiene `query`, por popularidad, con rating_count >= min_r."""
+        q = fold(query)
+        if not q:
+            return []
+        cur = self._conn().execute("SELECT row FROM anime WHERE instr(folded, ?) > 0 AND rating_count >= ? "
+                                   "ORDER BY pop_rank", (q, self._min_r(min_r)))
+        return [r for (r,) in cur]
+
+    def page(self, offset: int = 0, limit: int = 50, min_r: int = 0) -> Tuple[List[int], int]:
+        """Filas del listado alfabético [offset, offset+limit) y total."""
+        conn = self._conn()
+        min_r = self._min_r(min_r)
+        rows = [r for (r,) in conn.execute("SELECT row FROM anime WHERE rating_count >= ? ORDER BY name_rank "
+                                           "LIMIT ? OFFSET ?", (min_r, int(limit), int(offset)))]
+        total = conn.execute("SELECT COUNT(*) FROM anime WHERE rating_count >= ?", (min_r,)).fetchone()[0]
+        return rows, int(total)
+
+    def _fields(self, rows: Sequence[int], columns: str) -> Dict[int, tuple]:
+        wanted = sorted({r for r in rows if r >= 0})
+        out: Dict[int, tuple] = {}
+        conn = self._conn()
+        for i in range(0, len(wanted), 500):
+            chunk = wanted[i:i + 500]
+            sql = f"SELECT row, {columns} FROM anime WHERE row IN ({','.join('?' * len(chunk))})"
+            out.update((r[0], r[1:]) for r in conn.execute(sql, chunk))
+        return out
+
+    def catalog_json(self, rows: Sequence[int]) -> bytes:
+        """[{anime_id, name, members, rating_count, genre, episodes}] (forma de /titles)."""
+        f = self._fields(rows, "anime_id, name, members, rating_count, genre, episodes")
+        return b"[" + b",".join(
+            b'{"anime_id":%d,"name":' % f[r][0] + _dumps(f[r][1]) + b',"members":%d,"rating_count":%d,' % f[r][2:4]
+            + b'"genre":' + _dumps(f[r][4]) + b',"episodes":%d}' % f[r][5]
+            for r in rows
+        ) + b"]"
+
+    def items(self, scored: Sequence[Scored], field: str = "score") -> List[dict]:
+        """Resultados como dicts {anime_id, name, <field>, genre, episodes}."""
+        f = self._fields([r for _, _, r in scored], "name, genre, episodes")
+        none = (None, None, None)
+        return [{"anime_id": a, "name": f.get(r, none)[0], field: v, "genre": f.get(r, none)[1],
+                 "episodes": f.get(r, none)[2]} for a, v, r in scored]
+
+    def scored_json(self, scored: Sequence[Scored], field: bytes = b"score") -> bytes:
+        """Mismos bytes que AnimeFragments.scored."""
+        f = self._fields([r for _, _, r in scored], "name, genre, episodes")
+        prefix = b',"' + field + b'":'
+        out = []
+        for a, v, r in scored:
+            if r in f:
+                name, tail = b'"name":' + _dumps(f[r][0]), b'"genre":' + _dumps(f[r][1]) + b',"episodes":%d}' % f[r][2]
+            else:
+                name, tail = b'"name":null', b'"genre":null,"episodes":null}'
+            out.append(b'{"anime_id":%d,' % a + name + prefix + _float(v) + b"," + tail)
+        return b"[" + b",".join(out) + b"]"
+
+    # --- vecinos ---
+
+    def neighbors(self, anime_id: int) -> Tuple[array, array, array]:
+        """(ids, corr, filas) precalculados; vacíos si el anime no tenía vecinos elegibles."""
+        row = self._conn().execute("SELECT ids, corr, rows FROM neighbors WHERE anime_id = ?",
+                                   (int(anime_id),)).fetchone()
+        ids, corr, rows = array("i"), array("f"), array("i")
+        if row is not None:
+            ids.frombytes(row[0])
+            corr.frombytes(row[1])
+            rows.frombytes(row[2])
+        return ids, corr, rows
+
+    def similar(self, anime_id: int, topk: int = 10) -> List[Scored]:
+        """Top-k vecinos ordenados por nombre (como similares_arrays sin filtros)."""
+        ids, corr, rows = self.neighbors(anime_id)
+        if topk > self.topn and len(ids) >= self.topn:
+            raise ValueError(f"topk máximo en este almacén: {self.topn}.")
+        top = list(zip(ids[:topk], corr[:topk], rows[:topk]))
+        return sorted(top, key=lambda t: self.name_rank[t[2]])
+
+    def recommend(self, seen_ids: Optional[List[int]] = None, seen_names: Optional[List[str]] = None,
+                  ratings_map: Optional[Mapping] = None, default_rating: float = 10.0,
+                  topk: int = 10) -> List[Scored]:
+        """
+        Recomendaciones por vistos: suma de correlación·valoración sobre los vecinos de cada
+        visto (como LightRecommender._score_seen), ordenadas por score desc y nombre.
+        """
+        seen = set(int(a) for a in seen_ids or [])
+        for n in seen_names or []:
+            aid = self.title_to_id(n)
+            if aid is not None:
+                seen.add(aid)
+        rmap = {int(k): float(v) for k, v in (ratings_map or {}).items()}
+        scores: Dict[int, float] = {}
+        cand_rows: Dict[int, int] = {}
+        for s in sorted(seen):
+            w = rmap.get(s, float(default_rating))
+            ids, corr, rows = self.neighbors(s)
+            for a, c, r in zip(ids, corr, rows):
+                scores[a] = scores.get(a, 0.0) + c * w
+                cand_rows[a] = r
+        ranked = sorted((a for a in scores if a not in seen),
+                        key=lambda a: (-scores[a], self.name_rank[cand_rows[a]]))
+        return [(a, scores[a], cand_rows[a]) for a in ranked[:int(topk)]]
+
+
+_stores: Dict[Path, ServeStore] = {}
+_lock = threading.Lock()
+
+
+def get_store(path: Path) -> ServeStore:
+    path = Path(path)
+    store = _stores.get(path)
+    if store is None:
+        with _lock:
+            store = _stores.get(path)
+            if store is None:
+                store = _stores[path] = ServeStore(path)
+    return store
@@ -0,0 +1,64 @@
+"""
+Datos sintéticos con la forma de anime.csv / ratings_clean_1.csv para benchmarks y
+pruebas de carga: popularidad de los animes en ley de potencia (Zipf), número de
+valoraciones por usuario log-normal y ~10% de '-1' (visto sin nota), como en el dataset real.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Dict
+import numpy as np
+import pandas as pd
+
+GENRES = ["Action", "Adventure", "Comedy", "Drama", "Fantasy", "Horror", "Mecha", "Mystery",
+          "Romance", "School", "Sci-Fi", "Seinen", "Shounen", "Slice of Life", "Sports", "Supernatural"]
+_WORDS = ["Kimi", "Sora", "Hoshi", "Yume", "Shingeki", "Kaze", "Tsuki", "Hikari", "Kokoro", "Sekai",
+          "Senki", "Monogatari", "Densetsu", "Gakuen", "Mahou", "Shoujo", "Kage", "Tenshi", "Ryuu", "Neko"]
+_TYPES = ["TV", "Movie", "OVA", "Special", "ONA"]
+
+
+def generate(out_dir: Path, users: int = 20000, items: int = 3000, ratings_per_user: float = 40,
+             alpha: float = 1.1, seed: int = 0) -> Dict[str, int]:
+    """Escribe anime.csv y ratings_clean_1.csv en out_dir; devuelve los tamaños generados."""
+    rng = np.random.default_rng(seed)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # popularidad: el anime de rango r tiene probabilidad ∝ 1 / (r+1)^alpha
+    pop = 1.0 / np.arange(1, items + 1) ** alpha
+    pop /= pop.sum()
+    anime_ids = np.sort(rng.choice(np.arange(1, items * 4), size=items, replace=False)).astype("int32")
+    by_rank = rng.permutation(items)          # fila de anime_ids para cada rango de popularidad
+    quality = rng.normal(7.0, 1.0, items)      # nota media "real" de cada anime
+
+    # usuarios: nº de valoraciones log-normal (media ≈ ratings_per_user), animes por popularidad
+    counts = np.clip(rng.lognormal(np.log(ratings_per_user) - 0.5, 1.0, users).astype("int64"), 1, items)
+    user_col = np.repeat(np.arange(1, users + 1, dtype="int32"), counts)
+    ranks = rng.choice(items, size=int(counts.sum()), p=pop)
+    rows = by_rank[ranks]
+    pairs = pd.DataFrame({"user_id": user_col, "row": rows}).drop_duplicates()
+    rows = pairs["row"].to_numpy()
+    bias = rng.normal(0.0, 1.0, users + 1)[pairs["user_id"].to_numpy()]
+    rating = np.clip(np.rint(quality[rows] + bias + rng.normal(0.0, 1.2, len(rows))), 1, 10)
+    rating[rng.random(len(rows)) < 0.1] = -1
+    ratings = pd.DataFrame({"user_id": pairs["user_id"].to_numpy(), "anime_id": anime_ids[rows],
+                            "rating": rating.astype("int32")})
+    ratings.to_csv(out_dir / "ratings_clean_1.csv", index=False)
+
+    # catálogo: nombres de 2-3 palabras (con numeración para que sean únicos)
+    words = rng.choice(_WORDS, size=(items, 3))
+    n_words = rng.integers(2, 4, items)
+    names = [" ".join(w[:k]) + f" {i}" for i, (w, k) in enumerate(zip(words, n_words))]
+    genres = [", ".join(sorted(rng.choice(GENRES, size=rng.integers(1, 5), replace=False))) for _ in range(items)]
+    members = np.zeros(items, dtype="int64")
+    members[by_rank] = np.rint(pop * users * 50).astype("int64") + rng.integers(0, 100, items)
+    anime = pd.DataFrame({
+        "anime_id": anime_ids,
+        "name": names,
+        "genre": genres,
+        "type": rng.choice(_TYPES, size=items),
+        "episodes": rng.integers(1, 100, items),
+        "rating": np.round(np.clip(quality, 1, 10), 2),
+        "members": members,
+    })
+    anime.to_csv(out_dir / "anime.csv", index=False)
+    return {"users": users, "items": items, "ratings": len(ratings)}
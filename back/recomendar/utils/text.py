@@ -0,0 +1,10 @@
+"""Normalización de texto sin dependencias (la usan el índice de títulos y el modo serve)."""
+import html
+import unicodedata
+
+
+def fold(text: str) -> str:
+    """Normaliza un título para búsqueda: entidades HTML, acentos fuera, minúsculas, espacios simples."""
+    s = unicodedata.normalize("NFKD", html.unescape(str(text)))
+    s = "".join(c for c in s if not unicodedata.combining(c))
+    return " ".join(s.lower().split())
@@ -0,0 +1,82 @@
+from __future__ import annotations
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+from .recommender import get_recommender
+
+logger = logging.getLogger("recomendar")
+
+
+class WarmupState:
+    """Estado de la carga en segundo plano, consultado por /readyz."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.status = "idle"          # idle | loading | warming | ready | error
+        self.error: Optional[str] = None
+        self.done = 0
+        self.total = 0
+        self.started_at: Optional[float] = None
+        self.load_seconds: Optional[float] = None
+        self.warm_seconds: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def update(self, **fields) -> None:
+        with self._lock:
+            for k, v in fields.items():
+                setattr(self, k, v)
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            elapsed = time.time() - self.started_at if self.started_at else None
+            return {
+                "status": self.status,
+                "progress": {"done": self.done, "total": self.total},
+                "load_seconds": self.load_seconds,
+                "warm_seconds": self.warm_seconds,
+                "elapsed_seconds": round(elapsed, 3) if elapsed is not None else None,
+                "error": self.error,
+            }
+
+
+state = WarmupState()
+
+
+def warmup(data_dir: Path, min_periods: int = 3, top_titles: int = 0) -> None:
+    """Carga los datos (snapshot o CSV) y precalcula los vecinos de los `top_titles` más populares."""
+    state.update(status="loading", started_at=time.time(), error=None)
+    try:
+        t0 = time.perf_counter()
+        rec = get_recommender(data_dir, min_periods=min_periods)
+        state.update(load_seconds=round(time.perf_counter() - t0, 3))
+        logger.info("Warmup: datos cargados en %.2fs", state.load_seconds)
+
+        t1 = time.perf_counter()
+        ids = rec.anime.sort_values("members", ascending=False)["anime_id"].head(int(top_titles)).tolist()
+        state.update(status="warming", done=0, total=len(ids))
+        for i, aid in enumerate(ids, 1):
+            # mismo ancho que recomendar_por_vistos: deja la caché lista para ambos endpoints
+            rec._neighbors(int(aid), 200)
+            state.update(done=i)
+        state.update(status="ready", warm_seconds=round(time.perf_counter() - t1, 3))
+        logger.info("Warmup: %d títulos precalculados en %.2fs", len(ids), state.warm_seconds)
+    except Exception as e:
+        logger.exception("Warmup fallido")
+        state.update(status="error", error=str(e))
+
+
+def start_warmup(data_dir: Path, min_periods: int = 3, top_titles: int = 0) -> threading.Thread:
+    with state._lock:
+        if state._thread is not None:
+            return state._thread
+        t = threading.Thread(target=warmup, args=(data_dir, min_periods, top_titles),
+                             name="recomendar-warmup", daemon=True)
+        state._thread = t
+    t.start()
+    return t
@@ -1,136 +1,319 @@
+import hmac
+import os
+from collections import ChainMap
 from pathlib import Path
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
 from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from .utils.recommender import get_recommender
+from .utils.batch import recommend_stream
+from .utils.deltas import validate as validate_ratings
+from .utils.genres import AnimeFilter, parse_diversity
+from .utils.httpcache import etag_for, headers_for, matches, not_modified, response_cache
+from .utils.metrics import render as render_metrics, span
+from .utils.recommender import get_recommender, get_registry
+from .utils.warmup import state as warmup_state
 
 DATA_DIR = Path(settings.BASE_DIR) / "recomendar" / "utils"
 
 
-@api_view(["GET"])
-def healthz(_request):
-    return Response({"status": "ok"}, status=200)
+HEALTHZ_ETAG = '"healthz-ok"'
+HEALTHZ_HEADERS = {"ETag": HEALTHZ_ETAG, "Cache-Control": "no-cache"}
 
 
 @api_view(["GET"])
-def getrecomenders(request):
-    """
-    GET /getrecomenders?q=<titulo|fragmento>&topk=10&minp=3
-    Respuesta: [{ anime_id, name, correlation, genre, episodes }]
-    Si no hay match exacto, toma el mejor por substring (popularidad por 'members').
-    """
-    q = request.query_params.get("q", "")
-    topk = int(request.query_params.get("topk", 10))
-    minp = int(request.query_params.get("minp", 3))
+def healthz(request):
+    if matches(request.headers.get("If-None-Match"), HEALTHZ_ETAG):
+        return _respond(b"", 304, HEALTHZ_HEADERS)
+    return Response({"status": "ok"}, status=200, headers=HEALTHZ_HEADERS)
+
+
+# Cada endpoint se calcula en una función (parámetros → (payload, status)) compartida por
+# las vistas DRF de este módulo (WSGI) y las asíncronas de async_views.py (ASGI).
+# Los listados salen ya como bytes JSON (utils/serialize.py); los errores, como dict.
+
+def _respond(payload: Any, code: int, headers: Optional[Dict[str, str]] = None):
+    if code == 304:
+        resp = HttpResponseNotModified()
+    elif isinstance(payload, bytes):
+        resp = HttpResponse(payload, status=code, content_type="application/json")
+    else:
+        return Response(payload, status=code, headers=headers)
+    for k, v in (headers or {}).items():
+        resp[k] = v
+    return resp
+
+
+def readyz_payload() -> Tuple[Any, int]:
+    info = warmup_state.as_dict()
+    # sin warmup (DISABLE_WARMUP=1) se considera listo en cuanto alguna petición cargó los datos
+    ready = warmup_state.ready or (info["status"] == "idle" and bool(get_registry().loaded()))
+    if ready:
+        info["status"] = "ready"
+    return info, 200 if ready else 503
+
+
+def getrecomenders_payload(params: Mapping) -> Tuple[Any, int]:
+    q = params.get("q", "")
+    topk = int(params.get("topk", 10))
+    minp = int(params.get("minp", 3))
+    engine = params.get("engine", "pearson")
 
     if not q.strip():
-        return Response({"error": "Parámetro 'q' requerido."}, status=status.HTTP_400_BAD_REQUEST)
+        return {"error": "Parámetro 'q' requerido."}, status.HTTP_400_BAD_REQUEST
     try:
-        rec = get_recommender(DATA_DIR, min_periods=minp)
-        df = rec.similares_por_titulo(q, topk=topk)
-        payload = df[["anime_id", "name", "correlation", "genre", "episodes"]].to_dict(orient="records")
-        return Response(payload, status=200)
+        rec = get_recommender(DATA_DIR, min_periods=minp, engine=engine)
+        flt = AnimeFilter.from_params(rec.data.genres, params)
+        diversity = parse_diversity(params.get("diversity"))
+        aid = rec.title_to_id(q)
+        if aid is None:
+            return b"[]", 200
+        ids, corr, _, rows = rec.similares_arrays(aid, topk=topk, flt=flt, diversity=diversity)
+        with span("serialize"):
+            return rec.data.fragments.scored(ids, corr.astype("float64"), rows, field=b"correlation"), 200
     except Exception as e:
-        return Response({"error": str(e)}, status=400)
+        return {"error": str(e)}, 400
 
 
-@api_view(["GET"])
-def titles(request):
-    s = request.query_params.get("s", "").strip()
-    limit = max(1, min(int(request.query_params.get("limit", 50)), 500))
-    offset = max(0, int(request.query_params.get("offset", 0)))
-    minp = int(request.query_params.get("minp", 3))
-    min_r = int(request.query_params.get("min_r", 0))
+def titles_payload(params: Mapping) -> Tuple[Any, int]:
+    s = params.get("s", "").strip()
+    limit = max(1, min(int(params.get("limit", 50)), 500))
+    offset = max(0, int(params.get("offset", 0)))
+    minp = int(params.get("minp", 3))
+    min_r = int(params.get("min_r", 0))
 
     try:
         rec = get_recommender(DATA_DIR, min_periods=minp)
+        catalog = rec.catalog
+        flt = AnimeFilter.from_params(rec.data.genres, params)
 
-        # Base: anime
-        base = rec.anime.copy()
-
-        # rating_count si hay ratings; si no, lo omitimos sin romper el listado
-        rating_counts = None
-        if getattr(rec, "ratings", None) is not None and len(rec.ratings) > 0:
-            rating_counts = (
-                rec.ratings.groupby("anime_id")["rating"]
-                .count()
-                .rename("rating_count")
-                .astype("int32")
-                .reset_index()
-            )
-            base = base.merge(rating_counts, on="anime_id", how="left")
-            base["rating_count"] = base["rating_count"].fillna(0).astype("int32")
-        else:
-            base["rating_count"] = 0  # fallback neutral
-
-        # Filtro por min_r solo si realmente tenemos conteo útil
-        if min_r > 0 and rating_counts is not None:
-            base = base.loc[base["rating_count"] >= min_r]
-
-        # AUTOCOMPLETE (cuando hay 's')
+        # AUTOCOMPLETE (cuando hay 's'): el índice de títulos devuelve filas ya ordenadas por members
         if s:
-            # aseguramos name_norm
-            if "name_norm" not in base.columns:
-                base["name_norm"] = base["name"].str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii").str.lower()
-            mask = base["name_norm"].str.contains(s.lower(), na=False)
-            sub = base.loc[mask, ["anime_id", "name", "members", "rating_count", "genre", "episodes"]]
-            sub = sub.sort_values(["members", "name"], ascending=[False, True])
-            total = int(sub.shape[0])
-            results = sub.head(limit).to_dict(orient="records")
-            return Response({"count": total, "results": results}, status=200)
-
-        # LISTADO ALFABÉTICO (sin 's')
-        sub = base.loc[:, ["anime_id", "name", "members", "rating_count", "genre", "episodes"]]
-        sub = sub.sort_values("name", ascending=True)
-        total = int(sub.shape[0])
-
-        if offset >= total:
-            page = sub.iloc[0:0]
-        else:
-            page = sub.iloc[offset: offset + limit]
-
-        results = page.to_dict(orient="records")
-        return Response({"count": total, "results": results}, status=200)
+            rows, _ = rec.titles_index.search(s)
+            rows = catalog.filter(rows, min_r)
+            if flt is not None:
+                rows = rows[flt.allows(rows)]
+            with span("serialize"):
+                results = catalog.rows_json(rows[:limit], rec.data.fragments)
+            return b'{"count":%d,"results":%s}' % (len(rows), results), 200
+
+        # LISTADO ALFABÉTICO (sin 's'): página precalculada, filtro min_r incluido
+        rows, total = catalog.page(offset=offset, limit=limit, min_r=min_r, flt=flt)
+        with span("serialize"):
+            results = catalog.rows_json(rows, rec.data.fragments)
+        return b'{"count":%d,"results":%s}' % (total, results), 200
 
     except Exception as e:
-        return Response({"error": str(e)}, status=400)
+        return {"error": str(e)}, 400
 
 
-@api_view(["POST"])
-def recommend_by_seen(request):
+# Lecturas cacheables: ETag por versión de los datos + consulta (utils/httpcache.py)
+
+def _version(route: str, params: Mapping) -> Optional[str]:
+    # /titles solo depende de los datos (vista pearson); /getrecomenders también del motor
+    try:
+        minp = int(params.get("minp", 3))
+    except ValueError:
+        return None
+    engine = "pearson" if route == "titles" else params.get("engine", "pearson")
+    return get_registry().version(DATA_DIR, minp, engine)
+
+
+def cached_lookup(route: str, params: Mapping, if_none_match: Optional[str]) -> Optional[Tuple[Any, int, Dict]]:
     """
-    POST /recommend_by_seen
-    Body:
-      - seen_names: [str] (opcional)
-      - seen_ids:   [int] (opcional)
-      - ratings:    { "<anime_id>": float } (opcional)
-      - rating:     float  (rating por defecto si no pasas 'ratings')
-      - topk:       int
-      - minp:       int
-    Respuesta: [{ anime_id, name, score, genre, episodes }]
+    304 o cuerpo ya serializado sin tocar el recomendador (un stat() y dos búsquedas en dict);
+    None si hay que calcular (datos sin cargar, valoraciones pendientes o cuerpo no cacheado).
     """
-    data = request.data if isinstance(request.data, dict) else {}
+    version = _version(route, params)
+    if version is None:
+        return None
+    etag = etag_for(version, route, params)
+    if matches(if_none_match, etag):
+        not_modified.inc(route)
+        return b"", 304, headers_for(etag)
+    body = response_cache.get(etag)
+    if body is not None:
+        return body, 200, headers_for(etag)
+    return None
+
+
+def cached_compute(route: str, params: Mapping, fn: Callable[[Mapping], Tuple[Any, int]]) -> Tuple[Any, int, Dict]:
+    """fn(params) y, si es un 200 serializado, guarda el cuerpo y añade ETag/Cache-Control."""
+    before = _version(route, params)
+    payload, code = fn(params)
+    if code != 200 or not isinstance(payload, bytes):
+        return payload, code, {}
+    version = _version(route, params)
+    # si cambiaron los datos durante el cálculo no se sabe con qué versión se hizo
+    if version is None or (before is not None and before != version):
+        return payload, code, {}
+    etag = etag_for(version, route, params)
+    response_cache.put(etag, payload)
+    return payload, code, headers_for(etag)
+
+
+def cached_payload(route: str, params: Mapping, if_none_match: Optional[str],
+                   fn: Callable[[Mapping], Tuple[Any, int]]) -> Tuple[Any, int, Dict]:
+    hit = cached_lookup(route, params, if_none_match)
+    return hit if hit is not None else cached_compute(route, params, fn)
+
+
+def recommend_by_seen_payload(data: Any, params: Mapping) -> Tuple[Any, int]:
+    data = data if isinstance(data, dict) else {}
     seen_names = data.get("seen_names") or []
     seen_ids = data.get("seen_ids") or []
     ratings_map = data.get("ratings") or {}
     default_rating = float(data.get("rating", 10.0))
     topk = int(data.get("topk", 10))
-    minp = int(request.query_params.get("minp", data.get("minp", 3)))
+    minp = int(params.get("minp", data.get("minp", 3)))
+    engine = params.get("engine", data.get("engine", "pearson"))
 
     if not seen_names and not seen_ids:
-        return Response({"error": "Debes enviar 'seen_names' o 'seen_ids'."}, status=400)
+        return {"error": "Debes enviar 'seen_names' o 'seen_ids'."}, 400
 
     try:
-        rec = get_recommender(DATA_DIR, min_periods=minp)
-        df = rec.recomendar_por_vistos(
+        rec = get_recommender(DATA_DIR, min_periods=minp, engine=engine)
+        # filtros en la query o en el body (la query manda)
+        options = ChainMap(params, data)
+        ids, scores, rows = rec.recomendar_por_vistos_arrays(
             seen_ids=seen_ids,
             seen_names=seen_names,
             ratings_map=ratings_map or None,
             default_rating=default_rating,
             topk=topk,
+            flt=AnimeFilter.from_params(rec.data.genres, options),
+            diversity=parse_diversity(options.get("diversity")),
         )
-        payload = df[["anime_id", "name", "score", "genre", "episodes"]].to_dict(orient="records")
-        return Response(payload, status=200)
+        with span("serialize"):
+            return rec.data.fragments.scored(ids, scores, rows), 200
+    except Exception as e:
+        return {"error": str(e)}, 400
+
+
+def ingest_denied(authorization: Optional[str]) -> Optional[Tuple[Any, int]]:
+    # escritura pública: desactivada salvo que INGEST_TOKEN esté definido, y con ese token
+    token = os.environ.get("INGEST_TOKEN", "")
+    if not token:
+        return {"error": "Ingesta desactivada (define INGEST_TOKEN o usa manage.py ingest_ratings)."}, 403
+    scheme, _, given = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(given.strip().encode(), token.encode()):
+        return {"error": "Token de ingesta ausente o incorrecto."}, 401
+    return None
+
+
+def ingest_ratings_payload(data: Any, authorization: Optional[str] = None) -> Tuple[Any, int]:
+    denied = ingest_denied(authorization)
+    if denied is not None:
+        return denied
+    records = data.get("ratings") if isinstance(data, dict) else data
+    if not isinstance(records, list) or not records:
+        return {"error": "Debes enviar 'ratings': [{user_id, anime_id, rating}]."}, 400
+    max_rows = int(os.environ.get("INGEST_MAX_ROWS", 1000))
+    if len(records) > max_rows:
+        return {"error": f"Máximo {max_rows} valoraciones por petición."}, 413
+    try:
+        df = validate_ratings(records)
+        touched = get_registry().ingest(DATA_DIR, df)
+        return {"accepted": int(len(df)), "affected_anime": int(len(touched))}, 200
+    except Exception as e:
+        return {"error": str(e)}, 400
+
+
+@api_view(["GET"])
+def metrics(_request):
+    """GET /metrics: contadores e histogramas del proceso en formato de texto de Prometheus."""
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@api_view(["GET"])
+def readyz(_request):
+    """
+    GET /readyz
+    200 cuando el modelo está cargado (y precalculado si hay warmup); 503 mientras tanto.
+    Respuesta: { status, progress: {done, total}, load_seconds, warm_seconds, elapsed_seconds, error }
+    """
+    payload, code = readyz_payload()
+    return _respond(payload, code)
+
+
+@api_view(["GET"])
+def getrecomenders(request):
+    """
+    GET /getrecomenders?q=<titulo|fragmento>&topk=10&minp=3&engine=pearson|svd
+    Respuesta: [{ anime_id, name, correlation, genre, episodes }]
+    Si no hay match exacto, toma el mejor por substring (popularidad por 'members').
+    Con engine=svd 'correlation' es la similitud coseno entre factores latentes.
+    Filtros: genre=Action,Comedy (todos; genre_mode=any para alguno), exclude_genre=...,
+    min_episodes / max_episodes. diversity=0..1 reordena por diversidad de géneros (MMR).
+    """
+    return _respond(*cached_payload("getrecomenders", request.query_params,
+                                    request.headers.get("If-None-Match"), getrecomenders_payload))
+
+
+@api_view(["GET"])
+def titles(request):
+    """
+    GET /titles?s=<texto>&limit=50&offset=0&min_r=0
+    Admite los filtros genre, genre_mode, exclude_genre, min_episodes y max_episodes.
+    Respuesta: { count, results: [{ anime_id, name, members, rating_count, genre, episodes }] }
+    """
+    return _respond(*cached_payload("titles", request.query_params,
+                                    request.headers.get("If-None-Match"), titles_payload))
+
+
+@api_view(["POST"])
+def recommend_by_seen(request):
+    """
+    POST /recommend_by_seen
+    Body:
+      - seen_names: [str] (opcional)
+      - seen_ids:   [int] (opcional)
+      - ratings:    { "<anime_id>": float } (opcional)
+      - rating:     float  (rating por defecto si no pasas 'ratings')
+      - topk:       int
+      - minp:       int
+      - engine:     "pearson" (por defecto) | "svd"
+      - genre, genre_mode, exclude_genre, min_episodes, max_episodes, diversity:
+                    filtros y MMR como en /getrecomenders (también en la query)
+    Respuesta: [{ anime_id, name, score, genre, episodes }]
+    """
+    payload, code = recommend_by_seen_payload(request.data, request.query_params)
+    return _respond(payload, code)
+
+
+@api_view(["POST"])
+def recommend_batch(request):
+    """
+    POST /recommend_batch?minp=3&engine=pearson|svd&topk=10
+    Body (JSON lines): una petición por línea con las claves de /recommend_by_seen y un 'user' opcional.
+    Respuesta (application/x-ndjson, en streaming): { user, results: [{ anime_id, name, score, genre, episodes }] }
+    ó { user, error } por línea, en el orden de entrada.
+    """
+    minp = int(request.query_params.get("minp", 3))
+    engine = request.query_params.get("engine", "pearson")
+    topk = int(request.query_params.get("topk", 10))
+
+    try:
+        rec = get_recommender(DATA_DIR, min_periods=minp, engine=engine)
     except Exception as e:
         return Response({"error": str(e)}, status=400)
+    lines = request.body.splitlines()
+    return StreamingHttpResponse(recommend_stream(rec, lines, topk=topk), content_type="application/x-ndjson")
+
+
+@api_view(["POST"])
+def ingest_ratings(request):
+    """
+    POST /ratings  (Authorization: Bearer <INGEST_TOKEN>; sin INGEST_TOKEN, 403)
+    Body: { ratings: [{ user_id, anime_id, rating }] }  (o directamente la lista, hasta INGEST_MAX_ROWS)
+    Añade las valoraciones a ratings_delta.csv y las aplica sin recargar: solo se invalidan
+    las similitudes cacheadas de los animes afectados.
+    Respuesta: { accepted, affected_anime }
+    """
+    denied = ingest_denied(request.headers.get("Authorization"))
+    if denied is not None:   # antes de leer el cuerpo
+        return _respond(*denied)
+    payload, code = ingest_ratings_payload(request.data, request.headers.get("Authorization"))
+    return _respond(payload, code)
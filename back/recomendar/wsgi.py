@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'recomendar.settings')
 
 application = get_wsgi_application()
+
+from recomendar.apps import start_server_warmup  # noqa: E402  (tras django.setup)
+
+start_server_warmup()